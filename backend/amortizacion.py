@@ -0,0 +1,197 @@
+# backend/amortizacion.py
+"""
+Motor de amortización (sistema francés) en forma cerrada.
+
+En lugar de recorrer el cuadro mes a mes, el saldo, los intereses acumulados
+y el mes de liquidación se obtienen con las fórmulas de la renta constante:
+
+    B_m = P·(1+r)^m − c·((1+r)^m − 1) / r
+    I_m = m·c − (P − B_m)
+
+Todas las funciones aceptan escalares o arrays de NumPy, de modo que sirven
+tanto para una sola hipoteca como para una cartera completa.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Margen para redondear al alza el número de meses sin arrastrar errores de coma flotante
+_EPS_MESES = 1e-6
+
+
+def cuota(P, rate_annual, n_months):
+    # Cuota mensual del sistema francés (versión vectorizada de cuota_mensual).
+    P = np.asarray(P, dtype=float)
+    r = np.asarray(rate_annual, dtype=float) / 12.0
+    n = np.asarray(n_months, dtype=float)
+    r_seguro = np.where(r > 0, r, 1.0)
+    f = np.power(1.0 + r_seguro, n)
+    # Sin interés (o interés negativo) se amortiza linealmente, igual que cuota_mensual
+    return np.where(r > 0, P * r_seguro * f / (f - 1.0), P / n)
+
+
+def saldo_bruto(P, r, c, m):
+    # Saldo tras m pagos de cuota c, sin recortar a cero (puede ser negativo si ya se liquidó).
+    r = np.asarray(r, dtype=float)
+    r_seguro = np.where(r != 0, r, 1.0)
+    f = np.power(1.0 + r, m)
+    return np.where(r != 0, P * f - c * (f - 1.0) / r_seguro, P - c * m)
+
+
+def _meses_para_liquidar(b, r, c):
+    # Número (real) de cuotas c necesarias para liquidar un saldo b al tipo mensual r.
+    r = np.asarray(r, dtype=float)
+    b = np.asarray(b, dtype=float)
+    r_seguro = np.where(r != 0, r, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.where(
+            r != 0,
+            np.log(c / (c - r_seguro * b)) / np.log1p(r_seguro),
+            b / c,
+        )
+    # Si la cuota no cubre los intereses el préstamo no se liquida nunca
+    return np.where(np.isfinite(n), n, np.inf)
+
+
+def mes_liquidacion(P, rate_annual, n_months, c=None):
+    # Primer mes en el que el saldo llega a cero (como máximo n_months).
+    r = np.asarray(rate_annual, dtype=float) / 12.0
+    c = cuota(P, rate_annual, n_months) if c is None else np.asarray(c, dtype=float)
+    meses = np.ceil(_meses_para_liquidar(P, r, c) - _EPS_MESES)
+    return np.minimum(np.maximum(meses, 1), n_months).astype(int)
+
+
+def saldo(P, rate_annual, n_months, meses):
+    # Saldo pendiente tras los meses indicados (0 una vez liquidado).
+    r = np.asarray(rate_annual, dtype=float) / 12.0
+    c = cuota(P, rate_annual, n_months)
+    fin = mes_liquidacion(P, rate_annual, n_months, c)
+    m = np.asarray(meses, dtype=float)
+    b = np.maximum(0.0, saldo_bruto(P, r, c, m))
+    return np.where(m >= fin, 0.0, b)
+
+
+def interes_acumulado(P, rate_annual, n_months, meses):
+    # Intereses pagados desde el mes 1 hasta el mes indicado (incluido).
+    r = np.asarray(rate_annual, dtype=float) / 12.0
+    c = cuota(P, rate_annual, n_months)
+    fin = mes_liquidacion(P, rate_annual, n_months, c)
+    m = np.minimum(np.asarray(meses, dtype=float), fin)
+    return m * c - (P - saldo_bruto(P, r, c, m))
+
+
+def ahorro_extra(P, rate_annual, c, mes_fin, extra, when_month):
+    """
+    Ahorro de intereses al amortizar `extra` en el mes `when_month`
+    manteniendo la cuota (se acorta el plazo).
+
+    Reproduce la lógica del cuadro mes a mes: el interés del mes de la
+    amortización se calcula sobre el saldo previo y la última cuota se
+    ajusta a lo que queda por pagar.
+    """
+    P = np.asarray(P, dtype=float)
+    r = np.asarray(rate_annual, dtype=float) / 12.0
+    c = np.asarray(c, dtype=float)
+    mes_fin = np.asarray(mes_fin, dtype=float)
+    extra = np.asarray(extra, dtype=float)
+    w = np.asarray(when_month, dtype=float)
+
+    # Intereses del cuadro sin amortización extra
+    interes_sin = mes_fin * c - (P - saldo_bruto(P, r, c, mes_fin))
+
+    # Estado justo antes del mes de la amortización
+    aplica = (w >= 1) & (w <= mes_fin)
+    w_ok = np.where(aplica, w, 1.0)
+    b_prev = saldo_bruto(P, r, c, w_ok - 1)
+    interes_previo = (w_ok - 1) * c - (P - b_prev)
+    i_w = b_prev * r
+    b_tras_extra = np.maximum(0.0, b_prev - extra)
+
+    # Si tras la amortización la cuota cubre todo, el préstamo termina ese mes
+    liquida_ya = b_tras_extra + i_w <= c
+    b_w = np.where(liquida_ya, 0.0, b_tras_extra + i_w - c)
+
+    # Resto del cuadro: j cuotas completas (la última, ajustada al saldo)
+    restantes = np.maximum(0.0, mes_fin - w_ok)
+    j = np.ceil(_meses_para_liquidar(b_w, r, c) - _EPS_MESES)
+    j = np.clip(j, 1.0, np.maximum(restantes, 1.0))
+    interes_despues = j * c - b_w + saldo_bruto(b_w, r, c, j)
+    interes_despues = np.where(liquida_ya | (restantes <= 0), 0.0, interes_despues)
+
+    interes_con = interes_previo + i_w + interes_despues
+    ahorro = np.where(aplica, np.maximum(0.0, interes_sin - interes_con), 0.0)
+    return np.round(ahorro, 2)
+
+
+@dataclass(frozen=True)
+class CuadroAmortizacion:
+    """
+    Cuadro base de una hipoteca, calculado una sola vez y compartido por
+    los hitos de amortización, el ahorro por amortización anticipada y
+    el stress test.
+    """
+    capital: float
+    tipo_anual: float
+    n_meses: int
+    cuota: float
+    mes_fin: int
+    intereses_totales: float
+
+    @classmethod
+    def calcular(cls, P: float, rate_annual: float, n_months: int) -> "CuadroAmortizacion":
+        c = float(cuota(P, rate_annual, n_months))
+        fin = int(mes_liquidacion(P, rate_annual, n_months, c))
+        r = rate_annual / 12.0
+        intereses = float(fin * c - (P - saldo_bruto(P, r, c, fin)))
+        return cls(P, rate_annual, n_months, c, fin, intereses)
+
+    @property
+    def tipo_mensual(self) -> float:
+        return self.tipo_anual / 12.0
+
+    def saldo_bruto(self, meses) -> np.ndarray:
+        return saldo_bruto(self.capital, self.tipo_mensual, self.cuota, np.asarray(meses, dtype=float))
+
+    def resumen(self, hitos: Iterable[int] = (12, 60, 120)) -> List[Dict]:
+        # Estado del cuadro en los meses indicados (y siempre en el último).
+        meses = np.array(sorted(m for m in set(hitos) | {self.n_meses} if 1 <= m <= self.mes_fin), dtype=float)
+        if meses.size == 0:
+            return []
+        r = self.tipo_mensual
+        c = self.cuota
+        b_prev = self.saldo_bruto(meses - 1)
+        b = self.saldo_bruto(meses)
+        interes_mes = b_prev * r
+        interes_acum = meses * c - (self.capital - b)
+
+        return [
+            {
+                "mes": int(m),
+                "cuota": round(c, 2),
+                "interes_mes": round(float(i), 2),
+                "amortizado_mes": round(float(c - i), 2),
+                "saldo": round(max(0.0, float(s)), 2),
+                "interes_acum": round(float(ia), 2),
+            }
+            for m, i, s, ia in zip(meses, interes_mes, b, interes_acum)
+        ]
+
+    def ahorro_extra(self, extra: float, when_month: int = 1) -> float:
+        return float(ahorro_extra(self.capital, self.tipo_anual, self.cuota, self.mes_fin, extra, when_month))
+
+    def stress(self, deltas: Iterable[float] = (0.01, 0.02)) -> Tuple[float, List[Dict]]:
+        # Cuota con subidas de tipo, todas las variantes en una sola operación.
+        deltas = np.asarray(tuple(deltas), dtype=float)
+        tipos = np.maximum(0.0, self.tipo_anual + deltas)
+        cuotas = cuota(self.capital, tipos, self.n_meses)
+        res = [
+            {
+                "delta_tipo_pp": int(d * 100),
+                "tipo_resultante": round(float(t) * 100, 3),
+                "cuota": round(float(c2), 2),
+                "diferencia": round(float(c2) - self.cuota, 2),
+            }
+            for d, t, c2 in zip(deltas, tipos, cuotas)
+        ]
+        return round(self.cuota, 2), res
@@ -0,0 +1,296 @@
+# backend/analisis_lote.py
+"""
+Análisis de carteras de hipotecas completas en una sola llamada.
+
+Cada campo de AnalisisInput se trata como una columna de NumPy y todas las
+métricas (cuota, intereses, DTI/LTV, stress test y ahorro por amortización
+anticipada) se calculan como operaciones sobre arrays, sin validar un
+modelo Pydantic por fila.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from amortizacion import cuota, mes_liquidacion, ahorro_extra, saldo_bruto
+
+CAMPOS_NUMERICOS = (
+    "capital_pendiente",
+    "anos_restantes",
+    "tin",
+    "euribor",
+    "diferencial",
+    "cuota_actual",
+    "ingresos_mensuales",
+    "otras_deudas_mensuales",
+    "valor_vivienda",
+    "oferta_alternativa_tin",
+)
+
+HITOS = (12, 60, 120)
+DELTAS_STRESS = (0.01, 0.02)
+EXTRAS = {"ahorro_1k": 1000.0, "ahorro_5k": 5000.0, "ahorro_10k": 10000.0}
+CAMPOS_SUBROGACION = (
+    "tin_alternativo", "cuota_alternativa", "diferencia_cuota", "intereses_alternativos", "ahorro_intereses",
+)
+
+
+def avisos_riesgo(dti: Optional[float], ltv: Optional[float]) -> List[str]:
+    # Genera avisos basados en DTI y LTV
+    avisos = []
+    if dti is not None:
+        if dti >= 40:
+            avisos.append("DTI alto (>40%): riesgo de sobreendeudamiento.")
+        elif dti >= 35:
+            avisos.append("DTI moderado (35–40%): vigila tu colchón financiero.")
+    if ltv is not None:
+        if ltv > 80:
+            avisos.append("LTV >80%: alto apalancamiento; la subrogación puede ser más difícil.")
+        elif ltv > 70:
+            avisos.append("LTV 70–80%: margen razonable, pero cuidado con caídas de valor.")
+    return avisos
+
+
+def columnas_desde_filas(filas: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    # Convierte una lista de hipotecas (formato /analisis) a columnas.
+    cols: Dict[str, Any] = {k: [f.get(k) for f in filas] for k in CAMPOS_NUMERICOS}
+    cols["tipo"] = [f.get("tipo") for f in filas]
+    return cols
+
+
+def _columna(columnas: Dict[str, Any], nombre: str, n: int) -> np.ndarray:
+    # Columna numérica con NaN donde falta el dato.
+    valores = columnas.get(nombre)
+    if valores is None:
+        return np.full(n, np.nan)
+    return np.array(valores, dtype=float)
+
+
+def _n_filas(columnas: Dict[str, Any]) -> int:
+    longitudes = {len(v) for v in columnas.values() if v is not None}
+    if len(longitudes) > 1:
+        raise ValueError("Todas las columnas deben tener la misma longitud.")
+    return longitudes.pop() if longitudes else 0
+
+
+def analizar_lote(columnas: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula las métricas de /analisis para todas las filas a la vez.
+
+    Devuelve un diccionario de arrays (una entrada por métrica) más las
+    columnas `ok` y `error` con el resultado de la validación de cada fila.
+    """
+    n = _n_filas(columnas)
+    P = _columna(columnas, "capital_pendiente", n)
+    anos = _columna(columnas, "anos_restantes", n)
+    tin = _columna(columnas, "tin", n)
+    euribor = _columna(columnas, "euribor", n)
+    diferencial = _columna(columnas, "diferencial", n)
+    cuota_actual = _columna(columnas, "cuota_actual", n)
+    ingresos = _columna(columnas, "ingresos_mensuales", n)
+    otras_deudas = np.nan_to_num(_columna(columnas, "otras_deudas_mensuales", n))
+    valor_vivienda = _columna(columnas, "valor_vivienda", n)
+    oferta_tin = _columna(columnas, "oferta_alternativa_tin", n)
+
+    tipos = columnas.get("tipo") or ["fijo"] * n
+    variable = np.char.lower(np.array([t or "fijo" for t in tipos], dtype=str)) == "variable"
+
+    # -------------------- Validación por fila --------------------
+    error = np.full(n, None, dtype=object)
+    ok = np.ones(n, dtype=bool)
+
+    def marcar(mask: np.ndarray, mensaje: str) -> None:
+        # Solo se guarda el primer error de cada fila
+        nuevas = mask & ok
+        error[nuevas] = mensaje
+        ok[nuevas] = False
+
+    marcar(~(P > 0), "capital_pendiente debe ser > 0.")
+    marcar(~(anos > 0) | (anos != np.floor(anos)), "anos_restantes debe ser un entero > 0.")
+    marcar(variable & (np.isnan(euribor) | np.isnan(diferencial)), "Para 'variable' necesitas euribor y diferencial.")
+    marcar(~variable & np.isnan(tin), "Para 'fijo' necesitas el TIN (%).")
+
+    # Las filas inválidas se calculan con valores neutros y luego se descartan
+    P = np.where(ok, P, 1.0)
+    n_meses = np.where(ok, anos * 12, 12).astype(int)
+    tipo_anual = np.where(variable, (euribor + diferencial) / 100.0, tin / 100.0)
+    tipo_anual = np.where(ok, tipo_anual, 0.0)
+
+    # -------------------- Cuadro base --------------------
+    c = cuota(P, tipo_anual, n_meses)
+    fin = mes_liquidacion(P, tipo_anual, n_meses, c)
+    r = tipo_anual / 12.0
+    cuota_efectiva = np.where(np.isnan(cuota_actual) | (cuota_actual == 0), c, cuota_actual)
+    intereses_totales = np.maximum(0.0, c * n_meses - P)
+
+    # Hitos de la tabla de amortización: matriz (filas x hitos)
+    meses = np.column_stack([np.full(n, h) for h in HITOS] + [n_meses]).astype(float)
+    b_prev = saldo_bruto(P[:, None], r[:, None], c[:, None], meses - 1)
+    b = saldo_bruto(P[:, None], r[:, None], c[:, None], meses)
+    interes_mes = b_prev * r[:, None]
+    hitos = {
+        "mes": meses,
+        "valido": meses <= fin[:, None],
+        "interes_mes": np.round(interes_mes, 2),
+        "amortizado_mes": np.round(c[:, None] - interes_mes, 2),
+        "saldo": np.round(np.maximum(0.0, b), 2),
+        "interes_acum": np.round(meses * c[:, None] - (P[:, None] - b), 2),
+    }
+
+    # -------------------- Ratios --------------------
+    dti = np.where(ingresos > 0, np.round((cuota_efectiva + otras_deudas) / np.where(ingresos > 0, ingresos, 1.0) * 100.0, 2), np.nan)
+    ltv = np.where(valor_vivienda > 0, np.round(P / np.where(valor_vivienda > 0, valor_vivienda, 1.0) * 100.0, 2), np.nan)
+
+    # -------------------- Stress test --------------------
+    stress = []
+    for d in DELTAS_STRESS:
+        r2 = np.maximum(0.0, tipo_anual + d)
+        c2 = cuota(P, r2, n_meses)
+        stress.append({
+            "delta_tipo_pp": int(d * 100),
+            "tipo_resultante": np.round(r2 * 100, 3),
+            "cuota": np.round(c2, 2),
+            "diferencia": np.round(c2 - c, 2),
+        })
+
+    # -------------------- Amortización anticipada --------------------
+    ahorros = {k: ahorro_extra(P, tipo_anual, c, fin, extra, 1) for k, extra in EXTRAS.items()}
+
+    # -------------------- Subrogación --------------------
+    hay_oferta = ~np.isnan(oferta_tin) & (oferta_tin != 0)
+    alt_rate = np.where(hay_oferta, oferta_tin, 0.0) / 100.0
+    cuota_alt = cuota(P, alt_rate, n_meses)
+    interes_alt = np.maximum(0.0, cuota_alt * n_meses - P)
+
+    return {
+        "n": n,
+        "ok": ok,
+        "error": error,
+        "variable": variable,
+        "capital_pendiente": P,
+        "anos_restantes": anos,
+        "tin": tin,
+        "euribor": euribor,
+        "diferencial": diferencial,
+        "cuota_efectiva": np.round(cuota_efectiva, 2),
+        "cuota_estimada": np.round(c, 2),
+        "intereses_restantes_aprox": np.round(intereses_totales, 2),
+        "dti": dti,
+        "ltv": ltv,
+        "hitos": hitos,
+        "cuota_hito": np.round(c, 2),
+        "stress": stress,
+        "ahorros": ahorros,
+        "hay_oferta": hay_oferta,
+        "tin_alternativo": np.round(oferta_tin, 3),
+        "cuota_alternativa": np.round(cuota_alt, 2),
+        "diferencia_cuota": np.round(cuota_alt - np.round(c, 2), 2),
+        "intereses_alternativos": np.round(interes_alt, 2),
+        "ahorro_intereses": np.round(intereses_totales - interes_alt, 2),
+    }
+
+
+def _opcional(x: float) -> Optional[float]:
+    return None if x != x else x
+
+
+def _tipo_label(variable: bool, tin: float, euribor: float, diferencial: float) -> str:
+    if variable:
+        return f"variable (Euríbor {euribor:.2f}% + {diferencial:.2f}%)"
+    return f"fijo ({tin:.2f}%)"
+
+
+def a_filas(res: Dict[str, Any]) -> List[Dict]:
+    """
+    Convierte el resultado columnar al mismo formato que devuelve analisis().
+
+    Cada array pasa a lista una sola vez y las filas se montan recorriendo
+    esas listas con zip, sin indexar fila a fila. Para carteras grandes es
+    más rápido formato_salida="columnas" (a_columnas).
+    """
+    def lista(nombre):
+        return res[nombre].tolist()
+
+    # Los hitos válidos ya salen en orden (ninguno pasa del último mes, que va al final);
+    # solo hay que quitar el último mes cuando coincide con uno de HITOS.
+    hitos = res["hitos"]
+    mostrar = hitos["valido"].copy()
+    mostrar[:, -1] &= ~np.isin(hitos["mes"][:, -1], HITOS)
+    hitos_por_fila = zip(*(a.tolist() for a in (
+        mostrar, hitos["mes"].astype(int), hitos["interes_mes"], hitos["amortizado_mes"],
+        hitos["saldo"], hitos["interes_acum"],
+    )))
+    escenarios_por_fila = zip(*(
+        [
+            {"delta_tipo_pp": s["delta_tipo_pp"], "tipo_resultante": t, "cuota": c, "diferencia": d}
+            for t, c, d in zip(s["tipo_resultante"].tolist(), s["cuota"].tolist(), s["diferencia"].tolist())
+        ]
+        for s in res["stress"]
+    ))
+    claves_ahorro = list(res["ahorros"])
+    ahorros_por_fila = zip(*(v.tolist() for v in res["ahorros"].values()))
+    comparativas = zip(*(lista(k) for k in CAMPOS_SUBROGACION))
+
+    filas = []
+    for (
+        ok, error, variable, capital, anos, tin, euribor, diferencial,
+        cuota_efectiva, cuota_estimada, intereses, dti, ltv, c, hay_oferta,
+        comparativa, hitos_fila, escenarios, ahorros,
+    ) in zip(
+        lista("ok"), lista("error"), lista("variable"), lista("capital_pendiente"), lista("anos_restantes"),
+        lista("tin"), lista("euribor"), lista("diferencial"), lista("cuota_efectiva"), lista("cuota_estimada"),
+        lista("intereses_restantes_aprox"), lista("dti"), lista("ltv"), lista("cuota_hito"), lista("hay_oferta"),
+        comparativas, hitos_por_fila, escenarios_por_fila, ahorros_por_fila,
+    ):
+        if not ok:
+            filas.append({"ok": False, "error": error})
+            continue
+
+        dti = _opcional(dti)
+        ltv = _opcional(ltv)
+        filas.append({
+            "ok": True,
+            "entrada": {
+                "capital_pendiente": capital,
+                "anos_restantes": int(anos),
+                "tipo": _tipo_label(variable, tin, euribor, diferencial),
+            },
+            "metricas": {
+                "cuota_efectiva": cuota_efectiva,
+                "cuota_estimada": cuota_estimada,
+                "intereses_restantes_aprox": intereses,
+                "dti": dti,
+                "ltv": ltv,
+            },
+            "stress_test": {"cuota_base": c, "escenarios": list(escenarios)},
+            "amortizacion_extra": dict(zip(claves_ahorro, ahorros)),
+            "resumen_amortizacion": [
+                {"mes": m, "cuota": c, "interes_mes": im, "amortizado_mes": am, "saldo": sa, "interes_acum": ia}
+                for v, m, im, am, sa, ia in zip(*hitos_fila) if v
+            ],
+            "comparativa_subrogacion": dict(zip(CAMPOS_SUBROGACION, comparativa)) if hay_oferta else None,
+            "avisos": avisos_riesgo(dti, ltv),
+        })
+    return filas
+
+
+def a_columnas(res: Dict[str, Any]) -> Dict[str, Any]:
+    # Salida columnar compacta (listas por métrica), pensada para carteras grandes.
+    def lista(a):
+        return [None if x != x else x for x in a.tolist()] if a.dtype.kind == "f" else a.tolist()
+
+    out = {
+        "ok": res["ok"].tolist(),
+        "error": res["error"].tolist(),
+        "cuota_efectiva": lista(res["cuota_efectiva"]),
+        "cuota_estimada": lista(res["cuota_estimada"]),
+        "intereses_restantes_aprox": lista(res["intereses_restantes_aprox"]),
+        "dti": lista(res["dti"]),
+        "ltv": lista(res["ltv"]),
+    }
+    for s in res["stress"]:
+        pp = s["delta_tipo_pp"]
+        out[f"stress_cuota_{pp}pp"] = lista(s["cuota"])
+        out[f"stress_diferencia_{pp}pp"] = lista(s["diferencia"])
+    for k, v in res["ahorros"].items():
+        out[k] = lista(v)
+    return out
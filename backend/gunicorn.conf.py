@@ -0,0 +1,29 @@
+# backend/gunicorn.conf.py
+# Varios workers compartiendo un único modelo de embeddings:
+#   gunicorn -c gunicorn.conf.py hipotecassist_api:app
+# Con preload_app la app (y el modelo, por EMBEDDING_CARGA=inmediata) se carga
+# una vez en el proceso maestro antes del fork; los workers comparten los pesos
+# por copy-on-write. No se codifica nada en el maestro para no arrancar los
+# hilos de torch antes del fork.
+#
+# Por defecto un solo worker: el almacén de análisis (salvo ANALISIS_STORE=redis)
+# y la memoria de conversación (memoria.py) viven en cada proceso. Con
+# WEB_CONCURRENCY > 1 hace falta ANALISIS_STORE=redis, y aun así el historial
+# de una sesión solo se conserva si el balanceador la envía siempre al mismo
+# worker (sesiones pegajosas); si no, cada worker ve una conversación distinta.
+import os
+
+os.environ.setdefault("EMBEDDING_CARGA", "inmediata")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    # Sin almacén compartido cada worker tendría sus propios análisis: no se arranca
+    from sesiones import comprobar_workers
+
+    comprobar_workers(server.cfg.workers)
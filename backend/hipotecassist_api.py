@@ -1,32 +1,51 @@
 # backend/hipotecassist_api.py
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from math import pow
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
 import time
+import uuid
 import os
 import re
+import json
+import threading
+from collections import deque
 from datetime import datetime
 
 from pathlib import Path
 from routers.search import router as search_router
-from routers.search import buscar_hipotecas_en_qdrant
-from llm import responder_pregunta_gemini
+from routers.search import buscar_documentos_async
+from services.qdrant_connection import embed_query_async, qdrant, cache_embeddings
+from services.indice_local import indice_actual, sincronizar_desde_qdrant
+from services.modelo_embeddings import cargador_embeddings, MODO_CARGA
+from services.metadatos_documentos import bancos_en_texto, normalizar_banco
+from services.metricas import registro, duracion_peticiones, etapas_peticion, observar_etapa, percentiles, Medidor, CONTENT_TYPE
+from services.logs import configurar_logging, descartados, id_peticion
+from services.cache_analisis import CacheAnalisis, huella, serializar
+from llm import responder_pregunta_gemini_async, responder_pregunta_gemini_stream, cache_respuestas, cliente_llm, ErrorGeneracion
 import memoria
-
-# -------------------- Estado global --------------------
-# Almacena el último análisis de hipoteca realizado
+from sesiones import crear_almacen
+from amortizacion import CuadroAmortizacion
+from simulacion_euribor import simular_hipoteca_variable
+from analisis_lote import analizar_lote, columnas_desde_filas, a_filas, a_columnas, avisos_riesgo
+from ofertas import ofertas_actuales, a_dict, MODALIDADES
+
+# -------------------- Estado por sesión --------------------
+# Almacena el último análisis de hipoteca de cada session_id
 # Se usa para mantener contexto entre /analisis y /preguntar
-ultimo_resultado: Optional[Dict] = None
+almacen_analisis = crear_almacen()
+
+# Tiempos hasta el primer token (ms) de las últimas respuestas de /preguntar/stream
+ttft_recientes: deque = deque(maxlen=1000)
 
 # --- Carpeta logs relativa al archivo principal ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-LOG_DIR = os.path.join(BASE_DIR, "logs")
+LOG_DIR = os.getenv("LOG_DIR") or os.path.join(BASE_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # Nombre único por sesión
@@ -36,30 +55,8 @@ log_path = os.path.join(LOG_DIR, f"app_{session_id}.log")
 # ----------------------------
 # Configurar logging
 # ----------------------------
-# Limpiar handlers previos
-for handler in logging.root.handlers[:]:
-    logging.root.removeHandler(handler)
-
-# Crear handler de archivo con rotación
-file_handler = RotatingFileHandler(
-    log_path,
-    maxBytes=10 * 1024 * 1024,  # 10 MB por archivo
-    backupCount=30,
-    encoding="utf-8"
-)
-
-# Formato de logs
-formatter = logging.Formatter(
-    "%(asctime)s [%(levelname)s] %(message)s",
-    "%Y-%m-%d %H:%M:%S"
-)
-file_handler.setFormatter(formatter)
-
-# Configuración global
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[file_handler, logging.StreamHandler()]  # logs a archivo y consola
-)
+# Las peticiones solo encolan; un hilo escribe el fichero (JSON por línea) y la consola
+escritor_logs = configurar_logging(log_path)
 
 logger = logging.getLogger(__name__)
 logger.info(f"🟢 FastAPI iniciada. Logs en: {log_path}")
@@ -67,6 +64,43 @@ logger.info(f"🟢 FastAPI iniciada. Logs en: {log_path}")
 # -------------------- App --------------------
 app = FastAPI()
 
+
+@app.on_event("shutdown")
+def vaciar_logs():
+    # Escribe lo que quede en la cola antes de salir
+    escritor_logs.stop()
+
+
+@app.on_event("startup")
+def cargar_modelo_embeddings():
+    # El modelo se carga en un hilo: /health responde ya y /preguntar espera si aún no está listo.
+    # Con EMBEDDING_CARGA=inmediata (gunicorn --preload) ya viene cargado del proceso maestro.
+    if MODO_CARGA != "perezosa":
+        cargador_embeddings.cargar_en_segundo_plano()
+
+
+def _sincronizar_indice_local():
+    try:
+        sincronizar_desde_qdrant(qdrant)
+    except Exception:
+        logger.exception("No se pudo sincronizar el índice local desde Qdrant")
+
+
+@app.on_event("startup")
+def preparar_indice_local():
+    # Índice en memoria (primario o respaldo de Qdrant): se carga el snapshot y,
+    # con INDICE_LOCAL_SINCRONIZAR=1, se refresca desde Qdrant en segundo plano.
+    indice_actual()
+    if os.getenv("INDICE_LOCAL_SINCRONIZAR", "0") == "1":
+        threading.Thread(target=_sincronizar_indice_local, name="sincronizar-indice-local", daemon=True).start()
+
+
+@app.on_event("startup")
+def cargar_tabla_ofertas():
+    # Tabla de ofertas generada por scripts/ingest_docs.py (data/ofertas.json)
+    ofertas_actuales()
+
+
 # Incluye router de búsqueda
 app.include_router(search_router)
 
@@ -80,6 +114,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Request-ID"],  # el frontend lee el ETag de /analisis
 )
 
 # -------------------- Utilidades de cálculo --------------------
@@ -101,85 +136,15 @@ def intereses_restantes_aprox(P: float, rate_annual: float, n_months: int) -> fl
 
 def resumen_amortizacion(P: float, rate_annual: float, n_months: int, hitos=(12, 60, 120)) -> List[Dict]:
     # Genera tabla de amortización mostrando el estado en meses específicos.
-
-    r = rate_annual / 12.0
-    c = cuota_mensual(P, rate_annual, n_months)
-    bal = P # Saldo pendiente
-    interes_acum = 0.0
-    out = []
-    # Incluye siempre el último mes además de los hitos definidos
-    setpoints = set(hitos) | {n_months}
-
-    for m in range(1, n_months + 1):
-        i = bal * r # Interés del mes actual
-        p = c - i # Amortización de capital
-        bal = max(0.0, bal - p) # Nuevo saldo
-        interes_acum += i
-
-        # Solo guarda información en los meses de interés
-        if m in setpoints:
-            out.append({
-                "mes": m,
-                "cuota": round(c, 2),
-                "interes_mes": round(i, 2),
-                "amortizado_mes": round(p, 2),
-                "saldo": round(bal, 2),
-                "interes_acum": round(interes_acum, 2),
-            })
-        # Termina iteración si ya está completamente pagado
-        if bal <= 0:
-            break
-
-    return out
+    return CuadroAmortizacion.calcular(P, rate_annual, n_months).resumen(hitos)
 
 def ahorro_amortizacion_extra(P: float, rate_annual: float, n_months: int, extra: float, when_month: int = 1) -> float:
     #Calcula el ahorro en intereses al hacer una amortización anticipada.
-
-    r = rate_annual / 12.0
-    c = cuota_mensual(P, rate_annual, n_months)
-
-    # SIN amortización extra
-    b = P
-    total_i_no = 0.0
-    for _ in range(1, n_months + 1):
-        i = b * r
-        total_i_no += i
-        b = max(0.0, b - (c - i))
-        if b <= 0:
-            break
-
-    # CON amortización extra
-    b = P
-    total_i_si = 0.0
-    for m in range(1, n_months + 1):
-        i = b * r
-        # Aplica la amortización extra en el mes indicado
-        if m == when_month:
-            b = max(0.0, b - extra)
-
-        # Calcula el pago del mes
-        pay = c if b + i > c else (b + i)
-        total_i_si += min(i, pay)
-        b = max(0.0, b - (pay - i))
-        if b <= 0:
-            break
-    # Devuelve la diferencia (ahorro)
-    return round(max(0.0, total_i_no - total_i_si), 2)
+    return CuadroAmortizacion.calcular(P, rate_annual, n_months).ahorro_extra(extra, when_month)
 
 def stress_test_cuota(P: float, rate_annual: float, n_months: int, deltas=(0.01, 0.02)):
     # Simula incrementos del tipo de interés para evaluar impacto en la cuota.
-    base = cuota_mensual(P, rate_annual, n_months)
-    res = []
-    for d in deltas:
-        r2 = max(0.0, rate_annual + d) # Tipo con incremento
-        c2 = cuota_mensual(P, r2, n_months) # Cuota con nuevo tipo
-        res.append({
-            "delta_tipo_pp": int(d * 100), # Delta en puntos porcentuales
-            "tipo_resultante": round((r2 * 100), 3), # Tipo resultante en %
-            "cuota": round(c2, 2),
-            "diferencia": round(c2 - base, 2), # Incremento de cuota
-        })
-    return round(base, 2), res
+    return CuadroAmortizacion.calcular(P, rate_annual, n_months).stress(deltas)
 
 def calcula_dti(cuota: float, ingresos_mensuales: Optional[float]) -> Optional[float]:
     """
@@ -230,8 +195,38 @@ class AnalisisInput(BaseModel):
     # Para comparar con ofertas de subrogación
     oferta_alternativa_tin: Optional[float] = None
 
+    # Sesión del frontend: el análisis queda asociado a ella para /preguntar
+    session_id: Optional[str] = None
+
+class SimulacionInput(AnalisisInput):
+    # Parámetros de la simulación Monte Carlo del Euríbor (en %)
+    n_trayectorias: int = Field(10_000, ge=100, le=100_000)
+    reversion: float = Field(0.3, ge=0.0, le=1.0)
+    euribor_largo_plazo: float = 2.5
+    volatilidad: float = Field(0.8, ge=0.0)
+    semilla: Optional[int] = None
+
+class AnalisisLoteInput(BaseModel):
+    # Formato filas: lista de hipotecas con los mismos campos que AnalisisInput
+    hipotecas: Optional[List[Dict[str, Any]]] = None
+    # Formato columnar: {"capital_pendiente": [...], "tin": [...], ...}
+    columnas: Optional[Dict[str, List[Any]]] = None
+    formato_salida: str = Field("filas", description="filas | columnas")
+
+class ComparacionOfertasInput(AnalisisInput):
+    # Filtros opcionales sobre la tabla de ofertas
+    edad: Optional[int] = Field(None, ge=18, le=100)
+    modalidad: Optional[str] = Field(None, description="fijo | variable | mixto")
+    banco: Optional[str] = None
+    # Aplica la rebaja máxima por productos vinculados
+    con_bonificaciones: bool = False
+    top_k: int = Field(10, ge=1, le=100)
+
+# Longitud máxima de una pregunta (caracteres): acota el prompt y la memoria de la sesión
+PREGUNTA_MAX_CHARS = int(os.getenv("PREGUNTA_MAX_CHARS", "2000"))
+
 class PreguntaInput(BaseModel):
-    pregunta: str
+    pregunta: str = Field(..., max_length=PREGUNTA_MAX_CHARS)
     session_id: str
     temperature: float = 0.2
     max_tokens: int = 250
@@ -242,11 +237,26 @@ class PreguntaInput(BaseModel):
 async def simple_logger(request: Request, call_next):
     # Para monitorización y debug
 
-    start = time.time()
-    response = await call_next(request)
-    duration = time.time() - start
-    logger.info(f"{request.method} {request.url.path} → {response.status_code} ({duration:.2f}s)")
-    return response
+    # Id de la petición (el del cliente si lo manda) y etapas medidas: van en cada línea de log
+    ident = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token_id = id_peticion.set(ident)
+    token_etapas = etapas_peticion.set({})
+    try:
+        start = time.perf_counter()
+        response = await call_next(request)
+        duration = time.perf_counter() - start
+        # Por plantilla de ruta ("/pdfs/{filename}"), no por URL, para no crear una serie por fichero
+        ruta = getattr(request.scope.get("route"), "path", "sin_ruta")
+        duracion_peticiones.observar(duration, request.method, ruta, str(response.status_code))
+        logger.info(
+            f"{request.method} {request.url.path} → {response.status_code} ({duration:.2f}s)",
+            extra={"ruta": ruta, "estado": response.status_code, "duracion_ms": round(duration * 1000.0, 2), "muestreable": True},
+        )
+        response.headers["X-Request-ID"] = ident
+        return response
+    finally:
+        id_peticion.reset(token_id)
+        etapas_peticion.reset(token_etapas)
 
 # -------------------- Básicos --------------------
 @app.get("/")
@@ -266,57 +276,195 @@ def health_check():
     hours, remainder = divmod(uptime.seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
     uptime_formatted = f"{days}d {hours:02d}:{minutes:02d}:{seconds:02d}"
-    return {"status": "ok", "uptime": uptime_formatted}
+    modelo = cargador_embeddings.estado()
+    return {
+        "status": "ok" if modelo["estado"] == "listo" else modelo["estado"],
+        "listo": modelo["estado"] == "listo",
+        "uptime": uptime_formatted,
+        "modelo_embeddings": modelo,
+        "memoria": memoria.estadisticas(),
+        "sesiones_analisis": almacen_analisis.sesiones_activas(),
+        "ttft_ms": percentiles(ttft_recientes),
+        "cache_respuestas": cache_respuestas.estadisticas(),
+        "cache_analisis": cache_analisis.estadisticas(),
+        "llm": cliente_llm.estadisticas(),
+    }
 
-# -------------------- /analisis --------------------
-@app.post("/analisis")
-def analisis(data: AnalisisInput):
-    # analiza una hipoteca y calcula todas las métricas.
+# -------------------- /metrics --------------------
+def _aciertos_caches() -> Dict:
+    emb, resp = cache_embeddings.estadisticas(), cache_respuestas.estadisticas()
+    return {
+        ("embeddings", "hit"): emb["hits"],
+        ("embeddings", "miss"): emb["misses"],
+        ("respuestas", "hit_exacto"): resp["hits_exactos"],
+        ("respuestas", "hit_semantico"): resp["hits_semanticos"],
+        ("respuestas", "miss"): resp["misses"],
+        ("analisis", "hit"): cache_analisis.hits,
+        ("analisis", "miss"): cache_analisis.misses,
+    }
 
-    global ultimo_resultado
 
-    logger.info(f"Analizando hipoteca: tipo={data.tipo}, capital={data.capital_pendiente}, años={data.anos_restantes}")
+def _llamadas_llm() -> Dict:
+    llm = cliente_llm.estadisticas()
+    return {(clave,): llm[clave] for clave in ("llamadas", "reintentos", "hedges", "hedges_ganados")}
+
+
+# Se leen al pedir /metrics: no añaden trabajo a las peticiones
+registro.registrar(Medidor(
+    "hipotecassist_cache_consultas_total",
+    "Consultas a las cachés de embeddings, respuestas y análisis por resultado",
+    _aciertos_caches, ("cache", "resultado"), tipo="counter",
+))
+registro.registrar(Medidor(
+    "hipotecassist_cache_hit_ratio",
+    "Proporción de aciertos de cada caché desde el arranque",
+    lambda: {
+        ("embeddings",): cache_embeddings.estadisticas()["hit_rate"],
+        ("respuestas",): cache_respuestas.estadisticas()["hit_rate"],
+        ("analisis",): cache_analisis.estadisticas()["hit_rate"],
+    },
+    ("cache",),
+))
+def _sesiones_activas() -> Dict:
+    sesiones = {("conversacion",): memoria.estadisticas()["sesiones"]}
+    analisis = almacen_analisis.sesiones_activas()
+    if analisis is not None:  # el almacén compartido no las cuenta
+        sesiones[("analisis",)] = analisis
+    return sesiones
+
+
+registro.registrar(Medidor(
+    "hipotecassist_sesiones",
+    "Sesiones activas: conversaciones en memoria y análisis guardados (sin almacén compartido)",
+    _sesiones_activas, ("tipo",),
+))
+registro.registrar(Medidor(
+    "hipotecassist_logs_descartados_total",
+    "Registros de log descartados porque la cola de escritura estaba llena",
+    descartados, tipo="counter",
+))
+registro.registrar(Medidor(
+    "hipotecassist_llm_total",
+    "Llamadas al LLM, reintentos y peticiones de cobertura (hedges)",
+    _llamadas_llm, ("evento",), tipo="counter",
+))
+
+
+@app.get("/metrics")
+def metrics():
+    # Formato de texto de Prometheus
+    return Response(registro.exponer(), media_type=CONTENT_TYPE)
 
-    P = data.capital_pendiente
-    n_meses = data.anos_restantes * 12
 
-    # Determina el tipo de interés según tipo de hipoteca
+# -------------------- /analisis --------------------
+def _tipo_anual(data: AnalisisInput):
+    # (tipo anual en tanto por uno, etiqueta, error) según el tipo de hipoteca.
     if data.tipo.lower() == "variable":
         # Hipoteca variable: Euríbor + diferencial
         if data.euribor is None or data.diferencial is None:
             logger.warning("Faltan euribor o diferencial para hipoteca variable")
-            return {"ok": False, "error": "Para 'variable' necesitas euribor y diferencial."}
-        tipo_anual = (data.euribor + data.diferencial) / 100.0
-        tipo_label = f"variable (Euríbor {data.euribor:.2f}% + {data.diferencial:.2f}%)"
+            return None, None, "Para 'variable' necesitas euribor y diferencial."
+        return (data.euribor + data.diferencial) / 100.0, f"variable (Euríbor {data.euribor:.2f}% + {data.diferencial:.2f}%)", None
+    # Hipoteca fija: TIN directo
+    if data.tin is None:
+        logger.warning("Falta TIN para hipoteca fija")
+        return None, None, "Para 'fijo' necesitas el TIN (%)."
+    return data.tin / 100.0, f"fijo ({data.tin:.2f}%)", None
+
+
+# Súbela al cambiar los cálculos de /analisis: las huellas cambian y las entradas
+# persistidas con la versión anterior dejan de usarse
+VERSION_ANALISIS = "1"
+
+cache_analisis = CacheAnalisis(
+    max_items=int(os.getenv("ANALISIS_CACHE_SIZE", "1024")),
+    ruta=os.getenv("ANALISIS_CACHE_PATH") or None,
+)
+atexit.register(cache_analisis.guardar)
+
+
+def huella_analisis(data: AnalisisInput) -> str:
+    # Misma huella para el mismo formulario, venga de la sesión que venga
+    datos = data.model_dump(exclude={"session_id"})
+    datos["tipo"] = datos["tipo"].strip().lower()
+    return huella(datos, VERSION_ANALISIS)
+
+
+def _etag_coincide(etag: str, if_none_match: Optional[str]) -> bool:
+    # Solo ETags explícitos: "*" no prueba que el cliente tenga este resultado
+    if not if_none_match:
+        return False
+    return etag in {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+
+
+@app.post("/analisis")
+def analisis(data: AnalisisInput, request: Request):
+    # Resultado memoizado por huella de la entrada; la huella es también el ETag.
+    etag = f'"{huella_analisis(data)}"'
+    cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+    no_modificado = _etag_coincide(etag, request.headers.get("if-none-match"))
+
+    # Sin sesión que actualizar, el cliente ya tiene el resultado: ni se calcula ni se serializa
+    if no_modificado and not data.session_id:
+        return Response(status_code=304, headers=cabeceras)
+
+    cacheado = cache_analisis.obtener(etag)
+    if cacheado is None:
+        resultado = _calcular_analisis(data)
+        if not resultado["ok"]:
+            return resultado
+        cuerpo = serializar(resultado)
+        cache_analisis.guardar_resultado(etag, cuerpo, resultado)
     else:
-        # Hipoteca fija: TIN directo
-        if data.tin is None:
-            logger.warning("Falta TIN para hipoteca fija")
-            return {"ok": False, "error": "Para 'fijo' necesitas el TIN (%)."}
-        tipo_anual = data.tin / 100.0
-        tipo_label = f"fijo ({data.tin:.2f}%)"
+        cuerpo, resultado = cacheado
+
+    if data.session_id:
+        almacen_analisis.guardar(data.session_id, resultado)
+    if no_modificado:
+        return Response(status_code=304, headers=cabeceras)
+    return Response(cuerpo, media_type="application/json", headers=cabeceras)
+
+
+def _calcular_analisis(data: AnalisisInput) -> Dict:
+    # analiza una hipoteca y calcula todas las métricas.
+
+    logger.info(
+        f"Analizando hipoteca: tipo={data.tipo}, capital={data.capital_pendiente}, años={data.anos_restantes}",
+        extra={"muestreable": True},
+    )
+
+    P = data.capital_pendiente
+    n_meses = data.anos_restantes * 12
+
+    # Determina el tipo de interés según tipo de hipoteca
+    tipo_anual, tipo_label, error = _tipo_anual(data)
+    if error:
+        return {"ok": False, "error": error}
+
+    # Cuadro base: se calcula una vez y lo comparten hitos, stress test y amortizaciones extra
+    cuadro = CuadroAmortizacion.calcular(P, tipo_anual, n_meses)
 
     # Calcula cuota estimada y usa la real si está disponible
-    cuota_estimada = cuota_mensual(P, tipo_anual, n_meses)
+    cuota_estimada = cuadro.cuota
     cuota_efectiva = data.cuota_actual or cuota_estimada
 
     # Calcula intereses totales restantes
     intereses_totales = intereses_restantes_aprox(P, tipo_anual, n_meses)
 
     # Genera tabla de amortización en puntos clave (años 1, 5, 10)
-    resumen = resumen_amortizacion(P, tipo_anual, n_meses, hitos=(12, 60, 120))
+    resumen = cuadro.resumen(hitos=(12, 60, 120))
 
     # Calcula ratios financieros (DTI y LTV)
     dti = calcula_dti(cuota_efectiva + (data.otras_deudas_mensuales or 0.0), data.ingresos_mensuales)
     ltv = calcula_ltv(P, data.valor_vivienda)
 
     # Stress test: simula subidas de +1% y +2%
-    cuota_base, stress = stress_test_cuota(P, tipo_anual, n_meses, deltas=(0.01, 0.02))
+    cuota_base, stress = cuadro.stress(deltas=(0.01, 0.02))
 
     # Calcula ahorro por amortizaciones anticipadas de 1k, 5k y 10k
-    ahorro_1k = ahorro_amortizacion_extra(P, tipo_anual, n_meses, 1000.0, 1)
-    ahorro_5k = ahorro_amortizacion_extra(P, tipo_anual, n_meses, 5000.0, 1)
-    ahorro_10k = ahorro_amortizacion_extra(P, tipo_anual, n_meses, 10000.0, 1)
+    ahorro_1k = cuadro.ahorro_extra(1000.0, 1)
+    ahorro_5k = cuadro.ahorro_extra(5000.0, 1)
+    ahorro_10k = cuadro.ahorro_extra(10000.0, 1)
 
     # Comparativa con oferta alternativa (si existe)
     comparativa = None
@@ -333,17 +481,7 @@ def analisis(data: AnalisisInput):
         }
 
     # Genera avisos basados en DTI y LTV
-    avisos = []
-    if dti is not None:
-        if dti >= 40:
-            avisos.append("DTI alto (>40%): riesgo de sobreendeudamiento.")
-        elif dti >= 35:
-            avisos.append("DTI moderado (35–40%): vigila tu colchón financiero.")
-    if ltv is not None:
-        if ltv > 80:
-            avisos.append("LTV >80%: alto apalancamiento; la subrogación puede ser más difícil.")
-        elif ltv > 70:
-            avisos.append("LTV 70–80%: margen razonable, pero cuidado con caídas de valor.")
+    avisos = avisos_riesgo(dti, ltv)
 
     # Construye respuesta completa con todas las métricas
     resultado = {
@@ -363,11 +501,166 @@ def analisis(data: AnalisisInput):
         "avisos": avisos,
     }
 
-    ultimo_resultado = resultado
-    logger.info("Análisis completado CORRECTAMENTE")
+    logger.info("Análisis completado CORRECTAMENTE", extra={"muestreable": True})
     return resultado
 
 
+# -------------------- /analisis/batch --------------------
+@app.post("/analisis/batch")
+def analisis_batch(data: AnalisisLoteInput):
+    # Analiza una cartera completa de hipotecas con operaciones vectorizadas.
+
+    if (data.hipotecas is None) == (data.columnas is None):
+        raise HTTPException(status_code=400, detail="Envía 'hipotecas' (lista) o 'columnas' (arrays), pero no ambos.")
+
+    columnas = data.columnas if data.columnas is not None else columnas_desde_filas(data.hipotecas)
+    try:
+        res = analizar_lote(columnas)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Datos de la cartera no válidos: {e}")
+
+    logger.info(f"Análisis por lotes completado: {res['n']} hipotecas ({int(res['ok'].sum())} válidas)")
+
+    # JSONResponse directo: evita pasar miles de filas por jsonable_encoder
+    resultados = a_columnas(res) if data.formato_salida == "columnas" else a_filas(res)
+    return JSONResponse({"ok": True, "n": res["n"], "resultados": resultados})
+
+
+# -------------------- /analisis/simulacion --------------------
+@app.post("/analisis/simulacion")
+def analisis_simulacion(data: SimulacionInput):
+    # Stress test estocástico: distribución de cuota, intereses y DTI para hipotecas variables.
+
+    if data.tipo.lower() != "variable":
+        return {"ok": False, "error": "La simulación del Euríbor solo aplica a hipotecas 'variable'."}
+    if data.euribor is None or data.diferencial is None:
+        return {"ok": False, "error": "Para 'variable' necesitas euribor y diferencial."}
+
+    start = time.perf_counter()
+    simulacion = simular_hipoteca_variable(
+        data.capital_pendiente,
+        data.euribor,
+        data.diferencial,
+        data.anos_restantes * 12,
+        n_trayectorias=data.n_trayectorias,
+        reversion=data.reversion,
+        euribor_largo_plazo=data.euribor_largo_plazo,
+        volatilidad=data.volatilidad,
+        semilla=data.semilla,
+        ingresos_mensuales=data.ingresos_mensuales,
+        otras_deudas_mensuales=data.otras_deudas_mensuales or 0.0,
+    )
+    logger.info(f"Simulación Euríbor: {data.n_trayectorias} trayectorias en {(time.perf_counter() - start) * 1000:.1f} ms")
+    return {"ok": True, "simulacion": simulacion}
+
+
+# -------------------- /ofertas --------------------
+# Euríbor con el que se calculan las ofertas variables y mixtas si la petición no lo trae (en %)
+EURIBOR_REFERENCIA = float(os.getenv("EURIBOR_REFERENCIA", "2.2"))
+
+
+@app.get("/ofertas")
+def listar_ofertas():
+    # Tabla de ofertas extraída de los PDFs en la última ingesta.
+    ofertas = ofertas_actuales()
+    return {"ok": True, "n": len(ofertas), "ofertas": [a_dict(o) for o in ofertas]}
+
+
+def _coste_oferta(oferta, P: float, n_meses: int, euribor: float, con_bonificaciones: bool) -> Dict:
+    # Cuota e intereses de la oferta con la misma aritmética que /analisis.
+    rebaja = (oferta.bonificacion_max or 0.0) if con_bonificaciones else 0.0
+    if oferta.modalidad == "fijo":
+        tipo = oferta.tin - rebaja
+        tipo_medio = tipo
+    elif oferta.modalidad == "variable":
+        tipo = euribor + oferta.diferencial - rebaja
+        tipo_medio = tipo
+    else:
+        # Mixto: cuota del tramo fijo; intereses con el tipo medio ponderado por meses (aprox.)
+        tipo = oferta.tin - rebaja
+        meses_fijos = min((oferta.anos_fijos or 0) * 12, n_meses)
+        tipo_variable = euribor + oferta.diferencial - rebaja
+        tipo_medio = (tipo * meses_fijos + tipo_variable * (n_meses - meses_fijos)) / n_meses
+
+    cuota = cuota_mensual(P, tipo / 100.0, n_meses)
+    intereses = intereses_restantes_aprox(P, tipo_medio / 100.0, n_meses)
+    apertura = P * (oferta.comision_apertura or 0.0) / 100.0
+    return {
+        "banco": oferta.banco,
+        "producto": oferta.producto,
+        "modalidad": oferta.modalidad,
+        "tin": oferta.tin,
+        "diferencial": oferta.diferencial,
+        "anos_fijos": oferta.anos_fijos,
+        "edad": [oferta.edad_min, oferta.edad_max],
+        "tipo_aplicado": round(tipo, 3),
+        "tipo_medio": round(tipo_medio, 3),
+        "cuota": round(cuota, 2),
+        "intereses": round(intereses, 2),
+        "comision_apertura": round(apertura, 2),
+        "coste_total": round(intereses + apertura, 2),
+        "origen": oferta.origen,
+        "url": f"/pdfs/{oferta.origen}#page={oferta.pagina}" if oferta.origen and oferta.pagina else None,
+    }
+
+
+@app.post("/ofertas/comparar")
+def comparar_ofertas(data: ComparacionOfertasInput):
+    # Ordena las ofertas de la tabla por coste total (intereses + apertura) frente a la hipoteca actual, sin LLM.
+    inicio = time.perf_counter()
+    tipo_anual, tipo_label, error = _tipo_anual(data)
+    if error:
+        return {"ok": False, "error": error}
+    modalidad = (data.modalidad or "").strip().lower() or None
+    if modalidad and modalidad not in MODALIDADES:
+        raise HTTPException(status_code=400, detail=f"modalidad debe ser una de {', '.join(MODALIDADES)}")
+    ofertas = ofertas_actuales()
+    if not ofertas:
+        return {"ok": False, "error": "No hay tabla de ofertas: ejecuta scripts/ingest_docs.py."}
+
+    P = data.capital_pendiente
+    n_meses = data.anos_restantes * 12
+    cuota_actual = data.cuota_actual or cuota_mensual(P, tipo_anual, n_meses)
+    intereses_actuales = intereses_restantes_aprox(P, tipo_anual, n_meses)
+    euribor = data.euribor if data.euribor is not None else EURIBOR_REFERENCIA
+    banco = (normalizar_banco(data.banco) or data.banco.strip().upper()) if data.banco else None
+    ltv = calcula_ltv(P, data.valor_vivienda)
+
+    resultados, descartadas = [], 0
+    for oferta in ofertas:
+        if not oferta.admite_edad(data.edad) or (modalidad and oferta.modalidad != modalidad) or (banco and oferta.banco != banco):
+            continue
+        plazo = oferta.plazo_maximo(data.edad)
+        if plazo and data.anos_restantes > plazo:
+            descartadas += 1
+            continue
+        fila = _coste_oferta(oferta, P, n_meses, euribor, data.con_bonificaciones)
+        fila["diferencia_cuota"] = round(fila["cuota"] - cuota_actual, 2)
+        fila["ahorro_total"] = round(intereses_actuales - fila["coste_total"], 2)
+        fila["avisos"] = (
+            [f"Financia hasta el {oferta.financiacion_max:.0f}% y tu LTV es {ltv:.1f}%"]
+            if ltv is not None and oferta.financiacion_max and ltv > oferta.financiacion_max
+            else []
+        )
+        resultados.append(fila)
+
+    # Orden determinista: coste y, a igualdad, banco, modalidad y tramo de edad
+    resultados.sort(key=lambda r: (r["coste_total"], r["banco"], r["modalidad"], r["edad"][0] or 0))
+    logger.info(f"Comparación de ofertas: {len(resultados)} candidatas en {(time.perf_counter() - inicio) * 1000:.2f} ms")
+    return {
+        "ok": True,
+        "hipoteca_actual": {
+            "tipo": tipo_label,
+            "cuota": round(cuota_actual, 2),
+            "intereses_restantes_aprox": round(intereses_actuales, 2),
+        },
+        "euribor_referencia": euribor,
+        "con_bonificaciones": data.con_bonificaciones,
+        "descartadas_por_plazo": descartadas,
+        "ofertas": resultados[:data.top_k],
+    }
+
+
 # @app.get("/pdf/{filename}")
 # def get_pdf(filename: str):
 #     ruta = f"../data/docs_bancarios/{filename}"
@@ -376,66 +669,86 @@ def analisis(data: AnalisisInput):
 #     return FileResponse(ruta, media_type="application/pdf", filename=filename)
 
 
-@app.post("/preguntar")
-def preguntar_llm(datos: PreguntaInput):
-    session_id = datos.session_id  # obligatorio desde el frontend
-    logger.info(f"/preguntar recibida para session_id={session_id}: '{datos.pregunta[:50]}...'")
-
-    if not datos.pregunta.strip():
-        raise HTTPException(status_code=400, detail="La pregunta no puede estar vacía.")
-    if not ultimo_resultado:
-        raise HTTPException(status_code=400, detail="No hay análisis previo. Envía el formulario primero.")
-
-    resultado_actual = ultimo_resultado
-
-    # Buscar documentos relevantes
-    docs_rag = buscar_hipotecas_en_qdrant(query=datos.pregunta, top_k=5, min_score=0.15)
+def _completar_rutas_pdf(docs_rag: List[Dict]) -> List[Dict]:
     for d in docs_rag:
         if not d.get("ruta_pdf") and d.get("origen"):
             d["ruta_pdf"] = d["origen"].replace("\\", "/")
+    return docs_rag
 
-    # ------------------ MEMORIA POR SESIÓN ------------------
-    historial_texto = memoria.obtener_historial(session_id)
-    pregunta_con_contexto = datos.pregunta
-    if historial_texto:
-        pregunta_con_contexto += f"\nHISTORIAL_CONVERSACION:\n{historial_texto}\n"
 
-    respuesta = responder_pregunta_gemini(
-        pregunta=pregunta_con_contexto,
-        contexto=resultado_actual,
-        documentos_rag=docs_rag,
-        temperature=datos.temperature,
-        max_tokens=datos.max_tokens
-    )
+async def _vector_para_cache(pregunta: str):
+    # Solo la caché semántica necesita el embedding de la pregunta; como la búsqueda
+    # RAG acaba de calcularlo, sale de la caché de embeddings sin coste.
+    if not cache_respuestas.semantica:
+        return None
+    return await embed_query_async(pregunta)
 
-    # Guardar interacción en la memoria del usuario
-    memoria.agregar_a_memoria(session_id, datos.pregunta, respuesta)
-    # ---------------------------------------------------------
 
-    # Detectar bancos mencionados en la respuesta
-    BANCOS_KNOWN = ["BBVA", "ING", "SANTANDER"] 
-    respuesta_upper = respuesta.upper()
-    bancos_mencionados = set()
-    for banco in BANCOS_KNOWN:
-        if banco in respuesta_upper:
-            bancos_mencionados.add(banco)
+def _documentos_para_front(respuesta: str, docs_rag: List[Dict]) -> List[Dict]:
+    # Detectar bancos mencionados en la respuesta (palabra completa, nombre canónico)
+    bancos_mencionados = set(bancos_en_texto(respuesta))
 
     # Filtrar PDFs solo de bancos mencionados
-    documentos_para_front = []
+    documentos = []
     seen_files = set()
     for d in docs_rag:
-        banco_doc = (d.get("banco") or "").upper()
+        banco_doc = normalizar_banco(d.get("banco"))
         pdf = d.get("ruta_pdf")
         if pdf and banco_doc in bancos_mencionados:
             filename = os.path.basename(pdf)
             if filename not in seen_files:
-                documentos_para_front.append({
+                # Enlaza a la página del chunk mejor puntuado de cada PDF
+                pagina = d.get("page_start")
+                documentos.append({
                     "origen": filename,
-                    "url": f"/pdfs/{filename}"
+                    "url": f"/pdfs/{filename}#page={pagina}" if pagina else f"/pdfs/{filename}",
+                    "pagina": pagina,
                 })
                 seen_files.add(filename)
+    return documentos
+
+
+def _analisis_de_sesion(datos: PreguntaInput) -> Dict:
+    if not datos.pregunta.strip():
+        raise HTTPException(status_code=400, detail="La pregunta no puede estar vacía.")
+    resultado_actual = almacen_analisis.obtener(datos.session_id)
+    if not resultado_actual:
+        raise HTTPException(status_code=400, detail="No hay análisis previo. Envía el formulario primero.")
+    return resultado_actual
+
+
+@app.post("/preguntar")
+async def preguntar_llm(datos: PreguntaInput):
+    # Camino asíncrono: embedding en el hilo del despachador, Qdrant y Gemini con
+    # clientes async y concurrencia acotada. No ocupa hilos del threadpool mientras espera.
+    session_id = datos.session_id  # obligatorio desde el frontend
+    # Sin el texto de la pregunta: solo su longitud
+    logger.info(f"/preguntar recibida para session_id={session_id}", extra={"pregunta_chars": len(datos.pregunta)})
 
-    logger.info(f"Se enviarán {len(documentos_para_front)} PDFs al frontend")
+    resultado_actual = _analisis_de_sesion(datos)
+
+    # Buscar documentos relevantes
+    docs_rag = _completar_rutas_pdf(
+        await buscar_documentos_async(query=datos.pregunta, top_k=5, min_score=0.15)
+    )
+
+    respuesta = await responder_pregunta_gemini_async(
+        pregunta=datos.pregunta,
+        contexto=resultado_actual,
+        documentos_rag=docs_rag,
+        temperature=datos.temperature,
+        max_tokens=datos.max_tokens,
+        historial=memoria.obtener_historial(session_id),
+        vector_pregunta=await _vector_para_cache(datos.pregunta),
+    )
+
+    # Guardar interacción en la memoria del usuario
+    inicio_memoria = time.perf_counter()
+    memoria.agregar_a_memoria(session_id, datos.pregunta, respuesta)
+    observar_etapa("memoria", time.perf_counter() - inicio_memoria)
+
+    documentos_para_front = _documentos_para_front(respuesta, docs_rag)
+    logger.info(f"Se enviarán {len(documentos_para_front)} PDFs al frontend", extra={"muestreable": True})
 
     return {
         "ok": True,
@@ -444,10 +757,75 @@ def preguntar_llm(datos: PreguntaInput):
     }
 
 
+def _evento_sse(evento: str, datos: Dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@app.post("/preguntar/stream")
+async def preguntar_llm_stream(datos: PreguntaInput):
+    # Igual que /preguntar, pero enviando la respuesta como Server-Sent Events:
+    # un evento "token" por fragmento y un evento "fin" con los documentos usados,
+    # o un evento "error" si la generación no termina (la memoria no se toca).
+    session_id = datos.session_id
+    logger.info(f"/preguntar/stream recibida para session_id={session_id}", extra={"pregunta_chars": len(datos.pregunta)})
+
+    inicio = time.perf_counter()
+    resultado_actual = _analisis_de_sesion(datos)
+    docs_rag = _completar_rutas_pdf(
+        await buscar_documentos_async(query=datos.pregunta, top_k=5, min_score=0.15)
+    )
+    historial = memoria.obtener_historial(session_id)
+    vector_pregunta = await _vector_para_cache(datos.pregunta)
+
+    async def eventos():
+        partes = []
+        ttft_ms = None
+        try:
+            async for trozo in responder_pregunta_gemini_stream(
+                pregunta=datos.pregunta,
+                contexto=resultado_actual,
+                documentos_rag=docs_rag,
+                temperature=datos.temperature,
+                max_tokens=datos.max_tokens,
+                historial=historial,
+                vector_pregunta=vector_pregunta,
+            ):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - inicio) * 1000.0
+                    ttft_recientes.append(ttft_ms)
+                    logger.info(f"/preguntar/stream primer token en {ttft_ms:.0f} ms")
+                partes.append(trozo)
+                yield _evento_sse("token", {"texto": trozo})
+        except ErrorGeneracion as e:
+            # Respuesta vacía, parcial o de error: no va a la memoria de la conversación
+            logger.warning(f"/preguntar/stream sin completar ({e.motivo}) tras {len(partes)} fragmentos")
+            yield _evento_sse("error", {"ok": False, "motivo": e.motivo, "mensaje": e.mensaje})
+            return
+
+        # Solo se llega aquí si el stream termina bien: entonces se guarda en memoria
+        respuesta = "".join(partes).strip()
+        inicio_memoria = time.perf_counter()
+        memoria.agregar_a_memoria(session_id, datos.pregunta, respuesta)
+        observar_etapa("memoria", time.perf_counter() - inicio_memoria)
+        documentos_para_front = _documentos_para_front(respuesta, docs_rag)
+        yield _evento_sse("fin", {
+            "ok": True,
+            "documentos_usados": documentos_para_front,
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        })
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/reiniciar_sesion")
 def reiniciar_sesion_endpoint(datos: dict):
     session_id = datos.get("session_id")
     if session_id:
         memoria.reiniciar_sesion(session_id)
+        almacen_analisis.borrar(session_id)
         return {"ok": True, "mensaje": f"Sesión {session_id} reiniciada"}
     return {"ok": False, "mensaje": "Falta session_id"}
@@ -1,7 +1,20 @@
 # backend/llm.py
 import os
+import asyncio
+import hashlib
 import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from services.cache_embeddings import normalizar_consulta
+from services.metricas import observar_etapa, tokens_gemini
 # from google import genai
 
 
@@ -141,8 +154,11 @@ def _build_docs_block(documentos_rag: list) -> str:
         if pdf:
             # Extrae solo el nombre del archivo del path completo
             filename = os.path.basename(pdf)
+            pagina = d.get("page_start")
+            ancla = f"#page={pagina}" if pagina else ""
+            etiqueta = f"{filename}, pág. {pagina}" if pagina else filename
             # Link clicable para HTML
-            lines.append(f"{texto} (Fuente: <a href='/pdfs/{filename}' target='_blank'>{filename}</a>, id={doc_id})")
+            lines.append(f"{texto} (Fuente: <a href='/pdfs/{filename}{ancla}' target='_blank'>{etiqueta}</a>, id={doc_id})")
         else:
             # Si no hay PDF, usa el campo 'origen' como referencia
             origen = d.get("origen") or "desconocido"
@@ -190,35 +206,142 @@ def resumir_contexto_usuario_natural(contexto: dict) -> str:
 
     return resumen
 
-# -------------------- Función principal --------------------
-def responder_pregunta_gemini(
-    pregunta: str,
-    contexto: dict,
-    documentos_rag: list,
-    temperature: float = 0.2,
-    max_tokens: int = 250,
-) -> str:
-    """
-    Genera una respuesta usando Gemini basada en la pregunta del usuario,
-    su contexto hipotecario y documentos RAG relevantes.
+class CacheRespuestas:
     """
-    try:
-        # Verifica que exista la API key de Google
-        api_key = os.getenv("GOOGLE_API_KEY").strip()
-        if not api_key:
-            return "Respuesta: Error: falta GOOGLE_API_KEY en variables de entorno.\nFuentes: Ninguna (config)"
-
-        # Configura cliente de Gemini
-        genai.configure(api_key=api_key)
+    Caché de respuestas del LLM en dos niveles:
 
-        # Prepara los bloques de contexto para el prompt
-        docs_block = _build_docs_block(documentos_rag)
-        contexto_resumido = resumir_contexto_usuario_natural(contexto)
+    - Exacto: hash de (pregunta normalizada, historial, resumen del análisis,
+      ids de documentos RAG ordenados, temperature, max_tokens).
+    - Semántico (opcional): para el mismo contexto (todo lo anterior salvo la
+      pregunta), reutiliza la respuesta de una pregunta cuyo embedding tenga
+      similitud coseno >= umbral con la nueva.
 
-        # Construye el prompt completo con instrucciones, contexto y pregunta
-        prompt = f"""{SYSTEM_INSTRUCTION}
+    Cada nivel tiene su propio tamaño máximo (LRU) y TTL.
+    """
 
-ANALISIS_USUARIO:
+    def __init__(
+        self,
+        max_items: int = 1024,
+        ttl_segundos: float = 3600.0,
+        semantica: bool = False,
+        umbral: float = 0.95,
+        max_items_semantica: int = 512,
+        ttl_semantica: float = 900.0,
+    ):
+        self.max_items = max_items
+        self.ttl_segundos = ttl_segundos
+        self.semantica = semantica
+        self.umbral = umbral
+        self.max_items_semantica = max_items_semantica
+        self.ttl_semantica = ttl_semantica
+        self._exacta: "OrderedDict[str, tuple]" = OrderedDict()  # clave -> (respuesta, ts)
+        self._semantica: "OrderedDict[tuple, tuple]" = OrderedDict()  # (ctx, clave) -> (vector, respuesta, ts)
+        self._por_contexto: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits_exactos = 0
+        self.hits_semanticos = 0
+        self.misses = 0
+
+    @staticmethod
+    def claves(pregunta: str, historial: str, contexto_resumido: str, documentos_rag: list,
+               temperature: float, max_tokens: int) -> Tuple[str, str]:
+        # Devuelve (clave_exacta, clave_contexto).
+        doc_ids = ",".join(sorted(str(d.get("id", "")) for d in documentos_rag or []))
+        contexto = "\x1f".join([historial, contexto_resumido, doc_ids, f"{temperature:.3f}", str(max_tokens)])
+        clave_contexto = hashlib.sha256(contexto.encode("utf-8")).hexdigest()
+        clave_exacta = hashlib.sha256(f"{clave_contexto}\x1f{normalizar_consulta(pregunta)}".encode("utf-8")).hexdigest()
+        return clave_exacta, clave_contexto
+
+    def _quitar_semantica(self, clave: tuple) -> None:
+        self._semantica.pop(clave, None)
+        claves_ctx = self._por_contexto.get(clave[0])
+        if claves_ctx is not None:
+            claves_ctx.discard(clave)
+            if not claves_ctx:
+                del self._por_contexto[clave[0]]
+
+    def buscar(self, claves: Tuple[str, str], vector: Optional[Sequence[float]] = None) -> Optional[str]:
+        clave_exacta, clave_contexto = claves
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._exacta.get(clave_exacta)
+            if entrada is not None:
+                if ahora - entrada[1] <= self.ttl_segundos:
+                    self._exacta.move_to_end(clave_exacta)
+                    self.hits_exactos += 1
+                    return entrada[0]
+                del self._exacta[clave_exacta]
+
+            if self.semantica and vector is not None and clave_contexto in self._por_contexto:
+                candidatas = []
+                for clave in list(self._por_contexto[clave_contexto]):
+                    v, respuesta, ts = self._semantica[clave]
+                    if ahora - ts > self.ttl_semantica:
+                        self._quitar_semantica(clave)
+                    else:
+                        candidatas.append((clave, v, respuesta))
+                if candidatas:
+                    q = np.asarray(vector, dtype=np.float32)
+                    q = q / (np.linalg.norm(q) or 1.0)
+                    sims = np.stack([v for _, v, _ in candidatas]) @ q
+                    mejor = int(np.argmax(sims))
+                    if sims[mejor] >= self.umbral:
+                        self._semantica.move_to_end(candidatas[mejor][0])
+                        self.hits_semanticos += 1
+                        return candidatas[mejor][2]
+
+            self.misses += 1
+            return None
+
+    def guardar(self, claves: Tuple[str, str], respuesta: str, vector: Optional[Sequence[float]] = None) -> None:
+        clave_exacta, clave_contexto = claves
+        ahora = time.monotonic()
+        with self._lock:
+            self._exacta.pop(clave_exacta, None)
+            self._exacta[clave_exacta] = (respuesta, ahora)
+            while len(self._exacta) > self.max_items:
+                self._exacta.popitem(last=False)
+
+            if self.semantica and vector is not None:
+                v = np.asarray(vector, dtype=np.float32)
+                v = v / (np.linalg.norm(v) or 1.0)
+                clave = (clave_contexto, clave_exacta)
+                self._quitar_semantica(clave)
+                self._semantica[clave] = (v, respuesta, ahora)
+                self._por_contexto.setdefault(clave_contexto, set()).add(clave)
+                while len(self._semantica) > self.max_items_semantica:
+                    self._quitar_semantica(next(iter(self._semantica)))
+
+    def estadisticas(self) -> Dict:
+        total = self.hits_exactos + self.hits_semanticos + self.misses
+        return {
+            "entradas": len(self._exacta),
+            "entradas_semanticas": len(self._semantica),
+            "hits_exactos": self.hits_exactos,
+            "hits_semanticos": self.hits_semanticos,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_exactos + self.hits_semanticos) / total, 4) if total else 0.0,
+        }
+
+
+cache_respuestas = CacheRespuestas(
+    max_items=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    ttl_segundos=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    semantica=os.getenv("LLM_CACHE_SEMANTICA", "0") == "1",
+    umbral=float(os.getenv("LLM_CACHE_UMBRAL", "0.95")),
+    max_items_semantica=int(os.getenv("LLM_CACHE_SEMANTICA_SIZE", "512")),
+    ttl_semantica=float(os.getenv("LLM_CACHE_SEMANTICA_TTL", "900")),
+)
+
+
+def _construir_prompt(pregunta: str, historial: str, contexto_resumido: str, documentos_rag: list) -> str:
+    # Prepara los bloques de contexto para el prompt.
+    # SYSTEM_INSTRUCTION no va aquí: se pasa una sola vez al modelo como system_instruction.
+    docs_block = _build_docs_block(documentos_rag)
+    if historial:
+        pregunta += f"\nHISTORIAL_CONVERSACION:\n{historial}\n"
+
+    return f"""ANALISIS_USUARIO:
 {contexto_resumido}
 
 DOCUMENTOS_RAG:
@@ -228,26 +351,423 @@ PREGUNTA:
 {pregunta}
 """
 
-        # Inicializa modelo
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash-lite")
 
-        # Genera respuesta con configuración específica
-        resp = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": temperature,
-                "max_output_tokens": max_tokens,
-            },
+RESPUESTA_SIN_API_KEY = "Respuesta: Error: falta GOOGLE_API_KEY en variables de entorno.\nFuentes: Ninguna (config)"
+RESPUESTA_VACIA = "Respuesta: No he podido generar una respuesta con la información disponible.\nFuentes: Ninguna (no aparece en PDFs)"
+RESPUESTA_TIMEOUT = "Respuesta: El asistente está tardando más de lo normal, inténtalo de nuevo en unos segundos.\nFuentes: Ninguna (timeout)"
+
+# Límite de generaciones simultáneas y tiempo máximo por llamada en el camino asíncrono.
+# Así una ralentización de Gemini no acapara recursos del resto de endpoints.
+GEMINI_MAX_CONCURRENCIA = int(os.getenv("GEMINI_MAX_CONCURRENCIA", "8"))
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "30"))
+
+
+# -------------------- Backends del LLM --------------------
+class FaltaApiKey(RuntimeError):
+    pass
+
+
+class ErrorGeneracion(RuntimeError):
+    # El stream no terminó con una respuesta: `mensaje` es el texto para el usuario
+    # (mismo formato que las respuestas de error) y `motivo` una etiqueta corta.
+    def __init__(self, mensaje: str, motivo: str):
+        super().__init__(motivo)
+        self.mensaje = mensaje
+        self.motivo = motivo
+
+
+def _texto(resp) -> str:
+    # resp.text lanza ValueError si la respuesta viene sin partes (p. ej. bloqueada)
+    try:
+        return resp.text or ""
+    except (AttributeError, ValueError):
+        return ""
+
+
+def _anotar_tokens(resp) -> None:
+    # Suma los tokens de usage_metadata (si la respuesta lo trae) a /metrics.
+    uso = getattr(resp, "usage_metadata", None)
+    if uso is None:
+        return
+    tokens_gemini.inc(getattr(uso, "prompt_token_count", 0) or 0, "prompt")
+    tokens_gemini.inc(getattr(uso, "candidates_token_count", 0) or 0, "respuesta")
+
+
+def _anotar_etapa(etapa: str, inicio: float) -> float:
+    # Registra la etapa en /metrics y devuelve el instante final (inicio de la siguiente).
+    fin = time.perf_counter()
+    observar_etapa(etapa, fin - inicio)
+    return fin
+
+
+class BackendGemini:
+    """
+    Cliente de Gemini de larga duración: configura la API key y crea el
+    GenerativeModel (con SYSTEM_INSTRUCTION como system_instruction) una sola
+    vez; solo se reconstruye si cambia GOOGLE_API_KEY.
+    """
+
+    nombre = "gemini"
+
+    def __init__(self, modelo: str = "gemini-2.5-flash-lite", system_instruction: str = SYSTEM_INSTRUCTION):
+        self.modelo = modelo
+        self.system_instruction = system_instruction
+        self._api_key: Optional[str] = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _modelo(self):
+        api_key = (os.getenv("GOOGLE_API_KEY") or "").strip()
+        if not api_key:
+            raise FaltaApiKey()
+        if self._model is None or api_key != self._api_key:
+            with self._lock:
+                if self._model is None or api_key != self._api_key:
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(
+                        model_name=self.modelo,
+                        system_instruction=self.system_instruction,
+                    )
+                    self._api_key = api_key
+        return self._model
+
+    @staticmethod
+    def _config(temperature: float, max_tokens: int) -> Dict:
+        return {"temperature": temperature, "max_output_tokens": max_tokens}
+
+    async def generar_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        resp = await self._modelo().generate_content_async(prompt, generation_config=self._config(temperature, max_tokens))
+        _anotar_tokens(resp)
+        return _texto(resp).strip()
+
+    async def generar_stream(self, prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        resp = await self._modelo().generate_content_async(
+            prompt, generation_config=self._config(temperature, max_tokens), stream=True
         )
+        ultimo = None
+        async for chunk in resp:
+            ultimo = chunk
+            texto = _texto(chunk)
+            if texto:
+                yield texto
+        # El último fragmento trae el uso acumulado de toda la respuesta
+        if ultimo is not None:
+            _anotar_tokens(ultimo)
+
+
+class BackendFalso:
+    """
+    Backend sin red para medir latencia y throughput en local: espera
+    latencia_ms (+ jitter uniforme) y devuelve una respuesta fija. Con
+    tasa_error > 0 falla al azar con ConnectionError para ejercitar reintentos.
+    """
+
+    nombre = "falso"
+
+    def __init__(
+        self,
+        latencia_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        tasa_error: float = 0.0,
+        respuesta: str = "Respuesta: Respuesta simulada.\nFuentes: Ninguna (backend falso)",
+        semilla: Optional[int] = None,
+    ):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.tasa_error = tasa_error
+        self.respuesta = respuesta
+        self.llamadas = 0
+        self._rng = random.Random(semilla)
+
+    def _espera_s(self) -> float:
+        self.llamadas += 1
+        if self.tasa_error and self._rng.random() < self.tasa_error:
+            raise ConnectionError("error simulado del backend falso")
+        return (self.latencia_ms + self._rng.uniform(0.0, self.jitter_ms)) / 1000.0
+
+    async def generar_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        await asyncio.sleep(self._espera_s())
+        return self.respuesta
+
+    async def generar_stream(self, prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        # El primer fragmento llega a mitad de la latencia; el resto se reparte en lo que queda
+        espera = self._espera_s()
+        palabras = self.respuesta.split(" ")
+        await asyncio.sleep(espera / 2)
+        for i, palabra in enumerate(palabras):
+            if i:
+                await asyncio.sleep(espera / 2 / max(1, len(palabras) - 1))
+            yield palabra if i == 0 else " " + palabra
+
+
+# Errores transitorios que merece la pena reintentar
+_REINTENTABLES = (
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
+class ClienteLLM:
+    """
+    Envuelve un backend con concurrencia acotada, timeout por intento,
+    reintentos con backoff exponencial (con jitter) y, opcionalmente,
+    peticiones "hedged": si la primera no ha respondido en hedge_ms se lanza
+    una segunda idéntica y se usa la que acabe antes.
+    """
+
+    def __init__(
+        self,
+        backend,
+        max_concurrencia: int = GEMINI_MAX_CONCURRENCIA,
+        timeout_s: float = GEMINI_TIMEOUT_S,
+        reintentos: int = 2,
+        backoff_s: float = 0.5,
+        hedge_ms: float = 0.0,
+    ):
+        self.backend = backend
+        self.semaforo = asyncio.Semaphore(max_concurrencia)
+        self.timeout_s = timeout_s
+        self.reintentos = reintentos
+        self.backoff_s = backoff_s
+        self.hedge_s = hedge_ms / 1000.0
+        self.llamadas = 0
+        self.reintentos_hechos = 0
+        self.hedges = 0
+        self.hedges_ganados = 0
+
+    def _espera_backoff(self, intento: int) -> float:
+        return self.backoff_s * (2 ** intento) * (0.5 + random.random() / 2)
+
+    async def _una_llamada(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        async with self.semaforo:
+            return await asyncio.wait_for(
+                self.backend.generar_async(prompt, temperature, max_tokens), timeout=self.timeout_s
+            )
+
+    async def _con_hedge(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        tareas = [asyncio.ensure_future(self._una_llamada(prompt, temperature, max_tokens))]
+        try:
+            if self.hedge_s:
+                hechas, _ = await asyncio.wait(tareas, timeout=self.hedge_s)
+                if not hechas:
+                    self.hedges += 1
+                    tareas.append(asyncio.ensure_future(self._una_llamada(prompt, temperature, max_tokens)))
+
+            pendientes, error = set(tareas), None
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechas:
+                    if tarea.exception() is None:
+                        if tarea is not tareas[0]:
+                            self.hedges_ganados += 1
+                        return tarea.result()
+                    error = tarea.exception()
+            raise error
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    async def generar_async(self, prompt: str, temperature: float = 0.2, max_tokens: int = 250) -> str:
+        for intento in range(self.reintentos + 1):
+            try:
+                self.llamadas += 1
+                return await self._con_hedge(prompt, temperature, max_tokens)
+            except _REINTENTABLES as e:
+                if intento == self.reintentos:
+                    raise
+                self.reintentos_hechos += 1
+                logger.warning(f"LLM: intento {intento + 1} fallido ({e!r}), reintentando")
+                await asyncio.sleep(self._espera_backoff(intento))
+
+    async def generar_stream(self, prompt: str, temperature: float = 0.2, max_tokens: int = 250) -> AsyncIterator[str]:
+        # Solo se reintenta si aún no se ha enviado ningún fragmento al cliente.
+        # El timeout se aplica a la espera de cada fragmento.
+        for intento in range(self.reintentos + 1):
+            emitido = False
+            try:
+                self.llamadas += 1
+                async with self.semaforo:
+                    iterador = self.backend.generar_stream(prompt, temperature, max_tokens).__aiter__()
+                    while True:
+                        try:
+                            trozo = await asyncio.wait_for(iterador.__anext__(), timeout=self.timeout_s)
+                        except StopAsyncIteration:
+                            return
+                        emitido = True
+                        yield trozo
+            except _REINTENTABLES as e:
+                if emitido or intento == self.reintentos:
+                    raise
+                self.reintentos_hechos += 1
+                logger.warning(f"LLM (stream): intento {intento + 1} fallido ({e!r}), reintentando")
+                await asyncio.sleep(self._espera_backoff(intento))
+
+    def estadisticas(self) -> Dict:
+        return {
+            "backend": self.backend.nombre,
+            "llamadas": self.llamadas,
+            "reintentos": self.reintentos_hechos,
+            "hedges": self.hedges,
+            "hedges_ganados": self.hedges_ganados,
+        }
+
+
+def _backend_falso() -> BackendFalso:
+    semilla = os.getenv("LLM_FALSO_SEMILLA")
+    return BackendFalso(
+        latencia_ms=float(os.getenv("LLM_FALSO_LATENCIA_MS", "300")),
+        jitter_ms=float(os.getenv("LLM_FALSO_JITTER_MS", "100")),
+        tasa_error=float(os.getenv("LLM_FALSO_TASA_ERROR", "0")),
+        semilla=int(semilla) if semilla else None,
+    )
 
-        # Extrae texto de la respuesta
-        text = (getattr(resp, "text", "") or "").strip()
-        if not text:
-            return "Respuesta: No he podido generar una respuesta con la información disponible.\nFuentes: Ninguna (no aparece en PDFs)"
 
+# Nombre -> fábrica del backend; registrar_backend_llm añade otros (p. ej. en tests)
+BACKENDS_LLM: Dict[str, Callable[[], object]] = {
+    "gemini": lambda: BackendGemini(modelo=os.getenv("GEMINI_MODELO", "gemini-2.5-flash-lite")),
+    "falso": _backend_falso,
+}
+
+
+def registrar_backend_llm(nombre: str, fabrica: Callable[[], object]) -> None:
+    BACKENDS_LLM[nombre] = fabrica
+
+
+def crear_backend_llm(nombre: Optional[str] = None):
+    # LLM_BACKEND=gemini (por defecto) | falso
+    nombre = (nombre or os.getenv("LLM_BACKEND") or "gemini").strip().lower()
+    if nombre not in BACKENDS_LLM:
+        raise ValueError(f"LLM_BACKEND desconocido: {nombre} (opciones: {', '.join(BACKENDS_LLM)})")
+    return BACKENDS_LLM[nombre]()
+
+
+# Cliente compartido por toda la aplicación
+cliente_llm = ClienteLLM(
+    crear_backend_llm(),
+    reintentos=int(os.getenv("LLM_REINTENTOS", "2")),
+    backoff_s=float(os.getenv("LLM_BACKOFF_S", "0.5")),
+    hedge_ms=float(os.getenv("LLM_HEDGE_MS", "0")),
+)
+
+
+# -------------------- Función principal --------------------
+def _preparar_respuesta(
+    pregunta: str,
+    contexto: dict,
+    documentos_rag: list,
+    temperature: float,
+    max_tokens: int,
+    historial: str,
+    vector_pregunta: Optional[Sequence[float]],
+) -> Tuple[Tuple[str, str], Optional[str], Optional[str]]:
+    # Común a las dos variantes: (claves de caché, prompt, respuesta cacheada).
+    # Con acierto en caché no se construye el prompt y se devuelve None.
+    inicio = time.perf_counter()
+    contexto_resumido = resumir_contexto_usuario_natural(contexto)
+    claves = CacheRespuestas.claves(pregunta, historial, contexto_resumido, documentos_rag, temperature, max_tokens)
+    cacheada = cache_respuestas.buscar(claves, vector_pregunta)
+    if cacheada is not None:
+        return claves, None, cacheada
+
+    prompt = _construir_prompt(pregunta, historial, contexto_resumido, documentos_rag)
+    _anotar_etapa("prompt", inicio)
+    return claves, prompt, None
+
+
+async def responder_pregunta_gemini_async(
+    pregunta: str,
+    contexto: dict,
+    documentos_rag: list,
+    temperature: float = 0.2,
+    max_tokens: int = 250,
+    historial: str = "",
+    vector_pregunta: Optional[Sequence[float]] = None,
+) -> str:
+    """
+    Genera una respuesta usando Gemini basada en la pregunta del usuario,
+    su contexto hipotecario y documentos RAG relevantes. Usa la API
+    asíncrona: la espera a la generación no ocupa un hilo del servidor.
+    """
+    try:
+        claves, prompt, cacheada = _preparar_respuesta(
+            pregunta, contexto, documentos_rag, temperature, max_tokens, historial, vector_pregunta
+        )
+        if cacheada is not None:
+            return cacheada
+
+        inicio = time.perf_counter()
+        text = await cliente_llm.generar_async(prompt, temperature, max_tokens)
+        _anotar_etapa("gemini", inicio)
+
+        # Solo se cachean respuestas reales del modelo
+        if not text:
+            return RESPUESTA_VACIA
+        cache_respuestas.guardar(claves, text, vector_pregunta)
         return text
 
+    except FaltaApiKey:
+        return RESPUESTA_SIN_API_KEY
+    except asyncio.TimeoutError:
+        logger.error(f"Gemini no respondió en {GEMINI_TIMEOUT_S:.0f}s")
+        return RESPUESTA_TIMEOUT
     except Exception as e:
-        # Registra error completo en logs y devuelve mensaje de error al usuario
-        logger.exception("Error en responder_pregunta_gemini")
+        logger.exception("Error en responder_pregunta_gemini_async")
         return f"Respuesta: Error inesperado generando respuesta.\nFuentes: Ninguna (error interno: {e})"
+
+
+async def responder_pregunta_gemini_stream(
+    pregunta: str,
+    contexto: dict,
+    documentos_rag: list,
+    temperature: float = 0.2,
+    max_tokens: int = 250,
+    historial: str = "",
+    vector_pregunta: Optional[Sequence[float]] = None,
+) -> AsyncIterator[str]:
+    """
+    Genera la respuesta en streaming: va devolviendo los fragmentos de texto
+    a medida que Gemini los produce. Si la generación falla, se agota el
+    tiempo o la respuesta sale vacía lanza ErrorGeneracion (puede haber
+    fragmentos ya enviados): la respuesta solo es válida si el iterador
+    termina sin error.
+    """
+    try:
+        claves, prompt, cacheada = _preparar_respuesta(
+            pregunta, contexto, documentos_rag, temperature, max_tokens, historial, vector_pregunta
+        )
+        if cacheada is not None:
+            yield cacheada
+            return
+
+        inicio = time.perf_counter()
+
+        partes = []
+        async for texto in cliente_llm.generar_stream(prompt, temperature, max_tokens):
+            partes.append(texto)
+            yield texto
+        # Incluye el tiempo que el cliente tarda en consumir el stream
+        _anotar_etapa("gemini", inicio)
+
+        # Solo se cachea la respuesta completa
+        text = "".join(partes).strip()
+        if not text:
+            raise ErrorGeneracion(RESPUESTA_VACIA, "vacia")
+        cache_respuestas.guardar(claves, text, vector_pregunta)
+
+    except ErrorGeneracion:
+        raise
+    except FaltaApiKey as e:
+        raise ErrorGeneracion(RESPUESTA_SIN_API_KEY, "config") from e
+    except asyncio.TimeoutError as e:
+        logger.error(f"Gemini no respondió en {GEMINI_TIMEOUT_S:.0f}s")
+        raise ErrorGeneracion(RESPUESTA_TIMEOUT, "timeout") from e
+    except Exception as e:
+        logger.exception("Error en responder_pregunta_gemini_stream")
+        raise ErrorGeneracion(
+            f"Respuesta: Error inesperado generando respuesta.\nFuentes: Ninguna (error interno: {e})", "interno"
+        ) from e
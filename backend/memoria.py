@@ -1,23 +1,211 @@
+# backend/memoria.py
+"""
+Memoria de conversación por sesión, acotada en turnos, tokens y sesiones.
 
+- Cada sesión guarda literalmente solo los últimos turnos que caben en su
+  presupuesto (MEMORIA_MAX_TURNOS / MEMORIA_MAX_TOKENS); un turno que por sí
+  solo no cabe se trunca.
+- Los turnos que salen de la ventana se condensan de forma incremental en
+  un resumen rodante, también con presupuesto de tokens.
+- Las sesiones inactivas se expulsan por LRU (MEMORIA_MAX_SESIONES) o por
+  inactividad (MEMORIA_TTL_SEGUNDOS).
+- El texto del historial se cachea y solo se reconstruye cuando cambia.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional
 
-# backend/memoria.py
+MAX_TURNOS = int(os.getenv("MEMORIA_MAX_TURNOS", "6"))
+MAX_TOKENS = int(os.getenv("MEMORIA_MAX_TOKENS", "1200"))
+MAX_TOKENS_RESUMEN = int(os.getenv("MEMORIA_MAX_TOKENS_RESUMEN", "300"))
+MAX_SESIONES = int(os.getenv("MEMORIA_MAX_SESIONES", "5000"))
+TTL_SEGUNDOS = float(os.getenv("MEMORIA_TTL_SEGUNDOS", "7200"))
+
+# Longitud máxima de pregunta/respuesta al condensar un turno en el resumen
+_CHARS_PREGUNTA_RESUMEN = 120
+_CHARS_RESPUESTA_RESUMEN = 160
+
+
+def estimar_tokens(texto: str) -> int:
+    # Aproximación barata: ~4 caracteres por token en español.
+    return len(texto) // 4 + 1
+
+
+def _recortar(texto: str, max_chars: int) -> str:
+    texto = " ".join(texto.split())
+    return texto if len(texto) <= max_chars else texto[: max_chars - 1] + "…"
+
+
+def _truncar(texto: str, max_chars: int) -> str:
+    # Como _recortar pero sin tocar los espacios ni los saltos de línea
+    return texto if len(texto) <= max_chars else texto[: max(0, max_chars - 1)] + "…"
+
+
+def _ajustar_turno(pregunta: str, respuesta: str, max_tokens: int):
+    # Un turno que por sí solo supera el presupuesto se trunca para caber en él
+    # (la pregunta se queda como mucho con la mitad)
+    if estimar_tokens(pregunta) + estimar_tokens(respuesta) <= max_tokens:
+        return pregunta, respuesta
+    presupuesto = max(2, (max_tokens - 2) * 4)
+    chars_pregunta = min(len(pregunta), presupuesto // 2)
+    return _truncar(pregunta, chars_pregunta), _truncar(respuesta, presupuesto - chars_pregunta)
+
+
+class _Sesion:
+    __slots__ = ("turnos", "tokens", "resumen", "tokens_resumen", "texto", "bytes", "ultimo_uso")
+
+    def __init__(self):
+        self.turnos = deque()  # (pregunta, respuesta, tokens, bytes)
+        self.tokens = 0
+        self.resumen = deque()  # (linea, tokens, bytes)
+        self.tokens_resumen = 0
+        self.texto: Optional[str] = None  # historial renderizado (caché)
+        self.bytes = 0
+        self.ultimo_uso = time.monotonic()
+
+
+class MemoriaConversacion:
+    def __init__(
+        self,
+        max_turnos: int = MAX_TURNOS,
+        max_tokens: int = MAX_TOKENS,
+        max_tokens_resumen: int = MAX_TOKENS_RESUMEN,
+        max_sesiones: int = MAX_SESIONES,
+        ttl_segundos: float = TTL_SEGUNDOS,
+    ):
+        self.max_turnos = max_turnos
+        self.max_tokens = max_tokens
+        self.max_tokens_resumen = max_tokens_resumen
+        self.max_sesiones = max_sesiones
+        self.ttl_segundos = ttl_segundos
+        self._sesiones: "OrderedDict[str, _Sesion]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._expulsiones = 0
+        self._turnos_resumidos = 0
+
+    # -------------------- Gestión interna --------------------
+    def _descartar(self, session_id: str) -> None:
+        sesion = self._sesiones.pop(session_id, None)
+        if sesion is not None:
+            self._bytes -= sesion.bytes
+
+    def _expulsar_inactivas(self, ahora: float) -> None:
+        # LRU: las sesiones menos usadas están al principio
+        while self._sesiones:
+            session_id, sesion = next(iter(self._sesiones.items()))
+            if len(self._sesiones) <= self.max_sesiones and ahora - sesion.ultimo_uso < self.ttl_segundos:
+                break
+            self._descartar(session_id)
+            self._expulsiones += 1
+
+    def _resumir_turno_mas_antiguo(self, sesion: _Sesion) -> None:
+        # Saca el turno más antiguo de la ventana y lo condensa en una línea del resumen.
+        pregunta, respuesta, tokens, nbytes = sesion.turnos.popleft()
+        sesion.tokens -= tokens
+        sesion.bytes -= nbytes
+        self._bytes -= nbytes
+        self._turnos_resumidos += 1
+
+        linea = (
+            f"- Preguntó: {_recortar(pregunta, _CHARS_PREGUNTA_RESUMEN)} "
+            f"→ {_recortar(respuesta, _CHARS_RESPUESTA_RESUMEN)}"
+        )
+        tokens_linea = estimar_tokens(linea)
+        bytes_linea = len(linea.encode("utf-8"))
+        sesion.resumen.append((linea, tokens_linea, bytes_linea))
+        sesion.tokens_resumen += tokens_linea
+        sesion.bytes += bytes_linea
+        self._bytes += bytes_linea
+
+        # El resumen también tiene presupuesto: se olvidan las líneas más antiguas
+        while sesion.tokens_resumen > self.max_tokens_resumen and len(sesion.resumen) > 1:
+            _, t, b = sesion.resumen.popleft()
+            sesion.tokens_resumen -= t
+            sesion.bytes -= b
+            self._bytes -= b
+
+    # -------------------- API pública --------------------
+    def agregar(self, session_id: str, pregunta: str, respuesta: str) -> None:
+        ahora = time.monotonic()
+        pregunta, respuesta = _ajustar_turno(pregunta, respuesta, self.max_tokens)
+        tokens = estimar_tokens(pregunta) + estimar_tokens(respuesta)
+        nbytes = len(pregunta.encode("utf-8")) + len(respuesta.encode("utf-8"))
+        with self._lock:
+            sesion = self._sesiones.get(session_id)
+            if sesion is None:
+                sesion = self._sesiones[session_id] = _Sesion()
+            else:
+                self._sesiones.move_to_end(session_id)
+            sesion.ultimo_uso = ahora
+
+            sesion.turnos.append((pregunta, respuesta, tokens, nbytes))
+            sesion.tokens += tokens
+            sesion.bytes += nbytes
+            self._bytes += nbytes
+
+            # Mantiene la ventana literal dentro de los límites (siempre queda el último turno)
+            while len(sesion.turnos) > 1 and (len(sesion.turnos) > self.max_turnos or sesion.tokens > self.max_tokens):
+                self._resumir_turno_mas_antiguo(sesion)
+
+            sesion.texto = None
+            self._expulsar_inactivas(ahora)
+
+    def historial(self, session_id: str) -> str:
+        ahora = time.monotonic()
+        with self._lock:
+            sesion = self._sesiones.get(session_id)
+            if sesion is None:
+                return ""
+            if ahora - sesion.ultimo_uso >= self.ttl_segundos:
+                self._descartar(session_id)
+                self._expulsiones += 1
+                return ""
+            self._sesiones.move_to_end(session_id)
+            sesion.ultimo_uso = ahora
+
+            if sesion.texto is None:
+                partes = []
+                if sesion.resumen:
+                    partes.append("RESUMEN_ANTERIOR:\n" + "\n".join(linea for linea, _, _ in sesion.resumen))
+                partes.extend(f"Tú: {p}\nBot: {r}" for p, r, _, _ in sesion.turnos)
+                sesion.texto = "\n".join(partes)
+            return sesion.texto
+
+    def reiniciar(self, session_id: str) -> None:
+        with self._lock:
+            self._descartar(session_id)
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sesiones": len(self._sesiones),
+                "bytes": self._bytes,
+                "expulsiones": self._expulsiones,
+                "turnos_resumidos": self._turnos_resumidos,
+            }
+
+
+# Instancia compartida por la API
+memoria_sesiones = MemoriaConversacion()
 
-# Diccionario: session_id -> historial de la sesión
-memoria_sesiones = {}
 
 def agregar_a_memoria(session_id: str, pregunta: str, respuesta: str):
-    if session_id not in memoria_sesiones:
-        memoria_sesiones[session_id] = []
-    memoria_sesiones[session_id].append({"usuario": pregunta, "bot": respuesta})
+    memoria_sesiones.agregar(session_id, pregunta, respuesta)
+
 
 def obtener_historial(session_id: str) -> str:
     """
     Devuelve el historial de la sesión como texto, listo para contexto.
     """
-    return "\n".join(
-        f"Tú: {e['usuario']}\nBot: {e['bot']}" 
-        for e in memoria_sesiones.get(session_id, [])
-    )
+    return memoria_sesiones.historial(session_id)
+
 
 def reiniciar_sesion(session_id: str):
-    memoria_sesiones[session_id] = []
+    memoria_sesiones.reiniciar(session_id)
+
+
+def estadisticas() -> Dict[str, int]:
+    return memoria_sesiones.estadisticas()
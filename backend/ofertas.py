@@ -0,0 +1,232 @@
+# backend/ofertas.py
+"""
+Tabla de ofertas hipotecarias extraída de los PDFs de los bancos.
+
+scripts/ingest_docs.py lee cada PDF una vez, saca sus condiciones numéricas
+(tipos por tramo de edad y modalidad, plazo máximo, comisiones,
+bonificaciones) y las guarda en OFERTAS_PATH. La API carga el fichero al
+arrancar (y lo recarga si cambia) y compara ofertas con aritmética pura, sin pasar por el LLM.
+
+Cada fila es una combinación banco × tramo de edad × modalidad; los datos
+del documento (plazo, comisiones...) se repiten en todas sus filas. En
+disco se guarda en formato columnar compacto: {"campos": [...], "filas": [[...]]}.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Iterable, List, Optional
+
+from services.chunker import es_encabezado
+
+logger = logging.getLogger(__name__)
+
+OFERTAS_PATH = os.getenv("OFERTAS_PATH", "data/ofertas.json")
+MODALIDADES = ("fijo", "variable", "mixto")
+
+
+@dataclass
+class Oferta:
+    banco: str
+    producto: str
+    modalidad: str                                # fijo | variable | mixto
+    tin: Optional[float] = None                   # % (fijo, o tramo fijo del mixto)
+    diferencial: Optional[float] = None           # % sobre Euríbor (variable y mixto)
+    anos_fijos: Optional[int] = None              # años a tipo fijo del mixto
+    tae: Optional[float] = None
+    edad_min: Optional[int] = None
+    edad_max: Optional[int] = None
+    plazo_max_anos: Optional[int] = None
+    edad_limite_plazo: Optional[int] = None       # a partir de esta edad...
+    plazo_max_anos_limite: Optional[int] = None   # ...el plazo máximo baja a este
+    financiacion_max: Optional[float] = None      # % del valor de la vivienda (primera vivienda)
+    comision_apertura: Optional[float] = None     # % del capital
+    comision_amortizacion_parcial: Optional[float] = None
+    comision_amortizacion_total: Optional[float] = None
+    bonificacion_max: Optional[float] = None      # reducción máxima del TIN por vinculación (puntos %)
+    origen: str = ""
+    pagina: Optional[int] = None
+
+    def plazo_maximo(self, edad: Optional[int] = None) -> Optional[int]:
+        if edad is not None and self.edad_limite_plazo is not None and edad > self.edad_limite_plazo:
+            return self.plazo_max_anos_limite
+        return self.plazo_max_anos
+
+    def admite_edad(self, edad: Optional[int]) -> bool:
+        if edad is None:
+            return True
+        return (self.edad_min is None or edad >= self.edad_min) and (self.edad_max is None or edad <= self.edad_max)
+
+
+# -------------------- Extracción --------------------
+_NUM = r"(\d+(?:[.,]\d+)?)"
+# Viñeta al principio de línea: "•", las de fuentes Symbol (uso privado) o la "o" de segundo nivel
+_VINETA = re.compile(r"^\s*(?:[•●▪\uf0b7\uf0a7\uf0d8\uf076\-\*·]|o(?=\s))\s*")
+_TRAMO_EDAD = re.compile(r"(\d{2})\s*[–-]\s*(\d{2})\s*años")
+_FIJO = re.compile(r"\bfijo\b:?\s*" + _NUM + r"\s*%")
+_VARIABLE = re.compile(r"\bvariable\b:?\s*euribor\s*\+\s*" + _NUM + r"\s*%")
+_MIXTO = re.compile(r"\bmixto\b:?\s*" + _NUM + r"\s*%[^%]*?primeros\s+(\d+)\s*años[^%]*?euribor\s*\+\s*" + _NUM + r"\s*%")
+_TAE = re.compile(r"\btae\b:?\s*" + _NUM + r"\s*%")
+_RANGO_PLAZO = re.compile(r"(\d+)\s*[–-]\s*(\d+)\s*años")
+_PLAZO_LIMITE = re.compile(r"maximo\s+(\d+)\s*años\s+si\s+edad\s*>\s*(\d+)")
+_FINANCIACION = re.compile(r"hasta\s+" + _NUM + r"\s*%[^\n]*primera\s+vivienda")
+_APERTURA = re.compile(r"apertura:?\s*" + _NUM + r"\s*%")
+_AMORTIZACION = re.compile(r"amortizacion anticipada\s*(parcial o total|parcial|total)?:?\s*" + _NUM + r"\s*%")
+_REDUCCION = re.compile(r"(?:reduccion|bonificacion)[^\d]*" + _NUM + r"\s*%\s*tin")
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace(",", "."))
+
+
+def _plegar(linea: str) -> str:
+    # Minúsculas y sin tildes; "años" conserva la ñ para que las expresiones se lean mejor
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFD", linea.lower().replace("ñ", "\0")) if unicodedata.category(c) != "Mn"
+    )
+    return " ".join(sin_tildes.replace("\0", "ñ").split())
+
+
+def extraer_ofertas(paginas: Iterable[str], banco: str, producto: str, origen: str = "") -> List[Oferta]:
+    """
+    Saca las ofertas de las páginas de un documento informativo. Reconoce
+    los apartados por su encabezado (tipos de interés, plazos, importe
+    financiable, comisiones, productos vinculados) y, dentro de los tipos,
+    los tramos de edad ("18–30 años: Fijo 2,55 %, Variable Euríbor +0,60 %").
+    """
+    ofertas: List[Oferta] = []
+    documento: Dict = {}
+    seccion = ""
+    edad = (None, None)
+
+    for n_pagina, texto in enumerate(paginas, start=1):
+        for bruta in (texto or "").splitlines():
+            linea = _plegar(_VINETA.sub("", bruta))
+            if not linea:
+                continue
+            if not _VINETA.match(bruta) and es_encabezado(bruta.strip()):
+                seccion, edad = linea, (None, None)
+                continue
+
+            if "interes" in seccion or "tipo" in seccion:
+                tramo = _TRAMO_EDAD.match(linea)
+                if tramo:
+                    edad = (int(tramo.group(1)), int(tramo.group(2)))
+                base = dict(banco=banco, producto=producto, edad_min=edad[0], edad_max=edad[1], origen=origen, pagina=n_pagina)
+                nuevas = []
+                for m in _FIJO.finditer(linea):
+                    nuevas.append(Oferta(modalidad="fijo", tin=_numero(m.group(1)), **base))
+                for m in _VARIABLE.finditer(linea):
+                    nuevas.append(Oferta(modalidad="variable", diferencial=_numero(m.group(1)), **base))
+                for m in _MIXTO.finditer(linea):
+                    nuevas.append(Oferta(
+                        modalidad="mixto", tin=_numero(m.group(1)), anos_fijos=int(m.group(2)),
+                        diferencial=_numero(m.group(3)), **base,
+                    ))
+                tae = _TAE.search(linea)
+                for oferta in nuevas:
+                    oferta.tae = _numero(tae.group(1)) if tae else None
+                ofertas.extend(nuevas)
+            elif "plazo" in seccion:
+                limite = _PLAZO_LIMITE.search(linea)
+                if limite:
+                    documento["plazo_max_anos_limite"] = int(limite.group(1))
+                    documento["edad_limite_plazo"] = int(limite.group(2))
+                else:
+                    for m in _RANGO_PLAZO.finditer(linea):
+                        documento["plazo_max_anos"] = max(documento.get("plazo_max_anos", 0), int(m.group(2)))
+            elif "importe" in seccion or "financ" in seccion:
+                m = _FINANCIACION.search(linea)
+                if m:
+                    documento["financiacion_max"] = _numero(m.group(1))
+            elif "comision" in seccion:
+                m = _APERTURA.search(linea)
+                if m:
+                    documento["comision_apertura"] = _numero(m.group(1))
+                m = _AMORTIZACION.search(linea)
+                if m:
+                    tipo, valor = m.group(1) or "parcial o total", _numero(m.group(2))
+                    if "parcial" in tipo:
+                        documento["comision_amortizacion_parcial"] = valor
+                    if "total" in tipo:
+                        documento["comision_amortizacion_total"] = valor
+            elif "vincul" in seccion:
+                for m in _REDUCCION.finditer(linea):
+                    documento["bonificacion_max"] = max(documento.get("bonificacion_max", 0.0), _numero(m.group(1)))
+
+    for oferta in ofertas:
+        for campo, valor in documento.items():
+            setattr(oferta, campo, valor)
+    return ofertas
+
+
+# -------------------- Tabla en disco y en memoria --------------------
+_CAMPOS = [f.name for f in fields(Oferta)]
+
+
+def guardar_ofertas(ofertas: List[Oferta], ruta: str = OFERTAS_PATH) -> None:
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    datos = {"campos": _CAMPOS, "filas": [[getattr(o, c) for c in _CAMPOS] for o in ofertas]}
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, ruta)
+
+
+def cargar_ofertas(ruta: str = OFERTAS_PATH) -> List[Oferta]:
+    with open(ruta, encoding="utf-8") as f:
+        datos = json.load(f)
+    conocidos = set(_CAMPOS)
+    return [
+        Oferta(**{c: v for c, v in zip(datos["campos"], fila) if c in conocidos})
+        for fila in datos["filas"]
+    ]
+
+
+def a_dict(oferta: Oferta) -> Dict:
+    return asdict(oferta)
+
+
+# Cada cuánto se vuelve a mirar el fichero (recoger la tabla que genera una
+# ingestión, o la primera si al arrancar no existía); entre medias no se toca el disco.
+OFERTAS_RECARGA_S = float(os.getenv("OFERTAS_RECARGA_S", "30"))
+
+_ofertas: List[Oferta] = []
+_ruta: Optional[str] = None
+_firma: Optional[tuple] = None
+_fallo: Optional[str] = None
+_comprobado = float("-inf")
+_lock = threading.Lock()
+
+
+def ofertas_actuales(ruta: str = OFERTAS_PATH) -> List[Oferta]:
+    """
+    Tabla vigente; lista vacía si aún no se ha generado. Se recarga cuando
+    cambia el fichero (inodo, mtime y tamaño), como mucho cada OFERTAS_RECARGA_S.
+    """
+    global _ofertas, _ruta, _firma, _fallo, _comprobado
+    if ruta == _ruta and time.monotonic() - _comprobado < OFERTAS_RECARGA_S:
+        return _ofertas
+    with _lock:
+        ahora = time.monotonic()
+        if ruta == _ruta and ahora - _comprobado < OFERTAS_RECARGA_S:
+            return _ofertas
+        if ruta != _ruta:
+            _ofertas, _ruta, _firma, _fallo = [], ruta, None, None
+        _comprobado = ahora
+        try:
+            estado = os.stat(ruta)
+            firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+            if firma != _firma:
+                _ofertas, _firma, _fallo = cargar_ofertas(ruta), firma, None
+                logger.info(f"Tabla de ofertas cargada de {ruta}: {len(_ofertas)} ofertas")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Se conserva la tabla anterior; se avisa una vez por causa
+            if str(e) != _fallo:
+                logger.info(f"Sin tabla de ofertas en {ruta} ({e})")
+            _fallo = str(e)
+    return _ofertas
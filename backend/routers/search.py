@@ -1,22 +1,82 @@
 # -------------------- routers/search.py --------------------
-from typing import List, Dict, Optional
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import List, Dict, Optional, Tuple
 from fastapi import APIRouter, Query
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 
-from services.qdrant_connection import qdrant, embedding_model
+from services.qdrant_connection import (
+    qdrant,
+    qdrant_async,
+    qdrant_semaforo,
+    embed_query,
+    embed_query_async,
+    cache_embeddings,
+    despachador_embeddings,
+)
+from services.modelo_embeddings import cargador_embeddings
+from services.indice_local import indice_actual
+from services.hibrida import fusion_rrf, Reranker
+from services.metadatos_documentos import normalizar_banco
+from services.metricas import observar_etapa, percentiles
+
+logger = logging.getLogger(__name__)
 
 # Crea un router de FastAPI para agrupar endpoints relacionados con búsqueda
 router = APIRouter()
 
+# qdrant (por defecto) | local: con "local" se busca en el índice en memoria si hay snapshot
+MOTOR_BUSQUEDA = os.getenv("BUSQUEDA_MOTOR", "qdrant").strip().lower()
+# Si Qdrant falla o no responde en este tiempo se usa el índice local (si existe)
+QDRANT_TIMEOUT_S = float(os.getenv("QDRANT_TIMEOUT_S", "5"))
+FALLBACK_LOCAL = os.getenv("BUSQUEDA_FALLBACK_LOCAL", "1") == "1"
+fallbacks_locales = 0
+
+# Recuperación híbrida: BM25 (del snapshot local) + denso, fusionados con RRF
+BUSQUEDA_HIBRIDA = os.getenv("BUSQUEDA_HIBRIDA", "1") == "1"
+BUSQUEDA_CANDIDATOS = int(os.getenv("BUSQUEDA_CANDIDATOS", "20"))
+BUSQUEDA_RERANK = os.getenv("BUSQUEDA_RERANK", "0") == "1"
+reranker = Reranker()
+
+# Latencias recientes por etapa (ms) para /buscar/estadisticas
+ETAPAS = ("embedding", "denso", "bm25", "fusion", "rerank", "total")
+latencias_etapas = {etapa: deque(maxlen=1000) for etapa in ETAPAS}
+# Nombre de cada etapa en el histograma de /metrics ("total" no se exporta: es la suma)
+ETIQUETAS_METRICAS = {"embedding": "embedding", "denso": "qdrant", "bm25": "bm25", "fusion": "fusion", "rerank": "rerank"}
+
+
+def _banco_canonico(banco: str) -> str:
+    # Los payloads guardan el nombre canónico ("SANTANDER"); un banco desconocido se busca tal cual en mayúsculas
+    return normalizar_banco(banco) or (banco or "").strip().upper()
+
 
 def _build_bank_filter(banco: str) -> Filter:
-    # Construye un filtro de Qdrant para buscar por nombre de banco.
-    b = (banco or "").strip()
-    # Genera variantes del nombre para búsqueda case-insensitive
-    variants = {b, b.upper(), b.lower(), b.title()}
-    # Crea condiciones de matching para cada variante no vacía
-    should = [FieldCondition(key="banco", match=MatchValue(value=v)) for v in variants if v]
-    return Filter(should=should)
+    # Construye un filtro de Qdrant para buscar por nombre de banco:
+    # una sola condición exacta sobre el campo indexado `banco`
+    return Filter(must=[FieldCondition(key="banco", match=MatchValue(value=_banco_canonico(banco)))])
+
+
+def _buscar_en_indice_local(indice, vector, top_k: int, banco: Optional[str], min_score: float) -> List[Dict]:
+    puntos = indice.buscar(
+        vector,
+        top_k=top_k,
+        bancos=[_banco_canonico(banco)] if banco else None,
+        score_threshold=min_score,
+    )
+    return _formatear_puntos(puntos)
+
+
+def _indice_de_respaldo(error: BaseException, indice):
+    # Devuelve el índice local para sustituir a Qdrant, o relanza el error si no hay.
+    global fallbacks_locales
+    if indice is None or not FALLBACK_LOCAL:
+        raise error
+    fallbacks_locales += 1
+    logger.warning(f"Qdrant no disponible ({error!r}); usando índice local")
+    return indice
 
 
 def buscar_hipotecas_en_qdrant(
@@ -27,25 +87,150 @@ def buscar_hipotecas_en_qdrant(
 ) -> List[Dict]:
     # Busca documentos de hipotecas en Qdrant mediante búsqueda vectorial semántica.
 
-    # Convierte el texto de la query a vector usando el modelo de embeddings
-    vector = embedding_model.encode(query).tolist()
+    # Convierte el texto de la query a vector usando el modelo de embeddings (con caché)
+    vector = embed_query(query)
+
+    # Con pocos documentos el índice en memoria evita el viaje de red a Qdrant
+    indice = indice_actual()
+    if MOTOR_BUSQUEDA == "local" and indice is not None:
+        return _buscar_en_indice_local(indice, vector, top_k, banco, min_score)
 
     # Construye filtro por banco
     q_filter = _build_bank_filter(banco) if banco else None
 
     # Realiza búsqueda vectorial en Qdrant
-    resultados = qdrant.query_points(
-        collection_name="hipotecas",
-        query=vector,
-        limit=top_k,
-        with_payload=True,
-        query_filter=q_filter,
-        score_threshold=min_score,
-    )
+    try:
+        resultados = qdrant.query_points(
+            collection_name="hipotecas",
+            query=vector,
+            limit=top_k,
+            with_payload=True,
+            query_filter=q_filter,
+            score_threshold=min_score,
+            timeout=max(1, int(QDRANT_TIMEOUT_S)),
+        )
+    except Exception as e:
+        return _buscar_en_indice_local(_indice_de_respaldo(e, indice), vector, top_k, banco, min_score)
+
+    return _formatear_puntos(resultados.points)
+
+
+async def _buscar_denso_async(
+    vector: List[float], top_k: int, banco: Optional[str], min_score: float, indice
+) -> List[Dict]:
+    # `indice`: el índice local de esta petición (indice_actual() una sola vez por petición)
+    if MOTOR_BUSQUEDA == "local" and indice is not None:
+        return _buscar_en_indice_local(indice, vector, top_k, banco, min_score)
+
+    q_filter = _build_bank_filter(banco) if banco else None
+
+    try:
+        async with qdrant_semaforo:
+            resultados = await asyncio.wait_for(
+                qdrant_async.query_points(
+                    collection_name="hipotecas",
+                    query=vector,
+                    limit=top_k,
+                    with_payload=True,
+                    query_filter=q_filter,
+                    score_threshold=min_score,
+                ),
+                timeout=QDRANT_TIMEOUT_S,
+            )
+    except Exception as e:
+        return _buscar_en_indice_local(_indice_de_respaldo(e, indice), vector, top_k, banco, min_score)
+
+    return _formatear_puntos(resultados.points)
+
+
+async def buscar_hipotecas_en_qdrant_async(
+    query: str,
+    top_k: int = 5,
+    banco: Optional[str] = None,
+    min_score: float = 0.15,
+) -> List[Dict]:
+    # Versión asíncrona de buscar_hipotecas_en_qdrant para el camino de /preguntar.
+    inicio = time.perf_counter()
+    vector = await embed_query_async(query)
+    medio = time.perf_counter()
+    docs = await _buscar_denso_async(vector, top_k, banco, min_score, indice_actual())
+    observar_etapa("embedding", medio - inicio)
+    observar_etapa("qdrant", time.perf_counter() - medio)
+    return docs
+
+
+async def buscar_hibrido_con_tiempos(
+    query: str,
+    top_k: int = 5,
+    banco: Optional[str] = None,
+    min_score: float = 0.15,
+    rerank: Optional[bool] = None,
+) -> Tuple[List[Dict], Dict[str, float]]:
+    """
+    Recuperación híbrida: candidatos densos (Qdrant o índice local) y
+    léxicos (BM25 sobre el texto de los chunks) fusionados con RRF y, si se
+    pide, reordenados con un cross-encoder. Devuelve los documentos y la
+    latencia de cada etapa en ms. Sin snapshot local se queda en la parte densa.
+    """
+    rerank = BUSQUEDA_RERANK if rerank is None else rerank
+    candidatos = max(top_k, BUSQUEDA_CANDIDATOS)
+    tiempos: Dict[str, float] = {}
+    inicio = marca = time.perf_counter()
+
+    def medir(etapa: str) -> None:
+        nonlocal marca
+        ahora = time.perf_counter()
+        tiempos[etapa] = round((ahora - marca) * 1000.0, 2)
+        marca = ahora
+
+    indice = indice_actual()
+    vector = await embed_query_async(query)
+    medir("embedding")
+    denso = await _buscar_denso_async(vector, candidatos, banco, min_score, indice)
+    medir("denso")
+
+    if indice is not None:
+        lexico = _formatear_puntos(
+            indice.buscar_texto(query, top_k=candidatos, bancos=[_banco_canonico(banco)] if banco else None)
+        )
+        medir("bm25")
+        docs = fusion_rrf([denso, lexico], top_k=candidatos)
+        medir("fusion")
+    else:
+        docs = denso
+
+    if rerank and docs:
+        # El cross-encoder es CPU puro: se ejecuta fuera del event loop
+        docs = await asyncio.to_thread(reranker.reordenar, query, docs, top_k)
+        medir("rerank")
+    docs = docs[:top_k]
+
+    tiempos["total"] = round((time.perf_counter() - inicio) * 1000.0, 2)
+    for etapa, ms in tiempos.items():
+        latencias_etapas[etapa].append(ms)
+        if etapa in ETIQUETAS_METRICAS:
+            observar_etapa(ETIQUETAS_METRICAS[etapa], ms / 1000.0)
+    return docs, tiempos
+
+
+async def buscar_documentos_async(
+    query: str,
+    top_k: int = 5,
+    banco: Optional[str] = None,
+    min_score: float = 0.15,
+) -> List[Dict]:
+    # Punto de entrada de /preguntar: híbrida si BUSQUEDA_HIBRIDA=1, si no solo densa.
+    if not BUSQUEDA_HIBRIDA:
+        return await buscar_hipotecas_en_qdrant_async(query, top_k, banco, min_score)
+    docs, tiempos = await buscar_hibrido_con_tiempos(query, top_k, banco, min_score)
+    logger.info(f"Recuperación híbrida ({len(docs)} docs): {tiempos}")
+    return docs
+
 
+def _formatear_puntos(puntos) -> List[Dict]:
     # Procesa y formatea los resultados
     docs: List[Dict] = []
-    for punto in resultados.points:
+    for punto in puntos:
         payload = punto.payload or {}
         docs.append({
             "id": str(punto.id),
@@ -55,6 +240,9 @@ def buscar_hipotecas_en_qdrant(
             "producto": payload.get("producto", ""),
             "origen": payload.get("origen", ""),        # Nombre del documento
             "ruta_pdf": payload.get("ruta_pdf", ""),   # Link al PDF
+            "page_start": payload.get("page_start"),   # Páginas del chunk (None en chunks antiguos)
+            "page_end": payload.get("page_end"),
+            "seccion": payload.get("seccion", ""),
         })
 
     return docs
@@ -70,3 +258,33 @@ def buscar(
     min_score: float = Query(0.15, ge=0.0, le=1.0),
 ):
     return buscar_hipotecas_en_qdrant(query=query, top_k=top_k, banco=banco, min_score=min_score)
+
+
+@router.get("/buscar/hibrido")
+async def buscar_hibrido(
+    query: str = Query(...),
+    top_k: int = Query(5, ge=1, le=20),
+    banco: Optional[str] = Query(None),
+    min_score: float = Query(0.15, ge=0.0, le=1.0),
+    rerank: Optional[bool] = Query(None),
+):
+    # Igual que /buscar, con BM25 + RRF (+ rerank) y la latencia de cada etapa.
+    docs, tiempos = await buscar_hibrido_con_tiempos(query, top_k, banco, min_score, rerank)
+    return {"resultados": docs, "tiempos_ms": tiempos}
+
+
+@router.get("/buscar/estadisticas")
+def estadisticas_embeddings():
+    # Backend del modelo, aciertos de la caché de embeddings y tamaño de los lotes del despachador.
+    indice = indice_actual()
+    return {
+        "modelo": cargador_embeddings.estado(),
+        "cache": cache_embeddings.estadisticas(),
+        "despachador": despachador_embeddings.estadisticas(),
+        "indice_local": {
+            "motor": MOTOR_BUSQUEDA,
+            "puntos": len(indice) if indice is not None else 0,
+            "fallbacks": fallbacks_locales,
+        },
+        "latencias_ms": {etapa: percentiles(v) for etapa, v in latencias_etapas.items() if v},
+    }
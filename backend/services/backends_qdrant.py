@@ -0,0 +1,170 @@
+# services/backends_qdrant.py
+"""
+Registro de backends de Qdrant. QDRANT_BACKEND elige de dónde salen los
+clientes (síncrono y asíncrono) que usan la API y la ingesta:
+
+- "cloud" (por defecto): Qdrant remoto en QDRANT_URL con QDRANT_API_KEY.
+- "memoria": QdrantClient(":memory:") en el propio proceso, sin red. Al
+  crearse se siembra la colección con el snapshot del índice local
+  (QDRANT_MEMORIA_DATOS, por defecto INDICE_LOCAL_PATH) si existe.
+  QDRANT_MEMORIA_LATENCIA_MS y QDRANT_MEMORIA_JITTER_MS añaden una latencia
+  simulada a cada llamada para ver cómo se forman colas cuando Qdrant va
+  lento.
+- "local": Qdrant embebido persistido en disco (QDRANT_PATH).
+
+En "memoria" y "local" el cliente asíncrono envuelve al síncrono: un
+AsyncQdrantClient(":memory:") tendría su propio almacén, vacío.
+
+Se pueden registrar backends nuevos con `registrar_backend_qdrant`.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+logger = logging.getLogger(__name__)
+
+COLECCION = "hipotecas"
+LOTE_SIEMBRA = 256
+
+
+class _Latencia:
+    def __init__(self, latencia_ms: float = 0.0, jitter_ms: float = 0.0, semilla: Optional[int] = None):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(semilla)
+
+    def espera_s(self) -> float:
+        if not self.latencia_ms and not self.jitter_ms:
+            return 0.0
+        return (self.latencia_ms + self._rng.uniform(0.0, self.jitter_ms)) / 1000.0
+
+
+class ClienteConLatencia:
+    # Proxy de un QdrantClient local que espera antes de cada método (simula la red).
+
+    def __init__(self, cliente: QdrantClient, latencia: _Latencia):
+        self._cliente = cliente
+        self._latencia = latencia
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._cliente, nombre)
+        if not callable(atributo):
+            return atributo
+
+        def llamada(*args, **kwargs):
+            espera = self._latencia.espera_s()
+            if espera:
+                time.sleep(espera)
+            return atributo(*args, **kwargs)
+
+        return llamada
+
+
+class ClienteAsyncLocal:
+    """
+    Interfaz asíncrona sobre un QdrantClient local: la latencia simulada se
+    espera con asyncio.sleep (no bloquea el event loop) y la operación, que
+    es en memoria, se ejecuta directamente.
+    """
+
+    def __init__(self, cliente: QdrantClient, latencia: Optional[_Latencia] = None):
+        self._cliente = cliente
+        self._latencia = latencia or _Latencia()
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._cliente, nombre)
+        if not callable(atributo):
+            return atributo
+
+        async def llamada(*args, **kwargs):
+            espera = self._latencia.espera_s()
+            if espera:
+                await asyncio.sleep(espera)
+            return atributo(*args, **kwargs)
+
+        return llamada
+
+
+def sembrar_desde_indice_local(cliente: QdrantClient, ruta: str, dim: int, coleccion: str = COLECCION) -> int:
+    # Crea la colección y copia los puntos del snapshot local (vector + payload). Devuelve cuántos.
+    from services.indice_local import IndiceLocal
+
+    try:
+        indice = IndiceLocal.cargar(ruta)
+    except (OSError, ValueError, KeyError) as e:
+        indice = None
+        logger.info(f"Qdrant en memoria sin sembrar: no hay índice local en {ruta} ({e})")
+
+    if indice is not None and len(indice):
+        dim = int(indice.vectores.shape[1])
+    if not cliente.collection_exists(coleccion):
+        cliente.create_collection(coleccion, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    if indice is None:
+        return 0
+
+    for i in range(0, len(indice), LOTE_SIEMBRA):
+        cliente.upsert(
+            collection_name=coleccion,
+            points=[
+                PointStruct(id=indice.ids[j], vector=indice.vectores[j].tolist(), payload=indice.payloads[j])
+                for j in range(i, min(i + LOTE_SIEMBRA, len(indice)))
+            ],
+        )
+    logger.info(f"Qdrant en memoria sembrado con {len(indice)} puntos de {ruta}")
+    return len(indice)
+
+
+# -------------------- Backends --------------------
+def _cloud() -> Tuple:
+    # `or ""`: sin QDRANT_URL no se rompe al importar; falla la primera consulta (y entra el índice local)
+    url = (os.getenv("QDRANT_URL") or "").strip() or None
+    api_key = (os.getenv("QDRANT_API_KEY") or "").strip() or None
+    if url is None:
+        logger.warning("QDRANT_URL no está definida; usa QDRANT_BACKEND=memoria para trabajar sin red")
+    return QdrantClient(url=url, api_key=api_key), AsyncQdrantClient(url=url, api_key=api_key)
+
+
+def _memoria() -> Tuple:
+    from services.indice_local import INDICE_LOCAL_PATH
+    from services.modelo_embeddings import DIM_EMBEDDINGS
+
+    cliente = QdrantClient(":memory:")
+    sembrar_desde_indice_local(cliente, os.getenv("QDRANT_MEMORIA_DATOS", INDICE_LOCAL_PATH), DIM_EMBEDDINGS)
+    # Semilla fija: la misma secuencia de latencias en cada ejecución
+    latencia = _Latencia(
+        float(os.getenv("QDRANT_MEMORIA_LATENCIA_MS", "0")),
+        float(os.getenv("QDRANT_MEMORIA_JITTER_MS", "0")),
+        semilla=42,
+    )
+    sincrono = ClienteConLatencia(cliente, latencia) if latencia.latencia_ms or latencia.jitter_ms else cliente
+    return sincrono, ClienteAsyncLocal(cliente, latencia)
+
+
+def _local() -> Tuple:
+    cliente = QdrantClient(path=os.getenv("QDRANT_PATH", "data/qdrant_local"))
+    return cliente, ClienteAsyncLocal(cliente)
+
+
+BACKENDS_QDRANT: Dict[str, Callable[[], Tuple]] = {
+    "cloud": _cloud,
+    "memoria": _memoria,
+    "local": _local,
+}
+
+
+def registrar_backend_qdrant(nombre: str, fabrica: Callable[[], Tuple]) -> None:
+    # `fabrica()` devuelve (cliente síncrono, cliente asíncrono).
+    BACKENDS_QDRANT[nombre] = fabrica
+
+
+def crear_clientes_qdrant(nombre: Optional[str] = None) -> Tuple:
+    nombre = (nombre or os.getenv("QDRANT_BACKEND") or "cloud").strip().lower()
+    if nombre not in BACKENDS_QDRANT:
+        raise ValueError(f"QDRANT_BACKEND desconocido: {nombre} (opciones: {', '.join(BACKENDS_QDRANT)})")
+    return BACKENDS_QDRANT[nombre]()
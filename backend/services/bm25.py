@@ -0,0 +1,101 @@
+# services/bm25.py
+"""
+Índice léxico BM25 sobre el `texto` de los chunks.
+
+Complementa la búsqueda densa en preguntas con palabras clave concretas
+("TIN de ING", "comisión de amortización Santander"), donde MiniLM suele
+quedarse por debajo de min_score.
+
+Las listas de postings se guardan como arrays NumPy (documento, frecuencia)
+y la puntuación de una consulta se acumula vectorizada término a término.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    """
+    a al algo como con de del el en es esta este esto hay la las lo los me mi mis
+    mas o para pero por que se sin sobre su sus te tu un una uno unos unas y ya yo
+    cual cuales cuanto cuanta donde quien tengo tiene puedo puede ser son muy
+    """.split()
+)
+
+
+def _sin_tildes(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+
+def tokenizar(texto: str) -> List[str]:
+    # minúsculas, sin tildes y sin palabras vacías; se conservan cifras ("3,5" -> "3", "5")
+    return [t for t in _PALABRA.findall(_sin_tildes(texto.lower())) if t not in STOPWORDS]
+
+
+class IndiceBM25:
+    def __init__(self, textos: Sequence[str] = (), k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n = len(textos)
+        postings: Dict[str, Dict[int, int]] = {}
+        longitudes = np.zeros(self.n, dtype=np.float32)
+        for i, texto in enumerate(textos):
+            tokens = tokenizar(texto or "")
+            longitudes[i] = len(tokens)
+            for t in tokens:
+                frecuencias = postings.setdefault(t, {})
+                frecuencias[i] = frecuencias.get(i, 0) + 1
+        self.longitudes = longitudes
+        self.postings = {
+            t: (np.fromiter(f.keys(), dtype=np.int32), np.fromiter(f.values(), dtype=np.float32))
+            for t, f in postings.items()
+        }
+
+    # -------------------- Serialización --------------------
+    def a_dict(self) -> Dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "longitudes": self.longitudes.astype(int).tolist(),
+            "postings": {t: [docs.tolist(), tf.astype(int).tolist()] for t, (docs, tf) in self.postings.items()},
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> "IndiceBM25":
+        indice = cls(k1=datos["k1"], b=datos["b"])
+        indice.longitudes = np.asarray(datos["longitudes"], dtype=np.float32)
+        indice.n = len(indice.longitudes)
+        indice.postings = {
+            t: (np.asarray(docs, dtype=np.int32), np.asarray(tf, dtype=np.float32))
+            for t, (docs, tf) in datos["postings"].items()
+        }
+        return indice
+
+    # -------------------- Búsqueda --------------------
+    def puntuar(self, consulta: str) -> np.ndarray:
+        scores = np.zeros(self.n, dtype=np.float32)
+        if not self.n:
+            return scores
+        longitud_media = float(self.longitudes.mean()) or 1.0
+        normalizacion = self.k1 * (1.0 - self.b + self.b * self.longitudes / longitud_media)
+        for t in set(tokenizar(consulta)):
+            if t not in self.postings:
+                continue
+            docs, tf = self.postings[t]
+            idf = np.log(1.0 + (self.n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + normalizacion[docs])
+        return scores
+
+    def buscar(self, consulta: str, top_k: int = 5, mascara: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        # Devuelve (posición del documento, score) de los top_k con score > 0.
+        scores = self.puntuar(consulta)
+        candidatos = np.flatnonzero(scores > 0)
+        if mascara is not None:
+            candidatos = candidatos[mascara[candidatos]]
+        if len(candidatos) > top_k:
+            candidatos = candidatos[np.argpartition(-scores[candidatos], top_k - 1)[:top_k]]
+        candidatos = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+        return [(int(i), float(scores[i])) for i in candidatos]
@@ -0,0 +1,118 @@
+# services/cache_analisis.py
+"""
+Caché LRU de resultados de /analisis.
+
+La clave es la huella de la entrada ya validada (sin session_id): el mismo
+formulario reenviado da la misma huella aunque cambie el orden de los campos
+o llegue "Fijo" en vez de "fijo". Se guarda el cuerpo JSON ya serializado,
+así un acierto no recalcula ni vuelve a serializar, y la huella sirve
+también de ETag para If-None-Match.
+
+Si se indica `ruta`, las entradas se vuelcan a un JSON (cada `guardar_cada`
+inserciones y al salir) y se recargan al arrancar.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def huella(datos: Dict, version: str = "") -> str:
+    # sha256 del JSON canónico (claves ordenadas, sin espacios) más la versión del cálculo.
+    canonico = json.dumps(datos, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{version}|{canonico}".encode("utf-8")).hexdigest()[:32]
+
+
+def serializar(resultado: Dict) -> bytes:
+    # Mismo formato que JSONResponse
+    return json.dumps(resultado, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class CacheAnalisis:
+    def __init__(self, max_items: int = 1024, ruta: Optional[str] = None, guardar_cada: int = 32):
+        self.max_items = max_items
+        self.ruta = ruta
+        self.guardar_cada = guardar_cada
+        self.hits = 0
+        self.misses = 0
+
+        # clave -> [cuerpo JSON, resultado decodificado o None]; el orden es el orden LRU
+        self._entradas: "OrderedDict[str, list]" = OrderedDict()
+        self._pendientes = 0
+        self._lock = threading.Lock()
+
+        if ruta:
+            self._cargar(ruta)
+
+    # -------------------- Persistencia --------------------
+    def _cargar(self, ruta: str) -> None:
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                entradas = json.load(f)["entradas"]
+            # Las más recientes al final: si no caben todas se quedan esas
+            for clave, cuerpo in list(entradas.items())[-self.max_items:]:
+                self._entradas[clave] = [cuerpo.encode("utf-8"), None]
+            logger.info(f"Caché de análisis cargada de {ruta}: {len(self._entradas)} entradas")
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.info(f"Caché de análisis nueva en {ruta} ({e})")
+
+    def guardar(self) -> None:
+        # Vuelca las entradas a disco (solo si hay persistencia).
+        if not self.ruta:
+            return
+        with self._lock:
+            datos = {"entradas": {clave: cuerpo.decode("utf-8") for clave, (cuerpo, _) in self._entradas.items()}}
+            self._pendientes = 0
+        carpeta = os.path.dirname(self.ruta) or "."
+        os.makedirs(carpeta, exist_ok=True)
+        # Temporal propio de cada escritura: con varios workers guardando a la vez
+        # cada uno reemplaza el fichero entero con el suyo
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=carpeta, prefix=os.path.basename(self.ruta) + ".", suffix=".tmp", delete=False
+        ) as f:
+            json.dump(datos, f, ensure_ascii=False)
+        try:
+            os.replace(f.name, self.ruta)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+    # -------------------- Acceso --------------------
+    def obtener(self, clave: str) -> Optional[Tuple[bytes, Dict]]:
+        # (cuerpo JSON, resultado) o None. El resultado se decodifica la primera vez que se pide.
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            if entrada[1] is None:
+                entrada[1] = json.loads(entrada[0])
+            return entrada[0], entrada[1]
+
+    def guardar_resultado(self, clave: str, cuerpo: bytes, resultado: Dict) -> None:
+        with self._lock:
+            self._entradas[clave] = [cuerpo, resultado]
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_items:
+                self._entradas.popitem(last=False)
+            self._pendientes += 1
+            volcar = self.ruta and self._pendientes >= self.guardar_cada
+        if volcar:
+            self.guardar()
+
+    def estadisticas(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._entradas),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,296 @@
+# services/cache_embeddings.py
+"""
+Caché LRU/TTL de embeddings de consultas.
+
+La clave es el texto normalizado (minúsculas, espacios colapsados, NFC), de
+modo que "¿Qué ofrece BBVA?" y "¿qué ofrece  bbva?" comparten vector.
+
+Si se indica `ruta`, cada vector calculado se añade a `entradas.bin`
+(registro append-only: clave, timestamp y vector en una sola escritura) y al
+arrancar se recargan las entradas más recientes, así la caché sobrevive a los
+reinicios. Con varios workers (gunicorn) cada proceso tiene sus vectores en
+memoria y solo comparten el fichero: las escrituras van con O_APPEND bajo un
+flock (`entradas.lock`) y el descriptor se abre en el proceso que escribe,
+nunca antes del fork. Un registro a medias (caída durante la escritura) se
+recorta al cargar, antes de que nadie añada detrás. Cuando el fichero pasa
+de unas 2 × `max_items` entradas, el proceso que escribe lo compacta con las
+más recientes (las de todos los workers, releídas bajo el flock).
+"""
+import asyncio
+import logging
+import os
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (un solo proceso)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_MAGIA = b"HAEMB1"
+_CABECERA = struct.Struct("<6sI")  # magia, dim
+_REGISTRO = struct.Struct("<Id")  # longitud de la clave en bytes, timestamp
+_CLAVE_MEDIA = 128  # bytes por clave al estimar cuándo compactar
+
+
+def normalizar_consulta(texto: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", texto).lower().split())
+
+
+class CacheEmbeddings:
+    def __init__(
+        self,
+        max_items: int = 2048,
+        dim: int = 384,
+        ttl_segundos: float = 0.0,
+        ruta: Optional[str] = None,
+        bypass: bool = False,
+    ):
+        self.max_items = max_items
+        self.dim = dim
+        self.ttl_segundos = ttl_segundos  # 0 = sin caducidad
+        self.ruta = ruta
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+
+        # clave -> (slot, timestamp); el orden del OrderedDict es el orden LRU
+        self._indice: "OrderedDict[str, tuple]" = OrderedDict()
+        self._libres = list(range(max_items - 1, -1, -1))
+        self._vectores = np.zeros((max_items, dim), dtype=np.float32)
+        self._lock = threading.Lock()
+        # Descriptor del registro y proceso que lo abrió (tras un fork se reabre)
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        # Tamaño del registro a partir del cual se compacta (~2 × max_items entradas)
+        self._limite_bytes = _CABECERA.size + 2 * max_items * (_REGISTRO.size + _CLAVE_MEDIA + dim * 4)
+
+        if ruta:
+            os.makedirs(ruta, exist_ok=True)
+            self._cargar()
+
+    # -------------------- Persistencia --------------------
+    @property
+    def _ruta_registro(self) -> str:
+        return os.path.join(self.ruta, "entradas.bin")
+
+    @contextmanager
+    def _bloqueo(self) -> Iterator[None]:
+        # Exclusión entre procesos que comparten `ruta`
+        with open(os.path.join(self.ruta, "entradas.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _leer_registro(self) -> Tuple["OrderedDict[str, tuple]", int, int]:
+        # (clave -> (timestamp, vector) en orden de escritura, nº de registros leídos,
+        #  bytes sobrantes tras el último registro completo)
+        entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        try:
+            with open(self._ruta_registro, "rb") as f:
+                datos = f.read()
+        except FileNotFoundError:
+            return entradas, 0, 0
+        if not datos:
+            return entradas, 0, 0
+        if len(datos) < _CABECERA.size:
+            raise ValueError("cabecera incompleta")
+        magia, dim = _CABECERA.unpack_from(datos)
+        if magia != _MAGIA or dim != self.dim:
+            raise ValueError(f"registro de otra versión o dimensión ({dim})")
+
+        tam_vector = self.dim * 4
+        pos, leidos = _CABECERA.size, 0
+        while pos + _REGISTRO.size <= len(datos):
+            largo, ts = _REGISTRO.unpack_from(datos, pos)
+            fin = pos + _REGISTRO.size + largo + tam_vector
+            if fin > len(datos):
+                break  # registro a medias: la escritura se cortó
+            clave = datos[pos + _REGISTRO.size:pos + _REGISTRO.size + largo].decode("utf-8")
+            vector = np.frombuffer(datos, dtype=np.float32, count=self.dim, offset=fin - tam_vector)
+            entradas.pop(clave, None)
+            entradas[clave] = (ts, vector)
+            pos, leidos = fin, leidos + 1
+        return entradas, leidos, len(datos) - pos
+
+    def _releer(self, compactar: bool = False) -> list:
+        # Se llama con el flock cogido. Devuelve las entradas vigentes más recientes
+        # [(clave, ts, vector)] y deja el fichero listo para seguir añadiendo.
+        try:
+            entradas, leidos, sobrante = self._leer_registro()
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            logger.info(f"Caché de embeddings nueva en {self.ruta} ({e})")
+            entradas, leidos, sobrante = OrderedDict(), -1, 0
+
+        ahora = time.time()
+        vigentes = [
+            (clave, ts, vector) for clave, (ts, vector) in entradas.items()
+            if not self.ttl_segundos or ahora - ts <= self.ttl_segundos
+        ][-self.max_items:]
+
+        # Fichero ilegible o con demasiadas entradas viejas: se reescribe con las vigentes
+        if compactar or leidos < 0 or leidos > 2 * self.max_items:
+            self._compactar(vigentes)
+        elif sobrante:
+            # Registro a medias al final: se recorta para no añadir detrás de basura
+            os.truncate(self._ruta_registro, os.path.getsize(self._ruta_registro) - sobrante)
+        return vigentes
+
+    def _cargar(self) -> None:
+        with self._bloqueo():
+            vigentes = self._releer()
+        for slot, (clave, ts, vector) in enumerate(vigentes):
+            self._vectores[slot] = vector
+            self._indice[clave] = (slot, ts)
+        self._libres = list(range(self.max_items - 1, len(vigentes) - 1, -1))
+        logger.info(f"Caché de embeddings cargada de {self.ruta}: {len(self._indice)} entradas")
+
+    def _compactar(self, vigentes) -> None:
+        # Se llama con el flock cogido; os.replace deja el registro viejo a quien aún lo tenga abierto
+        tmp = f"{self._ruta_registro}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_CABECERA.pack(_MAGIA, self.dim))
+            for clave, ts, vector in vigentes:
+                f.write(self._empaquetar(clave, ts, vector))
+            tam = f.tell()
+        os.replace(tmp, self._ruta_registro)
+        # Con claves muy largas lo compactado podría no bajar del límite: se sube para no compactar en cada escritura
+        self._limite_bytes = max(self._limite_bytes, 2 * tam)
+
+    def _empaquetar(self, clave: str, ts: float, vector: np.ndarray) -> bytes:
+        clave_bytes = clave.encode("utf-8")
+        return _REGISTRO.pack(len(clave_bytes), ts) + clave_bytes + np.asarray(vector, dtype=np.float32).tobytes()
+
+    def _abrir_registro(self) -> int:
+        # Reabre si es otro proceso (fork) o si otro proceso ha compactado el fichero
+        try:
+            actual = os.stat(self._ruta_registro).st_ino
+        except FileNotFoundError:
+            actual = None
+        if self._fd is not None and self._pid == os.getpid() and os.fstat(self._fd).st_ino == actual:
+            return self._fd
+        if self._fd is not None and self._pid == os.getpid():
+            os.close(self._fd)
+        self._fd = os.open(self._ruta_registro, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+        if os.fstat(self._fd).st_size == 0:
+            os.write(self._fd, _CABECERA.pack(_MAGIA, self.dim))
+        return self._fd
+
+    def _persistir(self, clave: str, ts: float, vector: np.ndarray) -> None:
+        # Clave y vector en un solo write: el índice nunca apunta a un vector ajeno
+        registro = self._empaquetar(clave, ts, vector)
+        try:
+            with self._bloqueo():
+                fd = self._abrir_registro()
+                tam = os.fstat(fd).st_size
+                try:
+                    escritos = os.write(fd, registro)
+                except OSError:
+                    os.ftruncate(fd, tam)
+                    raise
+                if escritos != len(registro):
+                    # Escritura corta (disco lleno): se deshace para que el siguiente registro no quede desalineado
+                    os.ftruncate(fd, tam)
+                    raise OSError(f"escritura incompleta ({escritos} de {len(registro)} bytes)")
+                if tam + escritos > self._limite_bytes:
+                    self._releer(compactar=True)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el embedding en {self.ruta}: {e}")
+
+    def guardar(self) -> None:
+        # Cada vector ya se escribe al calcularlo; aquí solo se fuerza a disco.
+        if self._fd is not None and self._pid == os.getpid():
+            try:
+                os.fsync(self._fd)
+            except OSError:
+                pass
+
+    # -------------------- Acceso --------------------
+    def obtener(self, texto: str) -> Optional[np.ndarray]:
+        clave = normalizar_consulta(texto)
+        with self._lock:
+            entrada = self._indice.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            slot, ts = entrada
+            if self.ttl_segundos and time.time() - ts > self.ttl_segundos:
+                del self._indice[clave]
+                self._libres.append(slot)
+                self.misses += 1
+                return None
+            self._indice.move_to_end(clave)
+            self.hits += 1
+            return np.array(self._vectores[slot])
+
+    def guardar_vector(self, texto: str, vector: np.ndarray) -> None:
+        clave, ts = self._insertar(texto, vector)
+        # Fuera del lock: el disco y el flock no frenan a las lecturas de la caché
+        if self.ruta:
+            self._persistir(clave, ts, vector)
+
+    async def guardar_vector_async(self, texto: str, vector: np.ndarray) -> None:
+        # En memoria al momento; el flock, la escritura y una posible compactación
+        # (que puede esperar a otro worker) van a un hilo, fuera del event loop
+        clave, ts = self._insertar(texto, vector)
+        if self.ruta:
+            await asyncio.to_thread(self._persistir, clave, ts, vector)
+
+    def _insertar(self, texto: str, vector: np.ndarray) -> Tuple[str, float]:
+        clave = normalizar_consulta(texto)
+        with self._lock:
+            if clave in self._indice:
+                slot, _ = self._indice.pop(clave)
+            elif self._libres:
+                slot = self._libres.pop()
+            else:
+                # Expulsa la entrada menos usada y reutiliza su hueco
+                _, (slot, _) = self._indice.popitem(last=False)
+            ts = time.time()
+            self._vectores[slot] = vector
+            self._indice[clave] = (slot, ts)
+        return clave, ts
+
+    def obtener_o_calcular(self, texto: str, calcular: Callable[[str], np.ndarray]) -> np.ndarray:
+        if self.bypass:
+            return np.asarray(calcular(texto), dtype=np.float32)
+
+        vector = self.obtener(texto)
+        if vector is not None:
+            return vector
+
+        vector = np.asarray(calcular(texto), dtype=np.float32)
+        self.guardar_vector(texto, vector)
+        return vector
+
+    async def obtener_o_calcular_async(self, texto: str, calcular: Callable[[str], Awaitable[np.ndarray]]) -> np.ndarray:
+        if self.bypass:
+            return np.asarray(await calcular(texto), dtype=np.float32)
+
+        vector = self.obtener(texto)
+        if vector is not None:
+            return vector
+
+        vector = np.asarray(await calcular(texto), dtype=np.float32)
+        await self.guardar_vector_async(texto, vector)
+        return vector
+
+    def estadisticas(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._indice),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "bypass": self.bypass,
+        }
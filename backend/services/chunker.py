@@ -0,0 +1,158 @@
+# services/chunker.py
+"""
+Troceado de PDFs respetando su estructura.
+
+Recorre las páginas de una en una (nunca junta el documento entero en un
+string) y agrupa líneas en chunks de como mucho `max_tokens` tokens:
+
+- Un encabezado ("5. Comisiones", "TIPOS DE INTERÉS") cierra el chunk en
+  curso y abre una sección nueva. Cada chunk lleva su `seccion` y empieza
+  por el título del documento y el encabezado: así un chunk con
+  "Apertura: 0,3 %" sigue diciendo de qué banco y de qué apartado es.
+- Dentro de una sección, los chunks consecutivos comparten las últimas
+  líneas (hasta `solape_tokens`) para no partir una condición en dos.
+- Cada chunk sabe de qué páginas viene (`page_start`, `page_end`), lo que
+  permite enlazar a `/pdfs/x.pdf#page=N`.
+
+Los tamaños se miden en tokens y no en caracteres porque el límite real es
+el del modelo de embeddings (MiniLM trunca a 256 wordpieces). Por defecto se
+cuentan palabras y signos, una aproximación por lo bajo de los wordpieces;
+se puede inyectar el tokenizador del modelo con `contar_tokens`.
+"""
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "160"))
+CHUNK_SOLAPE_TOKENS = int(os.getenv("CHUNK_SOLAPE_TOKENS", "32"))
+
+_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_ENCABEZADO_NUMERADO = re.compile(r"^(\d+(\.\d+)*\.?|[A-Z]\)|[IVX]+\.)\s+\S")
+# Viñetas de fuentes Symbol/Wingdings que pypdf extrae como caracteres de uso privado
+_VINETAS_PRIVADAS = str.maketrans({"\uf0b7": "•", "\uf0a7": "•", "\uf0d8": "•", "\uf076": "•"})
+_VINETA = re.compile(r"^[•●▪\uf0b7\-\*·]\s*")
+
+
+def contar_tokens_aprox(texto: str) -> int:
+    return len(_TOKEN.findall(texto))
+
+
+def es_encabezado(linea: str) -> bool:
+    # Línea corta sin punto final: numerada ("3. Plazos"), en mayúsculas o acabada en ":".
+    linea = linea.strip()
+    if not linea or len(linea) > 80 or _VINETA.match(linea) or linea.endswith((".", ",", ";")):
+        return False
+    if _ENCABEZADO_NUMERADO.match(linea):
+        # "3. Plazos de amortización" sí; "1. El cliente podrá ... " (frase larga) no
+        return len(linea.split()) <= 8
+    letras = [c for c in linea if c.isalpha()]
+    if len(letras) >= 4 and all(c.isupper() for c in letras):
+        return True
+    return linea.endswith(":") and len(linea.split()) <= 6
+
+
+@dataclass
+class Chunk:
+    texto: str
+    page_start: int
+    page_end: int
+    seccion: str
+    n_tokens: int
+
+
+class _Linea:
+    __slots__ = ("texto", "pagina", "tokens")
+
+    def __init__(self, texto: str, pagina: int, tokens: int):
+        self.texto = texto
+        self.pagina = pagina
+        self.tokens = tokens
+
+
+def _partir_linea(texto: str, max_tokens: int, contar: Callable[[str], int]) -> List[str]:
+    # Una línea más larga que un chunk entero se corta por palabras.
+    trozos, actual = [], []
+    for palabra in texto.split():
+        if actual and contar(" ".join(actual + [palabra])) > max_tokens:
+            trozos.append(" ".join(actual))
+            actual = []
+        actual.append(palabra)
+    if actual:
+        trozos.append(" ".join(actual))
+    return trozos
+
+
+def trocear_paginas(
+    paginas: Iterable[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    solape_tokens: int = CHUNK_SOLAPE_TOKENS,
+    contar_tokens: Optional[Callable[[str], int]] = None,
+    min_tokens: int = 12,
+) -> Iterator[Chunk]:
+    """
+    Trocea el texto de las páginas (la primera es la 1) y devuelve los
+    chunks según se completan. `paginas` puede ser un generador.
+
+    Un preámbulo de menos de `min_tokens` antes del primer encabezado se
+    toma como título del documento ("Hipoteca ING – Documento Informativo")
+    y encabeza todos los chunks junto con la sección; ambos cuentan dentro
+    de `max_tokens`.
+    """
+    contar = contar_tokens or contar_tokens_aprox
+    titulo = ""
+    seccion = ""
+    coste_cabecera = 0
+    lineas: List[_Linea] = []
+    tokens = 0
+    # Hay texto nuevo desde el último chunk emitido (no solo solape)
+    pendiente = False
+
+    def cabecera() -> List[str]:
+        return [t for t in (titulo, seccion) if t]
+
+    def emitir() -> Chunk:
+        texto = "\n".join(cabecera() + [l.texto for l in lineas])
+        return Chunk(texto, lineas[0].pagina, lineas[-1].pagina, seccion, coste_cabecera + tokens)
+
+    def solape(limite: int) -> Tuple[List[_Linea], int]:
+        # Últimas líneas del chunk que caben en `limite` tokens
+        conservadas, total = [], 0
+        for l in reversed(lineas):
+            if total + l.tokens > limite:
+                break
+            conservadas.insert(0, l)
+            total += l.tokens
+        return conservadas, total
+
+    for n_pagina, texto_pagina in enumerate(paginas, start=1):
+        for bruta in (texto_pagina or "").splitlines():
+            texto = " ".join(bruta.translate(_VINETAS_PRIVADAS).split())
+            if not texto:
+                continue
+
+            if es_encabezado(texto):
+                if not titulo and not seccion and lineas and tokens < min_tokens:
+                    titulo = " ".join(l.texto for l in lineas)
+                elif pendiente:
+                    yield emitir()
+                seccion, lineas, tokens, pendiente = texto, [], 0, False
+                coste_cabecera = contar("\n".join(cabecera()))
+                continue
+
+            # Lo que queda para texto después del título y la sección
+            capacidad = max(max_tokens - coste_cabecera, max_tokens // 2)
+            trozos = _partir_linea(texto, capacidad, contar) if contar(texto) > capacidad else [texto]
+            for trozo in trozos:
+                n = contar(trozo)
+                if lineas and tokens + n > capacidad:
+                    if pendiente:
+                        yield emitir()
+                    # El solape más la línea nueva tiene que caber
+                    lineas, tokens = solape(min(solape_tokens, capacidad - n))
+                lineas.append(_Linea(trozo, n_pagina, n))
+                tokens += n
+                pendiente = True
+
+    if pendiente:
+        yield emitir()
@@ -0,0 +1,124 @@
+# services/despachador_embeddings.py
+"""
+Micro-batching de embeddings.
+
+SentenceTransformer rinde mucho más codificando varias frases en una sola
+llamada. El despachador recoge las consultas que llegan dentro de una
+ventana corta (EMBED_BATCH_WINDOW_MS) o hasta un máximo de elementos
+(EMBED_BATCH_MAX_SIZE), las codifica juntas en un hilo dedicado y entrega
+a cada llamante su vector a través de un Future.
+
+El hilo se arranca en el primer envío de cada proceso, así el despachador
+sigue funcionando en los workers creados por fork (gunicorn --preload).
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class DespachadorEmbeddings:
+    def __init__(
+        self,
+        encode_fn: Callable[[Sequence[str]], np.ndarray],
+        ventana_ms: float = 5.0,
+        max_lote: int = 32,
+    ):
+        self.encode_fn = encode_fn
+        self.ventana_s = ventana_ms / 1000.0
+        self.max_lote = max(1, int(max_lote))
+        self._lotes = 0
+        self._items = 0
+        self._lote_maximo = 0
+        self._pid = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def _asegurar_hilo(self) -> None:
+        # Tras un fork el hilo del padre no existe en el hijo: se crea uno nuevo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._cola: "queue.Queue" = queue.Queue()
+                self._hilo = threading.Thread(target=self._bucle, name="despachador-embeddings", daemon=True)
+                self._hilo.start()
+                self._pid = os.getpid()
+
+    def enviar(self, texto: str) -> Future:
+        # Encola una consulta y devuelve el Future con su vector.
+        self._asegurar_hilo()
+        futuro: Future = Future()
+        self._cola.put((texto, futuro))
+        return futuro
+
+    def encode(self, texto: str) -> np.ndarray:
+        return self.enviar(texto).result()
+
+    def cerrar(self) -> None:
+        if self._pid != os.getpid():
+            return
+        self._cola.put(_FIN)
+        self._hilo.join(timeout=5)
+
+    def _recoger_lote(self, primero) -> List:
+        # Espera a más consultas hasta que se agota la ventana o se llena el lote.
+        lote = [primero]
+        limite = time.monotonic() + self.ventana_s
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                item = self._cola.get(timeout=restante)
+            except queue.Empty:
+                break
+            if item is _FIN:
+                self._cola.put(_FIN)
+                break
+            lote.append(item)
+        return lote
+
+    def _bucle(self) -> None:
+        while True:
+            primero = self._cola.get()
+            if primero is _FIN:
+                return
+            lote = self._recoger_lote(primero)
+            # Descarta consultas cuyo llamante ya no espera
+            lote = [(t, f) for t, f in lote if f.set_running_or_notify_cancel()]
+            if not lote:
+                continue
+
+            try:
+                vectores = self.encode_fn([t for t, _ in lote])
+            except Exception as e:
+                logger.exception("Error codificando lote de embeddings")
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                continue
+
+            for (_, futuro), vector in zip(lote, vectores):
+                futuro.set_result(vector)
+            self._lotes += 1
+            self._items += len(lote)
+            self._lote_maximo = max(self._lote_maximo, len(lote))
+
+    def estadisticas(self) -> Dict:
+        return {
+            "ventana_ms": self.ventana_s * 1000.0,
+            "max_lote": self.max_lote,
+            "lotes": self._lotes,
+            "consultas": self._items,
+            "lote_medio": round(self._items / self._lotes, 2) if self._lotes else 0.0,
+            "lote_maximo": self._lote_maximo,
+        }
@@ -0,0 +1,100 @@
+# services/extraccion_pdf.py
+"""
+Lectura y troceado de los PDFs bancarios para la ingesta.
+
+`procesar_pdf` se ejecuta en el pool de procesos "spawn" del pipeline: cada
+hijo importa este módulo, así que aquí no se crea ningún cliente ni se lee
+configuración al importar (un segundo cliente de Qdrant embebido fallaría
+por el bloqueo de su carpeta).
+"""
+import os
+
+from pypdf import PdfReader
+
+from services.chunker import trocear_paginas
+from services.manifiesto_ingesta import ids_para_chunks
+from services.metadatos_documentos import detectar_banco, detectar_producto
+
+# Texto del principio del PDF que se usa para detectar banco y producto
+MUESTRA_METADATOS = 4000
+
+
+def extract_pages_from_pdf(path: str) -> list:
+    # Texto de cada página del PDF (sin concatenar todo el documento).
+    reader = PdfReader(path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+def extract_text_from_pdf(path: str) -> str:
+    # Extrae todo el texto de un archivo PDF.
+    return "\n".join(extract_pages_from_pdf(path)) + "\n"
+
+def chunk_text(text: str, max_chars: int = 500):
+    # Troceado anterior por caracteres; se conserva como referencia en scripts/bench_chunker.py y scripts/bench_api.py.
+    chunks = []
+    current = ""
+
+    # Divide por párrafos
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue # Ignora párrafos vacíos
+
+        # Si añadir este párrafo no excede el límite, lo añade al chunk actual
+        if len(current) + len(paragraph) + 1 <= max_chars:
+            current += paragraph + "\n"
+        else:
+            # Si excede, guarda el chunk actual y empieza uno nuevo
+            if current.strip():
+                chunks.append(current.strip())
+            current = paragraph + "\n"
+
+    # Añade el último chunk si tiene contenido
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+def iterar_paginas_pdf(path: str):
+    # Genera el texto de cada página según se lee; el documento nunca está entero en memoria.
+    for page in PdfReader(path).pages:
+        yield page.extract_text() or ""
+
+def procesar_pdf(path: str, banco: str = None, producto: str = None):
+    # Extrae y trocea un PDF. Se ejecuta en el pool de procesos del pipeline.
+    # Devuelve (número de páginas, chunks con id, hash del texto y payload).
+    # Banco y producto se detectan del nombre del fichero y del principio del texto.
+    n_paginas = 0
+    muestra = []
+
+    def paginas():
+        nonlocal n_paginas
+        for texto in iterar_paginas_pdf(path):
+            n_paginas += 1
+            if sum(len(m) for m in muestra) < MUESTRA_METADATOS:
+                muestra.append(texto)
+            yield texto
+
+    chunks = list(trocear_paginas(paginas()))
+    base_name = os.path.basename(path)
+    inicio = "\n".join(muestra)[:MUESTRA_METADATOS]
+    banco = banco or detectar_banco(base_name, inicio)
+    producto = producto or detectar_producto(base_name, inicio)
+    ids = ids_para_chunks(base_name, [c.texto for c in chunks])
+    return n_paginas, [
+        {
+            "id": point_id,
+            "hash": h,
+            "texto": chunk.texto,
+            "payload": {
+                "texto": chunk.texto,
+                "banco": banco,
+                "producto": producto,
+                "origen": path,
+                "ruta_pdf": base_name,
+                "chunk_index": idx,
+                "page_start": chunk.page_start,
+                "page_end": chunk.page_end,
+                "seccion": chunk.seccion,
+            },
+        }
+        for idx, (chunk, (point_id, h)) in enumerate(zip(chunks, ids))
+    ]
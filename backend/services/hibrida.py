@@ -0,0 +1,59 @@
+# services/hibrida.py
+"""
+Piezas de la recuperación híbrida: fusión de rankings (RRF) y reordenación
+opcional con un cross-encoder en CPU.
+"""
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+RERANK_MODELO = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+
+
+def fusion_rrf(rankings: Sequence[List[Dict]], top_k: int, k: int = 60) -> List[Dict]:
+    """
+    Reciprocal Rank Fusion: cada documento suma 1 / (k + posición) en cada
+    ranking donde aparece. No necesita que las puntuaciones de BM25 y coseno
+    sean comparables. Se conserva el primer dict visto de cada id y se
+    añade `score_rrf`.
+    """
+    puntuaciones: Dict[str, float] = {}
+    docs: Dict[str, Dict] = {}
+    for ranking in rankings:
+        for posicion, doc in enumerate(ranking, start=1):
+            doc_id = doc["id"]
+            puntuaciones[doc_id] = puntuaciones.get(doc_id, 0.0) + 1.0 / (k + posicion)
+            docs.setdefault(doc_id, doc)
+
+    orden = sorted(puntuaciones, key=lambda d: -puntuaciones[d])[:top_k]
+    return [{**docs[d], "score_rrf": round(puntuaciones[d], 6)} for d in orden]
+
+
+class Reranker:
+    # Cross-encoder cargado en la primera llamada (solo si BUSQUEDA_RERANK=1).
+
+    def __init__(self, modelo: str = RERANK_MODELO):
+        self.modelo = modelo
+        self._cross_encoder = None
+        self._lock = threading.Lock()
+
+    def _obtener(self):
+        if self._cross_encoder is None:
+            with self._lock:
+                if self._cross_encoder is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._cross_encoder = CrossEncoder(self.modelo, device="cpu")
+                    logger.info(f"Cross-encoder '{self.modelo}' cargado")
+        return self._cross_encoder
+
+    def reordenar(self, consulta: str, docs: List[Dict], top_k: Optional[int] = None) -> List[Dict]:
+        if not docs:
+            return docs
+        scores = self._obtener().predict([(consulta, d.get("texto", "")) for d in docs])
+        puntuados = [{**d, "score_rerank": float(s)} for d, s in zip(docs, scores)]
+        puntuados.sort(key=lambda d: -d["score_rerank"])
+        return puntuados[:top_k] if top_k else puntuados
@@ -0,0 +1,261 @@
+# services/indice_local.py
+"""
+Índice vectorial en memoria para corpus pequeños.
+
+Con unos pocos PDFs la colección cabe de sobra en una matriz NumPy: los
+vectores se guardan normalizados, así el producto escalar es la similitud
+coseno (la misma métrica que la colección de Qdrant).
+
+Cada snapshot en disco es un subdirectorio `<marca>/` con tres ficheros:
+- `vectores.f32`: matriz float32 (n, dim), abierta con memmap.
+- `bm25.json`: índice léxico BM25 sobre el `texto` de los mismos puntos.
+- `meta.json`: dimensión, ids y payloads.
+El fichero `version` apunta al subdirectorio vigente y se sustituye con
+os.replace cuando el snapshot nuevo ya está completo, así un lector nunca
+mezcla ficheros de dos snapshots. Se conserva el snapshot anterior para los
+lectores que leyeron `version` justo antes del cambio.
+
+Se usa como motor principal (BUSQUEDA_MOTOR=local) o como respaldo cuando
+Qdrant falla o tarda más de QDRANT_TIMEOUT_S.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.bm25 import IndiceBM25
+
+logger = logging.getLogger(__name__)
+
+INDICE_LOCAL_PATH = os.getenv("INDICE_LOCAL_PATH", "data/indice_local")
+
+# Mismos atributos que un ScoredPoint de Qdrant, para reutilizar _formatear_puntos
+PuntoLocal = namedtuple("PuntoLocal", ["id", "score", "payload"])
+
+
+def _normalizar(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=-1, keepdims=True)
+    return matriz / np.where(normas == 0, 1.0, normas)
+
+
+class IndiceLocal:
+    def __init__(self, vectores: np.ndarray, ids: Sequence, payloads: Sequence[Dict], bm25: Optional[IndiceBM25] = None):
+        if len(vectores) != len(ids) or len(ids) != len(payloads):
+            raise ValueError("vectores, ids y payloads deben tener la misma longitud")
+        self.vectores = vectores
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        # Columna de bancos para filtrar sin recorrer los payloads en cada búsqueda
+        self._bancos = np.array([str(p.get("banco") or "") for p in self.payloads], dtype=object)
+        self._bm25 = bm25
+
+    @property
+    def bm25(self) -> IndiceBM25:
+        # Se construye al vuelo si el snapshot no lo trae (snapshots antiguos)
+        if self._bm25 is None or self._bm25.n != len(self):
+            self._bm25 = IndiceBM25([p.get("texto") or "" for p in self.payloads])
+        return self._bm25
+
+    @classmethod
+    def desde_vectores(cls, vectores, ids: Sequence, payloads: Sequence[Dict], dim: Optional[int] = None) -> "IndiceLocal":
+        if not len(ids):
+            # Colección vacía: índice vacío con la dimensión del modelo (reshape(0, -1) no se puede)
+            if dim is None:
+                from services.modelo_embeddings import DIM_EMBEDDINGS
+                dim = DIM_EMBEDDINGS
+            return cls(np.zeros((0, dim), dtype=np.float32), [], [])
+        matriz = np.asarray(vectores, dtype=np.float32).reshape(len(ids), -1)
+        return cls(_normalizar(matriz).astype(np.float32), ids, payloads)
+
+    @classmethod
+    def desde_qdrant(cls, cliente, coleccion: str = "hipotecas", lote: int = 256) -> "IndiceLocal":
+        # Descarga todos los puntos (con vector) de la colección.
+        vectores, ids, payloads = [], [], []
+        offset = None
+        while True:
+            puntos, offset = cliente.scroll(
+                collection_name=coleccion,
+                limit=lote,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            for p in puntos:
+                vectores.append(p.vector)
+                ids.append(p.id)
+                payloads.append(p.payload or {})
+            if offset is None:
+                break
+        return cls.desde_vectores(vectores, ids, payloads)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # -------------------- Snapshot --------------------
+    def guardar(self, ruta: str = INDICE_LOCAL_PATH) -> None:
+        version = str(time.time_ns())
+        directorio = os.path.join(ruta, version)
+        os.makedirs(directorio)
+        np.ascontiguousarray(self.vectores, dtype=np.float32).tofile(os.path.join(directorio, "vectores.f32"))
+        with open(os.path.join(directorio, "bm25.json"), "w", encoding="utf-8") as f:
+            json.dump(self.bm25.a_dict(), f, ensure_ascii=False)
+        meta = {
+            "dim": int(self.vectores.shape[1]),
+            "vectores": "vectores.f32",
+            "ids": self.ids,
+            "payloads": self.payloads,
+        }
+        with open(os.path.join(directorio, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        anterior = _version_actual(ruta)
+        tmp = os.path.join(ruta, f"version.{version}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(ruta, "version"))
+
+        # Ya con el puntero cambiado: fuera todo salvo el snapshot nuevo y el anterior
+        for nombre in os.listdir(ruta):
+            viejo = os.path.join(ruta, nombre)
+            if nombre not in (version, anterior) and os.path.isdir(viejo) and nombre.isdigit():
+                shutil.rmtree(viejo, ignore_errors=True)
+
+    @classmethod
+    def cargar(cls, ruta: str = INDICE_LOCAL_PATH) -> "IndiceLocal":
+        try:
+            return cls._cargar_version(ruta)
+        except FileNotFoundError:
+            # Una ingestión cambió de versión mientras leíamos: se relee el puntero
+            return cls._cargar_version(ruta)
+
+    @classmethod
+    def _cargar_version(cls, ruta: str) -> "IndiceLocal":
+        version = _version_actual(ruta)
+        if version is None:
+            raise FileNotFoundError(f"Sin snapshot en {ruta}")
+        directorio = os.path.join(ruta, version)
+        with open(os.path.join(directorio, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        n, dim = len(meta["ids"]), meta["dim"]
+        if n == 0:
+            vectores = np.zeros((0, dim), dtype=np.float32)
+        else:
+            vectores = np.memmap(os.path.join(directorio, meta["vectores"]), dtype=np.float32, mode="r", shape=(n, dim))
+        try:
+            with open(os.path.join(directorio, "bm25.json"), encoding="utf-8") as f:
+                bm25 = IndiceBM25.desde_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            bm25 = None
+        return cls(vectores, meta["ids"], meta["payloads"], bm25)
+
+    # -------------------- Búsqueda --------------------
+    def buscar(
+        self,
+        vector: Sequence[float],
+        top_k: int = 5,
+        bancos: Optional[Sequence[str]] = None,
+        score_threshold: Optional[float] = None,
+    ) -> List[PuntoLocal]:
+        """
+        Mismo contrato que query_points: los top_k puntos más similares,
+        opcionalmente solo de los bancos indicados (cualquiera de ellos) y
+        con score >= score_threshold, ordenados de mayor a menor score.
+        """
+        if not len(self) or top_k <= 0:
+            return []
+        q = _normalizar(np.asarray(vector, dtype=np.float32))
+        scores = self.vectores @ q
+
+        candidatos = np.arange(len(self))
+        if bancos:
+            candidatos = candidatos[np.isin(self._bancos, list(bancos))]
+        if score_threshold is not None:
+            candidatos = candidatos[scores[candidatos] >= score_threshold]
+        if len(candidatos) > top_k:
+            candidatos = candidatos[np.argpartition(-scores[candidatos], top_k - 1)[:top_k]]
+        candidatos = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+
+        return [PuntoLocal(self.ids[i], float(scores[i]), self.payloads[i]) for i in candidatos]
+
+    def buscar_texto(self, consulta: str, top_k: int = 5, bancos: Optional[Sequence[str]] = None) -> List[PuntoLocal]:
+        # Búsqueda léxica BM25 sobre los mismos puntos; score = puntuación BM25.
+        mascara = np.isin(self._bancos, list(bancos)) if bancos else None
+        return [
+            PuntoLocal(self.ids[i], score, self.payloads[i])
+            for i, score in self.bm25.buscar(consulta, top_k=top_k, mascara=mascara)
+        ]
+
+
+def _version_actual(ruta: str) -> Optional[str]:
+    try:
+        with open(os.path.join(ruta, "version"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# -------------------- Instancia compartida --------------------
+# Cada cuánto se vuelve a mirar el fichero `version` (recoger una ingestión nueva,
+# o el primer snapshot si al arrancar no había); entre medias no se toca el disco.
+INDICE_LOCAL_RECARGA_S = float(os.getenv("INDICE_LOCAL_RECARGA_S", "30"))
+
+_indice: Optional[IndiceLocal] = None
+_ruta: Optional[str] = None
+_version: Optional[str] = None
+_fallo: Optional[str] = None
+_comprobado = float("-inf")
+_lock = threading.Lock()
+
+
+def indice_actual(ruta: str = INDICE_LOCAL_PATH) -> Optional[IndiceLocal]:
+    """
+    Índice del snapshot vigente; None si no hay. Se recarga cuando cambia
+    `version`, como mucho cada INDICE_LOCAL_RECARGA_S. Si la carga falla se
+    conserva el índice anterior y se reintenta en la siguiente comprobación.
+    """
+    global _indice, _ruta, _version, _fallo, _comprobado
+    if ruta == _ruta and time.monotonic() - _comprobado < INDICE_LOCAL_RECARGA_S:
+        return _indice
+    with _lock:
+        ahora = time.monotonic()
+        if ruta == _ruta and ahora - _comprobado < INDICE_LOCAL_RECARGA_S:
+            return _indice
+        if ruta != _ruta:
+            _indice, _ruta, _version, _fallo = None, ruta, None, None
+        _comprobado = ahora
+        try:
+            version = _version_actual(ruta)
+        except OSError as e:
+            version, error = None, str(e)
+        else:
+            error = None if version else "sin fichero version"
+        if version is not None and version != _version:
+            try:
+                _indice, _version = IndiceLocal.cargar(ruta), version
+                _fallo = None
+                logger.info(f"Índice local cargado de {ruta} (versión {version}): {len(_indice)} puntos")
+            except (OSError, ValueError, KeyError) as e:
+                error = str(e)
+        if error and _indice is None and error != _fallo:
+            # Se avisa una vez por causa, no en cada comprobación
+            logger.info(f"Sin índice local en {ruta} ({error})")
+        _fallo = error
+    return _indice
+
+
+def sincronizar_desde_qdrant(cliente, coleccion: str = "hipotecas", ruta: str = INDICE_LOCAL_PATH) -> IndiceLocal:
+    # Reconstruye el índice a partir de la colección, lo guarda y pasa a ser el actual.
+    global _indice, _ruta, _version, _fallo, _comprobado
+    indice = IndiceLocal.desde_qdrant(cliente, coleccion)
+    indice.guardar(ruta)
+    with _lock:
+        _indice, _ruta, _version, _fallo = indice, ruta, _version_actual(ruta), None
+        _comprobado = time.monotonic()
+    logger.info(f"Índice local sincronizado desde Qdrant: {len(indice)} puntos")
+    return indice
@@ -0,0 +1,205 @@
+# services/logs.py
+"""
+Logging sin bloqueos para la API.
+
+Las peticiones solo meten el registro en una cola (QueueHandler); un hilo de
+fondo (QueueListener) lo escribe en el fichero rotativo y en consola, así el
+disco (escrituras, fsync, rotación) nunca para el event loop ni el
+threadpool.
+
+- Fichero: una línea JSON por registro con id_peticion, las etapas de la
+  petición en curso (etapas_ms) y los campos de `extra`.
+- Consola: texto legible, como antes.
+- Muestreo: las líneas de mucho volumen se marcan con
+  extra={"muestreable": True} y solo se guarda la fracción LOG_MUESTREO de
+  peticiones (todas las líneas de una misma petición o ninguna). Avisos y
+  errores nunca se descartan.
+- Si la cola se llena (disco atascado) se descartan registros en lugar de
+  bloquear; se cuentan en `descartados`.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import zlib
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from services.metricas import etapas_peticion
+
+LOG_MUESTREO = float(os.getenv("LOG_MUESTREO", "1.0"))
+LOG_COLA_MAX = int(os.getenv("LOG_COLA_MAX", "10000"))
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+
+# Id de la petición en curso; lo pone el middleware (cabecera X-Request-ID o uno nuevo)
+id_peticion: ContextVar[Optional[str]] = ContextVar("id_peticion", default=None)
+
+# Atributos propios de LogRecord: el resto son campos de `extra`
+_ATRIBUTOS_BASE = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "id_peticion", "etapas_ms", "muestreable",
+}
+
+
+class FiltroContexto(logging.Filter):
+    """
+    Copia al registro el id de petición y las etapas medidas hasta ahora. Se
+    ejecuta en el hilo que loguea: en el hilo de escritura ya no hay contexto.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.id_peticion = id_peticion.get()
+        etapas = etapas_peticion.get()
+        record.etapas_ms = {k: round(v * 1000.0, 2) for k, v in etapas.items()} if etapas else None
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    def __init__(self, tasa: float = LOG_MUESTREO):
+        super().__init__()
+        self.tasa = max(0.0, min(1.0, tasa))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.tasa >= 1.0 or record.levelno >= logging.WARNING or not getattr(record, "muestreable", False):
+            return True
+        ident = getattr(record, "id_peticion", None)
+        # Por petición para no quedarse con líneas sueltas de una misma petición
+        azar = zlib.crc32(ident.encode()) / 2**32 if ident else random.random()
+        return azar < self.tasa
+
+
+class FormateadorJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if getattr(record, "id_peticion", None):
+            datos["id_peticion"] = record.id_peticion
+        if getattr(record, "etapas_ms", None):
+            datos["etapas_ms"] = record.etapas_ms
+        # Los campos de `extra`; la traza de una excepción ya viene en el mensaje (QueueHandler.prepare)
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_BASE:
+                datos[clave] = valor
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ManejadorCola(QueueHandler):
+    # QueueHandler que no bloquea: con la cola llena descarta y cuenta.
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class EscritorLogs(QueueListener):
+    """
+    stop() idempotente: se llama al apagar la app y otra vez desde atexit.
+
+    Con preload_app (gunicorn) la app se importa en el maestro y los workers
+    heredan el ManejadorCola pero no el hilo de escritura: tras el fork se
+    arranca uno nuevo en el hijo, con una cola propia (la del padre puede
+    tener registros que ya escribe el padre o el lock cogido).
+    """
+
+    def __init__(self, manejador: ManejadorCola, *handlers, respect_handler_level: bool = False):
+        super().__init__(manejador.queue, *handlers, respect_handler_level=respect_handler_level)
+        self.manejador = manejador
+        self._pid = None
+
+    def start(self) -> None:
+        super().start()
+        self._pid = os.getpid()
+
+    def stop(self) -> None:
+        # En un hijo sin reiniciar el hilo es del padre: no hay nada que parar
+        if self._thread is not None and self._pid == os.getpid():
+            super().stop()
+        self._pid = None
+
+    def reiniciar_tras_fork(self) -> None:
+        if self._pid is None or self._pid == os.getpid():
+            return
+        cola = queue.Queue(maxsize=self.queue.maxsize)
+        self.manejador.queue = cola
+        self.queue = cola
+        self._thread = None
+        self.start()
+
+
+# Listener vigente; los hooks de atexit y fork se registran una sola vez y actúan sobre él
+_escritor: Optional[EscritorLogs] = None
+
+
+def _parar_escritor() -> None:
+    if _escritor is not None:
+        _escritor.stop()
+
+
+def _reiniciar_escritor_tras_fork() -> None:
+    if _escritor is not None:
+        _escritor.reiniciar_tras_fork()
+
+
+atexit.register(_parar_escritor)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_escritor_tras_fork)
+
+
+def configurar_logging(
+    log_path: str,
+    nivel: str = LOG_NIVEL,
+    muestreo: float = LOG_MUESTREO,
+    cola_max: int = LOG_COLA_MAX,
+    consola: bool = True,
+) -> EscritorLogs:
+    """
+    Sustituye los handlers del logger raíz por un ManejadorCola y arranca el
+    hilo de escritura. Devuelve el listener (stop() vacía la cola y para el hilo).
+    Si ya había uno configurado, se para: deja de estar en el logger raíz.
+    """
+    global _escritor
+    fichero = RotatingFileHandler(
+        log_path,
+        maxBytes=10 * 1024 * 1024,  # 10 MB por archivo
+        backupCount=30,
+        encoding="utf-8",
+    )
+    fichero.setFormatter(FormateadorJSON())
+    handlers = [fichero]
+    if consola:
+        salida = logging.StreamHandler()
+        salida.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+        handlers.append(salida)
+
+    manejador = ManejadorCola(queue.Queue(maxsize=cola_max))
+    manejador.addFilter(FiltroContexto())
+    manejador.addFilter(FiltroMuestreo(muestreo))
+
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    raiz.addHandler(manejador)
+    raiz.setLevel(nivel)
+
+    _parar_escritor()
+    _escritor = EscritorLogs(manejador, *handlers, respect_handler_level=True)
+    _escritor.start()
+    return _escritor
+
+
+def descartados() -> int:
+    # Registros perdidos por cola llena desde el arranque (0 si no hay ManejadorCola).
+    return sum(h.descartados for h in logging.getLogger().handlers if isinstance(h, ManejadorCola))
@@ -0,0 +1,115 @@
+# services/manifiesto_ingesta.py
+"""
+Manifiesto de la ingesta incremental de PDFs.
+
+Guarda, por cada PDF ingerido, el hash de su contenido y el hash del texto
+de cada chunk con el id del punto en Qdrant. Con él, scripts/ingest_docs.py
+sabe qué ficheros no han cambiado (se copian sin recalcular nada), cuáles
+hay que volver a trocear (solo se re-embeben los chunks nuevos) y cuáles
+se han borrado (sus puntos no pasan a la colección nueva).
+
+El id de un punto depende del fichero y del texto del chunk, no de su
+posición: si se inserta un párrafo al principio de un PDF, los chunks que
+no cambian conservan su id y su vector.
+
+`version` identifica cómo se trocearon y etiquetaron los PDFs; si cambia
+(otro troceado, metadatos nuevos en el payload), todos los ficheros se
+vuelven a procesar aunque no hayan cambiado.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def hash_archivo(ruta: str, bloque: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for trozo in iter(lambda: f.read(bloque), b""):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+def hash_texto(texto: str) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def id_chunk(origen: str, hash_chunk: str, ocurrencia: int = 0) -> int:
+    # Entero estable de 64 bits; `ocurrencia` distingue chunks repetidos dentro del mismo PDF
+    digest = hashlib.sha1(f"{origen}::{hash_chunk}::{ocurrencia}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], byteorder="big", signed=False)
+
+
+def ids_para_chunks(origen: str, textos: Sequence[str]) -> List[Tuple[int, str]]:
+    # (id, hash) de cada chunk, en el mismo orden que `textos`.
+    vistos: Dict[str, int] = {}
+    resultado = []
+    for texto in textos:
+        h = hash_texto(texto)
+        ocurrencia = vistos.get(h, 0)
+        vistos[h] = ocurrencia + 1
+        resultado.append((id_chunk(origen, h, ocurrencia), h))
+    return resultado
+
+
+@dataclass
+class PlanIngesta:
+    sin_cambios: List[str] = field(default_factory=list)
+    modificados: List[str] = field(default_factory=list)
+    nuevos: List[str] = field(default_factory=list)
+    eliminados: List[str] = field(default_factory=list)
+
+    @property
+    def hay_cambios(self) -> bool:
+        return bool(self.modificados or self.nuevos or self.eliminados)
+
+
+class Manifiesto:
+    def __init__(
+        self,
+        coleccion: Optional[str] = None,
+        archivos: Optional[Dict[str, Dict]] = None,
+        version: Optional[int] = None,
+    ):
+        self.coleccion = coleccion
+        self.version = version
+        # nombre -> {"hash": sha256 del fichero, "puntos": {id: hash del texto}}
+        self.archivos: Dict[str, Dict] = archivos or {}
+
+    @classmethod
+    def cargar(cls, ruta: str) -> "Manifiesto":
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        return cls(datos.get("coleccion"), datos.get("archivos", {}), datos.get("version"))
+
+    def guardar(self, ruta: str) -> None:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"coleccion": self.coleccion, "version": self.version, "archivos": self.archivos}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, ruta)
+
+    def registrar(self, nombre: str, hash_fichero: str, puntos: Sequence[Tuple[int, str]]) -> None:
+        self.archivos[nombre] = {"hash": hash_fichero, "puntos": {str(i): h for i, h in puntos}}
+
+    def ids(self, nombre: str) -> List[int]:
+        return [int(i) for i in self.archivos.get(nombre, {}).get("puntos", {})]
+
+    def planificar(self, hashes_actuales: Dict[str, str], version: Optional[int] = None) -> PlanIngesta:
+        # Compara los ficheros actuales (nombre -> hash) con lo ingerido la última vez.
+        plan = PlanIngesta()
+        misma_version = version is None or self.version == version
+        for nombre, h in sorted(hashes_actuales.items()):
+            anterior = self.archivos.get(nombre)
+            if anterior is None:
+                plan.nuevos.append(nombre)
+            elif anterior["hash"] == h and misma_version:
+                plan.sin_cambios.append(nombre)
+            else:
+                plan.modificados.append(nombre)
+        plan.eliminados = sorted(set(self.archivos) - set(hashes_actuales))
+        return plan
@@ -0,0 +1,89 @@
+# services/metadatos_documentos.py
+"""
+Banco y producto de cada documento, con un nombre canónico.
+
+En Qdrant y en el índice local `banco` y `producto` se guardan siempre en la
+forma canónica de este módulo ("BBVA", "SANTANDER", "HIPOTECA"), así el
+filtro por banco es una sola condición exacta sobre un campo indexado. Las
+consultas (`/buscar?banco=santander`) pasan por `normalizar_banco` antes de
+filtrar.
+"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+BANCO_DESCONOCIDO = "DESCONOCIDO"
+PRODUCTO_POR_DEFECTO = "HIPOTECA"
+
+# Nombre canónico -> formas en las que aparece (en mayúsculas y sin tildes)
+BANCOS: Dict[str, Sequence[str]] = {
+    "BBVA": ("BBVA", "BANCO BILBAO VIZCAYA"),
+    "ING": ("ING", "ING DIRECT"),
+    "SANTANDER": ("SANTANDER", "BANCO SANTANDER"),
+    "CAIXABANK": ("CAIXABANK", "LA CAIXA"),
+    "SABADELL": ("SABADELL", "BANCO SABADELL"),
+    "BANKINTER": ("BANKINTER",),
+    "UNICAJA": ("UNICAJA",),
+    "ABANCA": ("ABANCA",),
+    "IBERCAJA": ("IBERCAJA",),
+    "KUTXABANK": ("KUTXABANK", "KUTXA"),
+    "OPENBANK": ("OPENBANK",),
+    "EVO": ("EVO BANCO", "EVO"),
+    "MYINVESTOR": ("MYINVESTOR",),
+}
+
+# Del más específico al más genérico: gana el primero que aparezca
+PRODUCTOS: Dict[str, Sequence[str]] = {
+    "HIPOTECA JOVEN": ("HIPOTECA JOVEN", "HIPOTECA PARA JOVENES"),
+    "HIPOTECA VERDE": ("HIPOTECA VERDE", "HIPOTECA SOSTENIBLE", "HIPOTECA ECO"),
+    "HIPOTECA": ("HIPOTECA", "PRESTAMO HIPOTECARIO"),
+}
+
+
+def _plegar(texto: str) -> str:
+    # Mayúsculas, sin tildes y con separadores de nombre de fichero como espacios
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFD", texto or "") if unicodedata.category(c) != "Mn")
+    return re.sub(r"[_\-.]+", " ", sin_tildes.upper())
+
+
+def _patron(formas: Sequence[str]) -> "re.Pattern":
+    return re.compile(r"\b(" + "|".join(re.escape(f).replace(r"\ ", r"\s+") for f in formas) + r")\b")
+
+
+_PATRONES_BANCOS = {canonico: _patron(formas) for canonico, formas in BANCOS.items()}
+_PATRONES_PRODUCTOS = {canonico: _patron(formas) for canonico, formas in PRODUCTOS.items()}
+
+
+def normalizar_banco(banco: Optional[str]) -> Optional[str]:
+    # "santander", "Banco Santander" -> "SANTANDER"; None si no es un banco conocido.
+    plegado = " ".join(_plegar(banco or "").split())
+    for canonico, patron in _PATRONES_BANCOS.items():
+        if patron.fullmatch(plegado):
+            return canonico
+    return None
+
+
+def bancos_en_texto(texto: str) -> List[str]:
+    # Bancos mencionados, como palabra completa ("ING" no casa con "INGRESOS").
+    plegado = _plegar(texto)
+    return [canonico for canonico, patron in _PATRONES_BANCOS.items() if patron.search(plegado)]
+
+
+def detectar_banco(nombre_fichero: str, texto: str = "") -> str:
+    # El nombre del fichero manda; si no lo dice, el banco más citado en el texto.
+    en_nombre = bancos_en_texto(nombre_fichero)
+    if len(en_nombre) == 1:
+        return en_nombre[0]
+    plegado = _plegar(texto)
+    menciones = Counter({c: len(p.findall(plegado)) for c, p in _PATRONES_BANCOS.items()})
+    canonico, veces = menciones.most_common(1)[0]
+    return canonico if veces else BANCO_DESCONOCIDO
+
+
+def detectar_producto(nombre_fichero: str, texto: str = "") -> str:
+    for fuente in (_plegar(nombre_fichero), _plegar(texto)):
+        for canonico, patron in _PATRONES_PRODUCTOS.items():
+            if patron.search(fuente):
+                return canonico
+    return PRODUCTO_POR_DEFECTO
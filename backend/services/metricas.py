@@ -0,0 +1,254 @@
+# services/metricas.py
+"""
+Métricas en formato de texto de Prometheus para GET /metrics, sin dependencias.
+
+- Histograma: latencias con buckets fijos, una serie por combinación de
+  etiquetas (ruta, etapa...).
+- Contador: totales que solo crecen (tokens de Gemini).
+- Medidor: valor leído al exponer mediante una función (tamaño de cachés,
+  sesiones...); no cuesta nada en el camino de las peticiones.
+
+Observar es barato: una búsqueda binaria del bucket y tres sumas bajo el lock
+de esa serie, que casi nunca está en disputa (el event loop es un solo hilo).
+Solo se toma el lock del registro al crear una serie nueva.
+"""
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Segundos: de 5 ms (caché, BM25) a 30 s (timeouts de Gemini)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas_texto(nombres: Sequence[str], valores: Sequence, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+def percentiles(valores: Sequence[float]) -> Optional[Dict[str, float]]:
+    # p50/p95 de una ventana de latencias recientes (ms) para /health y las estadísticas
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return {
+        "n": len(ordenados),
+        "p50": round(ordenados[len(ordenados) // 2], 1),
+        "p95": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))], 1),
+    }
+
+
+class _Metrica(ABC):
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+
+    def cabecera(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+    @abstractmethod
+    def muestras(self) -> List[str]: ...
+
+
+class _MetricaConSeries(_Metrica):
+    # Métrica que acumula en proceso una serie por combinación de etiquetas.
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._series: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _serie(self, valores: Tuple):
+        serie = self._series.get(valores)
+        if serie is None:
+            if len(valores) != len(self.etiquetas):
+                raise ValueError(f"{self.nombre} espera las etiquetas {self.etiquetas}")
+            with self._lock:
+                serie = self._series.setdefault(valores, self._nueva_serie())
+        return serie
+
+    @abstractmethod
+    def _nueva_serie(self): ...
+
+    def _copia_series(self) -> List[Tuple[Tuple, object]]:
+        # Las series se crean desde otros hilos mientras se expone
+        with self._lock:
+            series = list(self._series.items())
+        return sorted(series)
+
+
+class _SerieHistograma:
+    __slots__ = ("cuentas", "suma", "lock")
+
+    def __init__(self, n_buckets: int):
+        self.cuentas = [0] * (n_buckets + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.lock = threading.Lock()
+
+
+class Histograma(_MetricaConSeries):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def _nueva_serie(self):
+        return _SerieHistograma(len(self.buckets))
+
+    def observar(self, valor: float, *etiquetas) -> None:
+        serie = self._serie(etiquetas)
+        i = bisect_left(self.buckets, valor)
+        with serie.lock:
+            serie.cuentas[i] += 1
+            serie.suma += valor
+
+    def muestras(self) -> List[str]:
+        lineas = []
+        for valores, serie in self._copia_series():
+            with serie.lock:
+                cuentas, suma = list(serie.cuentas), serie.suma
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), cuentas):
+                acumulado += n
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas_texto(self.etiquetas, valores, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas_texto(self.etiquetas, valores)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas_texto(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+class _SerieContador:
+    __slots__ = ("valor", "lock")
+
+    def __init__(self):
+        self.valor = 0.0
+        self.lock = threading.Lock()
+
+
+class Contador(_MetricaConSeries):
+    tipo = "counter"
+
+    def _nueva_serie(self):
+        return _SerieContador()
+
+    def inc(self, valor: float = 1.0, *etiquetas) -> None:
+        serie = self._serie(etiquetas)
+        with serie.lock:
+            serie.valor += valor
+
+    def valor(self, *etiquetas) -> float:
+        serie = self._series.get(etiquetas)
+        return serie.valor if serie else 0.0
+
+    def muestras(self) -> List[str]:
+        return [
+            f"{self.nombre}{_etiquetas_texto(self.etiquetas, valores)} {_numero(serie.valor)}"
+            for valores, serie in self._copia_series()
+        ]
+
+
+class Medidor(_Metrica):
+    """
+    Valor calculado al exponer. `funcion` devuelve un número o, si hay
+    etiquetas, un dict {(valores de etiquetas): número}. `tipo` puede ser
+    "counter" para totales que ya lleva otro componente (hits de una caché).
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        ayuda: str,
+        funcion: Callable[[], Union[float, Dict[Tuple, float]]],
+        etiquetas: Sequence[str] = (),
+        tipo: str = "gauge",
+    ):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def muestras(self) -> List[str]:
+        valores = self.funcion()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [
+            f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(v)}"
+            for clave, v in sorted(valores.items())
+            if v is not None
+        ]
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        # Idempotente por nombre: si ya existe se devuelve la registrada
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def exponer(self) -> str:
+        lineas: List[str] = []
+        for metrica in list(self._metricas.values()):
+            try:
+                muestras = metrica.muestras()
+            except Exception as e:
+                # Un medidor roto no debe tumbar /metrics entero
+                lineas.append(f"# {metrica.nombre} no disponible: {_escapar(e)}")
+                continue
+            lineas.extend(metrica.cabecera())
+            lineas.extend(muestras)
+        return "\n".join(lineas) + "\n"
+
+
+# -------------------- Métricas compartidas --------------------
+registro = Registro()
+
+duracion_peticiones = registro.registrar(Histograma(
+    "hipotecassist_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta (plantilla), método y código de estado",
+    ("metodo", "ruta", "estado"),
+))
+
+etapas_preguntar = registro.registrar(Histograma(
+    "hipotecassist_preguntar_etapa_seconds",
+    "Latencia por etapa del camino de /preguntar: embedding, qdrant (búsqueda densa), bm25, fusion, rerank, prompt, gemini y memoria",
+    ("etapa",),
+))
+
+# Etapas de la petición en curso ({etapa: segundos}); el middleware crea el dict
+# y lo vuelca en la línea de log de la petición (services/logs.py)
+etapas_peticion: ContextVar[Optional[Dict[str, float]]] = ContextVar("etapas_peticion", default=None)
+
+
+def observar_etapa(etapa: str, segundos: float) -> None:
+    etapas_preguntar.observar(segundos, etapa)
+    actuales = etapas_peticion.get()
+    if actuales is not None:
+        actuales[etapa] = actuales.get(etapa, 0.0) + segundos
+
+
+tokens_gemini = registro.registrar(Contador(
+    "hipotecassist_gemini_tokens_total",
+    "Tokens consumidos en Gemini según usage_metadata (tipo=prompt|respuesta)",
+    ("tipo",),
+))
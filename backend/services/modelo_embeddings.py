@@ -0,0 +1,258 @@
+# services/modelo_embeddings.py
+"""
+Carga compartida del modelo de embeddings.
+
+El backend se elige con EMBEDDING_BACKEND:
+
+- "torch" (por defecto): SentenceTransformer en PyTorch, precisión completa.
+- "onnx": el mismo modelo exportado a ONNX y ejecutado directamente con
+  ONNX Runtime, por defecto en su variante cuantizada int8
+  (EMBEDDING_ONNX_ARCHIVO). Tokeniza con `tokenizers` y hace aquí el mean
+  pooling y la normalización de sentence-transformers. Necesita
+  `onnxruntime`, `tokenizers` y `huggingface-hub`; no importa torch ni
+  sentence_transformers, así que el proceso no carga PyTorch.
+- "falso": vectores deterministas a partir de las palabras, sin modelo ni
+  red (pruebas y benchmarks sin conexión).
+
+Ambos producen vectores de la misma dimensión y son intercambiables en la
+colección (ver tests/test_embeddings_paridad.py).
+
+Importar este módulo no carga torch ni el modelo. Cuándo se carga lo decide
+EMBEDDING_CARGA:
+
+- "segundo_plano" (por defecto): la API lo carga en un hilo al arrancar, de
+  modo que /health responde enseguida e informa de si el modelo está listo.
+- "inmediata": se carga al importar. Con gunicorn --preload (gunicorn.conf.py)
+  se carga una sola vez en el proceso maestro y los workers comparten los
+  pesos por copy-on-write en lugar de tener N copias.
+- "perezosa": se carga en la primera consulta.
+
+En cualquier modo, quien necesita el modelo antes de que esté listo espera a
+que termine la carga en curso (nunca se carga dos veces).
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODELO_EMBEDDINGS = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+DIM_EMBEDDINGS = int(os.getenv("EMBEDDING_DIM", "384"))  # all-MiniLM-L6-v2
+MODO_CARGA = os.getenv("EMBEDDING_CARGA", "segundo_plano").strip().lower()
+BACKEND_EMBEDDINGS = os.getenv("EMBEDDING_BACKEND", "torch").strip().lower()
+# Variantes int8 publicadas con el modelo: model_qint8_avx512_vnni.onnx, model_qint8_arm64.onnx, ...
+ARCHIVO_ONNX = os.getenv("EMBEDDING_ONNX_ARCHIVO", "onnx/model_quint8_avx2.onnx")
+
+
+# -------------------- Backends --------------------
+class BackendTorch:
+    nombre = "torch"
+
+    def __init__(self, modelo: str = MODELO_EMBEDDINGS):
+        from sentence_transformers import SentenceTransformer
+
+        self._modelo = SentenceTransformer(modelo, device="cpu")
+        self.dim = self._modelo.get_sentence_embedding_dimension()
+
+    def encode(self, textos: Sequence[str]) -> np.ndarray:
+        return np.asarray(self._modelo.encode(textos), dtype=np.float32)
+
+
+def _ficheros_modelo(modelo: str, patrones: Sequence[str]) -> str:
+    # Carpeta local del modelo o descarga (solo los ficheros pedidos) desde el Hub
+    if os.path.isdir(modelo):
+        return modelo
+    from huggingface_hub import snapshot_download
+
+    repo = modelo if "/" in modelo else f"sentence-transformers/{modelo}"
+    return snapshot_download(repo, allow_patterns=list(patrones))
+
+
+class BackendOnnx:
+    """
+    ONNX Runtime sin PyTorch: tokenizer.json + el .onnx del modelo, con el
+    pipeline de all-MiniLM-L6-v2 (mean pooling sobre la máscara de atención
+    y normalización L2).
+    """
+
+    nombre = "onnx"
+
+    def __init__(self, modelo: str = MODELO_EMBEDDINGS, archivo: Optional[str] = ARCHIVO_ONNX):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        archivo = archivo or "onnx/model.onnx"
+        carpeta = _ficheros_modelo(modelo, [archivo, "tokenizer.json", "sentence_bert_config.json"])
+        max_tokens = 256
+        try:
+            with open(os.path.join(carpeta, "sentence_bert_config.json"), encoding="utf-8") as f:
+                max_tokens = int(json.load(f).get("max_seq_length", max_tokens))
+        except OSError:
+            pass
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(carpeta, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_tokens)
+        self._tokenizer.enable_padding()
+        self._sesion = ort.InferenceSession(os.path.join(carpeta, archivo), providers=["CPUExecutionProvider"])
+        self._entradas = {e.name for e in self._sesion.get_inputs()}
+        self.archivo = archivo
+        self.dim = int(self.encode(["dimension"]).shape[1])
+
+    def encode(self, textos: Sequence[str]) -> np.ndarray:
+        if not len(textos):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        codificados = self._tokenizer.encode_batch(list(textos))
+        ids = np.array([c.ids for c in codificados], dtype=np.int64)
+        mascara = np.array([c.attention_mask for c in codificados], dtype=np.int64)
+        entradas = {"input_ids": ids, "attention_mask": mascara}
+        if "token_type_ids" in self._entradas:
+            entradas["token_type_ids"] = np.zeros_like(ids)
+        tokens = self._sesion.run(None, entradas)[0]  # (n, tokens, dim)
+
+        peso = mascara[..., None].astype(np.float32)
+        vectores = (tokens * peso).sum(axis=1) / np.maximum(peso.sum(axis=1), 1e-9)
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        return (vectores / np.where(normas == 0, 1.0, normas)).astype(np.float32)
+
+
+class BackendFalso:
+    """
+    Embeddings sin modelo ni red, para pruebas y benchmarks en local: cada
+    palabra suma un vector pseudoaleatorio fijo (sembrado con su hash), así
+    los textos que comparten palabras se parecen. Deterministas entre
+    ejecuciones; no entienden sinónimos, no sirven en producción.
+    """
+
+    nombre = "falso"
+
+    def __init__(self, modelo: str = MODELO_EMBEDDINGS, dim: int = DIM_EMBEDDINGS):
+        self.dim = dim
+        self._palabras: Dict[str, np.ndarray] = {}
+
+    def _vector(self, palabra: str) -> np.ndarray:
+        vector = self._palabras.get(palabra)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(palabra.encode("utf-8")))
+            vector = self._palabras.setdefault(palabra, rng.standard_normal(self.dim).astype(np.float32))
+        return vector
+
+    def encode(self, textos: Sequence[str]) -> np.ndarray:
+        salida = np.zeros((len(textos), self.dim), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            for palabra in re.findall(r"\w+", texto.lower()):
+                salida[i] += self._vector(palabra)
+        normas = np.linalg.norm(salida, axis=1, keepdims=True)
+        return salida / np.where(normas == 0, 1.0, normas)
+
+
+BACKENDS = {
+    "torch": BackendTorch,
+    "onnx": BackendOnnx,
+    "falso": BackendFalso,
+}
+
+
+def crear_backend(nombre: str = BACKEND_EMBEDDINGS, modelo: str = MODELO_EMBEDDINGS):
+    if nombre not in BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND desconocido: {nombre} (opciones: {', '.join(BACKENDS)})")
+    return BACKENDS[nombre](modelo)
+
+
+class CargadorModelo:
+    def __init__(self, nombre: str = MODELO_EMBEDDINGS, backend: str = BACKEND_EMBEDDINGS):
+        self.nombre = nombre
+        self.backend = backend
+        self.segundos_carga: Optional[float] = None
+        self._modelo = None
+        self._error: Optional[BaseException] = None
+        self._cargando = False
+        self._lock = threading.Lock()
+        self._listo = threading.Condition(self._lock)
+
+    def _cargar(self):
+        # Import diferido: torch / onnxruntime solo se importan cuando de verdad hace falta
+        inicio = time.perf_counter()
+        modelo = crear_backend(self.backend, self.nombre)
+        self.segundos_carga = round(time.perf_counter() - inicio, 2)
+        logger.info(f"Modelo de embeddings '{self.nombre}' ({self.backend}) cargado en {self.segundos_carga}s")
+        return modelo
+
+    def obtener(self):
+        # Devuelve el modelo, cargándolo (o esperando a la carga en curso) si hace falta.
+        with self._lock:
+            while self._cargando:
+                self._listo.wait()
+            if self._modelo is not None:
+                return self._modelo
+            self._cargando = True
+            self._error = None
+
+        modelo, error = None, None
+        try:
+            modelo = self._cargar()
+        except BaseException as e:
+            error = e
+            logger.exception(f"Error cargando el modelo de embeddings '{self.nombre}'")
+
+        with self._lock:
+            self._modelo, self._error = modelo, error
+            self._cargando = False
+            self._listo.notify_all()
+        if error is not None:
+            raise error
+        return modelo
+
+    def cargar_en_segundo_plano(self) -> None:
+        with self._lock:
+            if self._modelo is not None or self._cargando:
+                return
+
+        def cargar():
+            try:
+                self.obtener()
+            except BaseException:
+                pass  # ya registrado; el estado queda en "error"
+
+        threading.Thread(target=cargar, name="carga-modelo-embeddings", daemon=True).start()
+
+    def encode(self, textos: Sequence[str]) -> np.ndarray:
+        return self.obtener().encode(textos)
+
+    @property
+    def listo(self) -> bool:
+        return self._modelo is not None
+
+    def estado(self) -> Dict:
+        if self._modelo is not None:
+            estado = "listo"
+        elif self._cargando:
+            estado = "cargando"
+        elif self._error is not None:
+            estado = "error"
+        else:
+            estado = "pendiente"
+        return {
+            "estado": estado,
+            "modelo": self.nombre,
+            "backend": self.backend,
+            "segundos_carga": self.segundos_carga,
+            "error": repr(self._error) if self._error is not None else None,
+        }
+
+
+# Instancia compartida por la API y los scripts de ingesta
+cargador_embeddings = CargadorModelo()
+
+if MODO_CARGA == "inmediata":
+    cargador_embeddings.obtener()
+
+
+def obtener_modelo():
+    return cargador_embeddings.obtener()
@@ -0,0 +1,241 @@
+# services/pipeline_ingesta.py
+"""
+Pipeline de ingesta en paralelo y en streaming.
+
+    PDFs --(pool de procesos: extracción + troceado)--> cola acotada de chunks
+         --(hilo de embeddings: lotes de `lote_embedding`)--> lotes de puntos
+         --(pool de hilos: upserts de `lote_upsert` con reintentos)--> Qdrant
+
+La memoria está acotada en cada etapa: como mucho `procesos * 2` PDFs en
+vuelo, `max_cola` chunks esperando embedding y `hilos_upsert * 2` lotes
+esperando subida. Cuando una etapa se llena, la anterior espera.
+
+Las funciones de cada etapa se inyectan, así el pipeline no depende de
+Qdrant ni del modelo (y se prueba con funciones falsas):
+
+- extraer(ruta) -> (n_paginas, [{"id", "hash", "texto", "payload"}, ...])
+  Se ejecuta en otro proceso: debe ser una función de módulo (picklable).
+- embeber([textos]) -> matriz de vectores
+- subir([(id, vector, payload), ...])
+- reutilizar([ids]) -> {id: vector} con los vectores que ya existen (opcional)
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class MetricasIngesta:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.archivos = 0
+        self.paginas = 0
+        self.chunks = 0
+        self.embebidos = 0
+        self.reutilizados = 0
+        self.puntos_subidos = 0
+        self.reintentos = 0
+        self.latencias_upsert: List[float] = []
+        self._lock = threading.Lock()
+
+    def anotar_upsert(self, n_puntos: int, segundos: float) -> None:
+        with self._lock:
+            self.puntos_subidos += n_puntos
+            self.latencias_upsert.append(segundos * 1000.0)
+
+    def resumen(self) -> Dict:
+        segundos = max(time.perf_counter() - self.inicio, 1e-9)
+        latencias = sorted(self.latencias_upsert)
+
+        def percentil(p):
+            return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))], 1) if latencias else None
+
+        return {
+            "segundos": round(segundos, 2),
+            "archivos": self.archivos,
+            "paginas": self.paginas,
+            "chunks": self.chunks,
+            "embebidos": self.embebidos,
+            "reutilizados": self.reutilizados,
+            "puntos_subidos": self.puntos_subidos,
+            "reintentos_upsert": self.reintentos,
+            "paginas_por_s": round(self.paginas / segundos, 1),
+            "chunks_por_s": round(self.chunks / segundos, 1),
+            "upsert_ms_p50": percentil(0.50),
+            "upsert_ms_p95": percentil(0.95),
+        }
+
+    def linea(self) -> str:
+        r = self.resumen()
+        return (
+            f"[{r['segundos']:.0f}s] {r['archivos']} PDFs, {r['paginas']} páginas ({r['paginas_por_s']}/s), "
+            f"{r['chunks']} chunks ({r['chunks_por_s']}/s), {r['puntos_subidos']} subidos, "
+            f"upsert p50={r['upsert_ms_p50']} ms p95={r['upsert_ms_p95']} ms"
+        )
+
+
+class PipelineIngesta:
+    def __init__(
+        self,
+        extraer: Callable,
+        embeber: Callable,
+        subir: Callable,
+        reutilizar: Optional[Callable] = None,
+        procesos: int = 2,
+        lote_embedding: int = 64,
+        lote_upsert: int = 128,
+        hilos_upsert: int = 4,
+        max_cola: int = 1024,
+        reintentos: int = 3,
+        backoff_s: float = 0.5,
+        informe_cada_s: float = 5.0,
+        ejecutor_procesos: Optional[Callable] = None,
+    ):
+        self.extraer = extraer
+        self.embeber = embeber
+        self.subir = subir
+        self.reutilizar = reutilizar
+        self.procesos = max(1, procesos)
+        self.lote_embedding = max(1, lote_embedding)
+        self.lote_upsert = max(1, lote_upsert)
+        self.hilos_upsert = max(1, hilos_upsert)
+        self.max_cola = max(1, max_cola)
+        self.reintentos = reintentos
+        self.backoff_s = backoff_s
+        self.informe_cada_s = informe_cada_s
+        # "spawn": los procesos hijo no heredan hilos ni el estado de torch del padre
+        self.ejecutor_procesos = ejecutor_procesos or (
+            lambda n: ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+        )
+        self.metricas = MetricasIngesta()
+        self._error: Optional[BaseException] = None
+
+    # -------------------- Subida --------------------
+    def _subir_con_reintentos(self, puntos: List) -> None:
+        for intento in range(self.reintentos + 1):
+            inicio = time.perf_counter()
+            try:
+                self.subir(puntos)
+                self.metricas.anotar_upsert(len(puntos), time.perf_counter() - inicio)
+                return
+            except Exception as e:
+                if intento == self.reintentos:
+                    raise
+                self.metricas.reintentos += 1
+                logger.warning(f"Upsert de {len(puntos)} puntos fallido ({e!r}); reintento {intento + 1}")
+                time.sleep(self.backoff_s * (2 ** intento))
+
+    # -------------------- Embeddings --------------------
+    def _embeber_lote(self, lote: List[Dict]) -> List:
+        existentes = self.reutilizar([c["id"] for c in lote]) if self.reutilizar else {}
+        pendientes = [c for c in lote if c["id"] not in existentes]
+        vectores = dict(existentes)
+        if pendientes:
+            for c, v in zip(pendientes, self.embeber([c["texto"] for c in pendientes])):
+                vectores[c["id"]] = v
+        self.metricas.embebidos += len(pendientes)
+        self.metricas.reutilizados += len(lote) - len(pendientes)
+        return [
+            (c["id"], vectores[c["id"]].tolist() if hasattr(vectores[c["id"]], "tolist") else vectores[c["id"]], c["payload"])
+            for c in lote
+        ]
+
+    def _etapa_embeddings(self, cola: "queue.Queue", subidas: ThreadPoolExecutor) -> None:
+        en_vuelo = set()
+        ultimo_informe = time.perf_counter()
+
+        def enviar(puntos):
+            nonlocal en_vuelo
+            for i in range(0, len(puntos), self.lote_upsert):
+                # Como mucho hilos_upsert * 2 lotes pendientes de subir
+                while len(en_vuelo) >= self.hilos_upsert * 2:
+                    hechos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    for f in hechos:
+                        f.result()
+                en_vuelo.add(subidas.submit(self._subir_con_reintentos, puntos[i:i + self.lote_upsert]))
+
+        fin = False
+        try:
+            lote: List[Dict] = []
+            while not fin:
+                item = cola.get()
+                fin = item is _FIN
+                if not fin:
+                    lote.append(item)
+                if lote and (fin or len(lote) >= self.lote_embedding):
+                    enviar(self._embeber_lote(lote))
+                    lote = []
+                if time.perf_counter() - ultimo_informe >= self.informe_cada_s:
+                    logger.info(self.metricas.linea())
+                    ultimo_informe = time.perf_counter()
+            for f in en_vuelo:
+                f.result()
+        except BaseException as e:
+            self._error = e
+            # Vacía la cola hasta el final para que el productor no se quede bloqueado
+            while not fin:
+                fin = cola.get() is _FIN
+
+    # -------------------- Orquestación --------------------
+    def ejecutar(self, rutas: List[str]) -> Dict[str, Dict]:
+        """
+        Procesa `rutas` y devuelve, por ruta, {"chunks": [(id, hash), ...]}
+        o {"error": mensaje} si no se pudo extraer. Si una subida falla tras
+        los reintentos, lanza la excepción (la colección destino queda a medias
+        y el llamante debe descartarla).
+        """
+        self.metricas = MetricasIngesta()
+        self._error = None
+        resultados: Dict[str, Dict] = {}
+        cola: "queue.Queue" = queue.Queue(maxsize=self.max_cola)
+
+        with ThreadPoolExecutor(max_workers=self.hilos_upsert, thread_name_prefix="upsert") as subidas:
+            hilo = threading.Thread(target=self._etapa_embeddings, args=(cola, subidas), name="ingesta-embeddings")
+            hilo.start()
+            try:
+                with self.ejecutor_procesos(self.procesos) as pool:
+                    pendientes = iter(rutas)
+                    en_vuelo = {}
+
+                    def lanzar():
+                        # Como mucho procesos * 2 PDFs extraídos a la vez
+                        for ruta in pendientes:
+                            en_vuelo[pool.submit(self.extraer, ruta)] = ruta
+                            if len(en_vuelo) >= self.procesos * 2:
+                                break
+
+                    lanzar()
+                    while en_vuelo and self._error is None:
+                        hechos, _ = wait(list(en_vuelo), return_when=FIRST_COMPLETED)
+                        for futuro in hechos:
+                            ruta = en_vuelo.pop(futuro)
+                            try:
+                                paginas, chunks = futuro.result()
+                            except Exception as e:
+                                logger.error(f"Error extrayendo {ruta}: {e}")
+                                resultados[ruta] = {"error": str(e)}
+                                continue
+                            self.metricas.archivos += 1
+                            self.metricas.paginas += paginas
+                            self.metricas.chunks += len(chunks)
+                            resultados[ruta] = {"chunks": [(c["id"], c["hash"]) for c in chunks]}
+                            for c in chunks:
+                                cola.put(c)  # bloquea si el embedding va por detrás
+                        lanzar()
+                    for futuro in en_vuelo:
+                        futuro.cancel()
+            finally:
+                cola.put(_FIN)
+                hilo.join()
+
+        if self._error is not None:
+            raise self._error
+        logger.info(self.metricas.linea())
+        return resultados
@@ -1,8 +1,13 @@
 import os
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+import atexit
+import asyncio
 from dotenv import load_dotenv
 
+from services.backends_qdrant import crear_clientes_qdrant
+from services.cache_embeddings import CacheEmbeddings
+from services.despachador_embeddings import DespachadorEmbeddings
+from services.modelo_embeddings import cargador_embeddings, DIM_EMBEDDINGS, BACKEND_EMBEDDINGS
+
 
 load_dotenv()
 # QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
@@ -10,21 +15,53 @@ load_dotenv()
 # qdrant = QdrantClient(url=QDRANT_URL)
 # 
 
-# Obtener URL y API Key desde variables de entorno
-QDRANT_URL = os.getenv("QDRANT_URL").strip()
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY").strip()
+# Clientes de Qdrant según QDRANT_BACKEND (cloud por defecto, memoria o local; ver
+# services/backends_qdrant.py). El asíncrono es para el camino de /preguntar
+# (no bloquea el event loop)
+qdrant, qdrant_async = crear_clientes_qdrant()
+
+# Límite de consultas simultáneas a Qdrant desde el camino asíncrono
+qdrant_semaforo = asyncio.Semaphore(int(os.getenv("QDRANT_MAX_CONCURRENCIA", "16")))
+
+# El modelo de embeddings se carga aparte (ver services/modelo_embeddings.py):
+# importar este módulo ya no espera a torch ni a los pesos.
+
+# Caché de embeddings de consultas (las preguntas se repiten mucho en producción)
+cache_embeddings = CacheEmbeddings(
+    max_items=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    dim=DIM_EMBEDDINGS,
+    ttl_segundos=float(os.getenv("EMBEDDING_CACHE_TTL", "0")),
+    # Un directorio por backend: los vectores torch y onnx no son idénticos bit a bit
+    ruta=os.path.join(os.getenv("EMBEDDING_CACHE_PATH"), BACKEND_EMBEDDINGS) if os.getenv("EMBEDDING_CACHE_PATH") else None,
+    bypass=os.getenv("EMBEDDING_CACHE_BYPASS", "0") == "1",
+)
+atexit.register(cache_embeddings.guardar)
 
-# Conectar al Qdrant Cloud
-qdrant = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY
+# Agrupa las consultas concurrentes en una sola llamada a encode([...])
+despachador_embeddings = DespachadorEmbeddings(
+    cargador_embeddings.encode,
+    ventana_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")),
+    max_lote=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")),
 )
 
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+
+def embed_query(query: str) -> list:
+    # Embedding de una consulta: primero la caché, si no el despachador por lotes.
+    return cache_embeddings.obtener_o_calcular(query, despachador_embeddings.encode).tolist()
+
+
+async def embed_query_async(query: str) -> list:
+    # Igual que embed_query, pero esperando al despachador sin bloquear el event loop:
+    # la codificación se hace en su hilo dedicado.
+    vector = await cache_embeddings.obtener_o_calcular_async(
+        query, lambda q: asyncio.wrap_future(despachador_embeddings.enviar(q))
+    )
+    return vector.tolist()
+
 
 def recuperar_contexto(query: str, k: int = 5) -> str:
     # 1. Embedding de la pregunta del usuario
-    vector = embedding_model.encode(query).tolist()
+    vector = embed_query(query)
 
     # 2. Búsqueda en Qdrant
     resp = qdrant.query_points(
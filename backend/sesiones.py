@@ -0,0 +1,191 @@
+# backend/sesiones.py
+"""
+Almacén de análisis por sesión.
+
+Sustituye al antiguo `ultimo_resultado` global: cada resultado de /analisis
+se guarda bajo el session_id del usuario, de modo que /preguntar siempre usa
+la hipoteca de quien pregunta. Con varios workers o réplicas solo es así con
+ANALISIS_STORE=redis: gunicorn no arranca con más de un worker y el almacén
+en memoria (ver comprobar_workers).
+
+Backends disponibles (variable ANALISIS_STORE):
+- "memoria" (por defecto): LRU en proceso con caducidad (TTL); un solo worker.
+- "redis": almacén compartido entre workers (requiere REDIS_URL y el paquete redis).
+- "local": mismo código que "redis" pero sobre un cliente clave-valor en
+  proceso, útil para probar el backend compartido sin levantar Redis (no se
+  comparte entre workers).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AlmacenAnalisis(ABC):
+    # Interfaz común de los almacenes de análisis.
+
+    @abstractmethod
+    def guardar(self, session_id: str, resultado: Dict) -> None: ...
+
+    @abstractmethod
+    def obtener(self, session_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    def borrar(self, session_id: str) -> None: ...
+
+    @abstractmethod
+    def sesiones_activas(self) -> Optional[int]:
+        # Para /health y /metrics; None si contarlas cuesta demasiado
+        ...
+
+
+class AlmacenMemoria(AlmacenAnalisis):
+    # LRU en proceso: como máximo `max_sesiones` entradas, cada una válida `ttl_segundos`.
+
+    def __init__(self, max_sesiones: int = 10_000, ttl_segundos: float = 3600.0):
+        self.max_sesiones = max_sesiones
+        self.ttl_segundos = ttl_segundos
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purgar_caducadas(self, ahora: float) -> None:
+        # Las entradas más antiguas están al principio: se para en la primera vigente
+        while self._datos:
+            session_id, (_, caduca) = next(iter(self._datos.items()))
+            if caduca > ahora:
+                break
+            del self._datos[session_id]
+
+    def guardar(self, session_id: str, resultado: Dict) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._datos.pop(session_id, None)
+            self._datos[session_id] = (resultado, ahora + self.ttl_segundos)
+            self._purgar_caducadas(ahora)
+            while len(self._datos) > self.max_sesiones:
+                self._datos.popitem(last=False)
+
+    def obtener(self, session_id: str) -> Optional[Dict]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(session_id)
+            if entrada is None:
+                return None
+            resultado, caduca = entrada
+            if caduca <= ahora:
+                del self._datos[session_id]
+                return None
+            # Renueva la posición LRU y la caducidad
+            self._datos.move_to_end(session_id)
+            self._datos[session_id] = (resultado, ahora + self.ttl_segundos)
+            return resultado
+
+    def borrar(self, session_id: str) -> None:
+        with self._lock:
+            self._datos.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purgar_caducadas(time.monotonic())
+            return len(self._datos)
+
+    def sesiones_activas(self) -> Optional[int]:
+        return len(self)
+
+
+class ClienteKVLocal:
+    # Subconjunto de la API de redis-py (get/setex/expire/delete) en memoria del proceso.
+
+    def __init__(self):
+        self._datos: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def setex(self, clave: str, ttl: int, valor: str) -> None:
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + ttl)
+
+    def get(self, clave: str) -> Optional[str]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[1] <= time.monotonic():
+                del self._datos[clave]
+                return None
+            return entrada[0]
+
+    def expire(self, clave: str, ttl: int) -> None:
+        with self._lock:
+            if clave in self._datos:
+                self._datos[clave] = (self._datos[clave][0], time.monotonic() + ttl)
+
+    def delete(self, clave: str) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+
+
+class AlmacenCompartido(AlmacenAnalisis):
+    # Almacén en un servicio clave-valor compartido (Redis); la caducidad la gestiona el servidor.
+
+    def __init__(self, cliente, ttl_segundos: int = 3600, prefijo: str = "hipotecassist:analisis:"):
+        self.cliente = cliente
+        self.ttl_segundos = int(ttl_segundos)
+        self.prefijo = prefijo
+
+    def _clave(self, session_id: str) -> str:
+        return f"{self.prefijo}{session_id}"
+
+    def guardar(self, session_id: str, resultado: Dict) -> None:
+        self.cliente.setex(self._clave(session_id), self.ttl_segundos, json.dumps(resultado))
+
+    def obtener(self, session_id: str) -> Optional[Dict]:
+        clave = self._clave(session_id)
+        valor = self.cliente.get(clave)
+        if valor is None:
+            return None
+        self.cliente.expire(clave, self.ttl_segundos)
+        return json.loads(valor)
+
+    def borrar(self, session_id: str) -> None:
+        self.cliente.delete(self._clave(session_id))
+
+    def sesiones_activas(self) -> Optional[int]:
+        # Contarlas exige recorrer todo el keyspace con SCAN: no se hace en cada /health o /metrics
+        return None
+
+
+def crear_almacen() -> AlmacenAnalisis:
+    # Construye el almacén configurado por variables de entorno.
+    backend = os.getenv("ANALISIS_STORE", "memoria").strip().lower()
+    ttl = float(os.getenv("ANALISIS_TTL_SEGUNDOS", "3600"))
+
+    if backend == "redis":
+        import redis  # dependencia opcional, solo para despliegues con varios workers
+
+        cliente = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        logger.info("Almacén de análisis: Redis compartido")
+        return AlmacenCompartido(cliente, ttl_segundos=int(ttl))
+    if backend == "local":
+        logger.info("Almacén de análisis: cliente clave-valor local")
+        return AlmacenCompartido(ClienteKVLocal(), ttl_segundos=int(ttl))
+
+    max_sesiones = int(os.getenv("ANALISIS_MAX_SESIONES", "10000"))
+    logger.info(f"Almacén de análisis: memoria (max={max_sesiones}, ttl={ttl:.0f}s)")
+    return AlmacenMemoria(max_sesiones=max_sesiones, ttl_segundos=ttl)
+
+
+def comprobar_workers(workers: int) -> None:
+    # Con varios workers un /preguntar puede caer en otro proceso que no tiene el
+    # análisis ("No hay análisis previo"): solo Redis se comparte entre ellos.
+    backend = os.getenv("ANALISIS_STORE", "memoria").strip().lower()
+    if workers > 1 and backend != "redis":
+        raise RuntimeError(
+            f"ANALISIS_STORE={backend} guarda los análisis en cada proceso y hay {workers} workers: "
+            "usa ANALISIS_STORE=redis (con REDIS_URL) o un solo worker"
+        )
@@ -0,0 +1,113 @@
+# backend/simulacion_euribor.py
+"""
+Simulación Monte Carlo del Euríbor para hipotecas variables.
+
+El Euríbor sigue un proceso con reversión a la media (Vasicek discreto)
+que se revisa una vez al año. En cada revisión se recalcula la cuota de
+todas las trayectorias a la vez sobre el saldo y el plazo pendientes, y
+dentro de cada año el saldo avanza con la fórmula cerrada del cuadro.
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from amortizacion import cuota, saldo_bruto
+
+
+def _percentiles(valores: np.ndarray, percentiles: Iterable[int]) -> Dict[str, float]:
+    ps = tuple(percentiles)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(ps, np.percentile(valores, ps))}
+
+
+def trayectorias_euribor(
+    euribor_inicial: float,
+    n_revisiones: int,
+    n_trayectorias: int,
+    reversion: float = 0.3,
+    euribor_largo_plazo: float = 2.5,
+    volatilidad: float = 0.8,
+    semilla: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Genera una matriz (revisiones x trayectorias) de Euríbor en %.
+
+    La primera revisión es el Euríbor actual; las siguientes aplican
+    E[k+1] = E[k] + reversion·(largo_plazo − E[k]) + volatilidad·ε.
+    """
+    rng = np.random.default_rng(semilla)
+    euribor = np.empty((n_revisiones, n_trayectorias))
+    euribor[0] = euribor_inicial
+    if n_revisiones > 1:
+        shocks = rng.standard_normal((n_revisiones - 1, n_trayectorias)) * volatilidad
+        for k in range(1, n_revisiones):
+            euribor[k] = euribor[k - 1] + reversion * (euribor_largo_plazo - euribor[k - 1]) + shocks[k - 1]
+    return euribor
+
+
+def simular_hipoteca_variable(
+    P: float,
+    euribor: float,
+    diferencial: float,
+    n_meses: int,
+    n_trayectorias: int = 10_000,
+    reversion: float = 0.3,
+    euribor_largo_plazo: float = 2.5,
+    volatilidad: float = 0.8,
+    semilla: Optional[int] = None,
+    ingresos_mensuales: Optional[float] = None,
+    otras_deudas_mensuales: float = 0.0,
+    meses_revision: int = 12,
+    percentiles: Iterable[int] = (5, 50, 95),
+) -> Dict:
+    # Simula la hipoteca en todas las trayectorias y resume la distribución de resultados.
+    percentiles = tuple(percentiles)
+    n_revisiones = -(-n_meses // meses_revision)
+    euribor_tray = trayectorias_euribor(
+        euribor, n_revisiones, n_trayectorias, reversion, euribor_largo_plazo, volatilidad, semilla
+    )
+    # El tipo aplicado nunca es negativo
+    tipos = np.maximum(0.0, euribor_tray + diferencial) / 100.0
+
+    saldo_vivo = np.full(n_trayectorias, float(P))
+    intereses = np.zeros(n_trayectorias)
+    cuotas = np.empty((n_revisiones, n_trayectorias))
+
+    for k in range(n_revisiones):
+        restantes = n_meses - k * meses_revision
+        meses_periodo = min(meses_revision, restantes)
+        # Nueva cuota sobre el saldo y el plazo pendientes
+        c = cuota(saldo_vivo, tipos[k], restantes)
+        nuevo_saldo = saldo_bruto(saldo_vivo, tipos[k] / 12.0, c, meses_periodo)
+        intereses += meses_periodo * c - (saldo_vivo - nuevo_saldo)
+        saldo_vivo = np.maximum(0.0, nuevo_saldo)
+        cuotas[k] = c
+
+    cuota_maxima = cuotas.max(axis=0)
+    resultado = {
+        "n_trayectorias": n_trayectorias,
+        "n_revisiones": n_revisiones,
+        "parametros": {
+            "euribor_inicial": euribor,
+            "diferencial": diferencial,
+            "reversion": reversion,
+            "euribor_largo_plazo": euribor_largo_plazo,
+            "volatilidad": volatilidad,
+            "semilla": semilla,
+        },
+        "cuota_maxima": _percentiles(cuota_maxima, percentiles),
+        "cuota_por_revision": [
+            {"revision": k + 1, **_percentiles(cuotas[k], percentiles)} for k in range(n_revisiones)
+        ],
+        "intereses_totales": _percentiles(intereses, percentiles),
+        "euribor_final": _percentiles(euribor_tray[-1], percentiles),
+        "dti_maximo": None,
+        "prob_dti_mayor_40": None,
+    }
+
+    # DTI máximo alcanzado en cada trayectoria
+    if ingresos_mensuales and ingresos_mensuales > 0:
+        dti_max = (cuota_maxima + (otras_deudas_mensuales or 0.0)) / ingresos_mensuales * 100.0
+        resultado["dti_maximo"] = _percentiles(dti_max, percentiles)
+        resultado["prob_dti_mayor_40"] = round(float(np.mean(dti_max >= 40)), 4)
+
+    return resultado
@@ -51,16 +51,21 @@ el("form-analisis").addEventListener("submit", async (e) => {
     otras_deudas_mensuales: parseFloat(el("otras_deudas_mensuales").value) || 0,
     valor_vivienda: parseFloat(el("valor_vivienda").value) || null,
     oferta_alternativa_tin: parseFloat(el("oferta_alternativa_tin").value) || null,
+    session_id,
   };
 
   try {
+    const headers = { "Content-Type": "application/json" };
+    // Si el formulario no ha cambiado, el backend responde 304 y reutilizamos el último análisis
+    if (ultimoEtag && ultimoResultado) headers["If-None-Match"] = ultimoEtag;
     const res = await fetch(`${API}/analisis`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers,
       body: JSON.stringify(payload),
     });
 
-    const data = await res.json();
+    const data = res.status === 304 ? ultimoResultado : await res.json();
+    if (res.status !== 304) ultimoEtag = data.ok ? res.headers.get("ETag") : null;
     if (!data.ok) {
       alert(data.error || "Error en el análisis");
       return;
@@ -176,6 +181,7 @@ function card(title, value, badge = null) {
 // ---------- Chat asistente hipotecario mejorado (con typing y Enter) ----------
 
 let ultimoResultado = null;
+let ultimoEtag = null;
 let typingIndicator = null;
 
 // Crear contenedor del chat
@@ -265,11 +271,26 @@ chatPanel.appendChild(chatInputContainer);
 document.querySelector(".container").appendChild(chatPanel);
 
 function addMessage(sender, text, documentos = []) {
-  console.log("📄 documentos:", documentos);
-
   const msg = document.createElement("div");
   msg.className = sender === "Usuario" ? "msg-user" : "msg-bot";
 
+  msg.style.margin = "10px 0";
+  msg.style.padding = "10px 12px";
+  msg.style.borderRadius = "10px";
+  msg.style.maxWidth = "75%";
+  msg.style.whiteSpace = "pre-wrap";
+
+  msg.style.background = sender === "Usuario" ? "#e7f1ff" : "#f3f3f3";
+  msg.style.marginLeft = sender === "Usuario" ? "auto" : "0";
+
+  renderMessage(msg, sender, text, documentos);
+  chatMessages.appendChild(msg);
+  chatMessages.scrollTop = chatMessages.scrollHeight;
+  return msg;
+}
+
+// Pinta (o repinta, durante el streaming) el contenido de un mensaje
+function renderMessage(msg, sender, text, documentos = []) {
   let docsHTML = "";
   if (documentos.length > 0) {
     docsHTML = `<div style="text-align:center; margin-top:6px;">
@@ -289,7 +310,7 @@ function addMessage(sender, text, documentos = []) {
             text-decoration:none;
             font-size:0.65em;
           ">
-          <span style="font-size:0.7em;">📄</span> ${d.origen}
+          <span style="font-size:0.7em;">📄</span> ${d.origen}${d.pagina ? ` · pág. ${d.pagina}` : ""}
         </a>
       </li>
     `;
@@ -298,20 +319,7 @@ function addMessage(sender, text, documentos = []) {
     docsHTML += "</ul></div>";
   }
 
-
-"#e0e0e0ff"
   msg.innerHTML = `<strong>${sender}:</strong><br>${text}${docsHTML}`;
-
-  msg.style.margin = "10px 0";
-  msg.style.padding = "10px 12px";
-  msg.style.borderRadius = "10px";
-  msg.style.maxWidth = "75%";
-  msg.style.whiteSpace = "pre-wrap";
-
-  msg.style.background = sender === "Usuario" ? "#e7f1ff" : "#f3f3f3";
-  msg.style.marginLeft = sender === "Usuario" ? "auto" : "0";
-
-  chatMessages.appendChild(msg);
   chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
@@ -382,7 +390,8 @@ async function sendMessage() {
   showTyping();
 
   try {
-    const res = await fetch(`${API}/preguntar`, {
+    // Respuesta en streaming (Server-Sent Events sobre POST)
+    const res = await fetch(`${API}/preguntar/stream`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ 
@@ -393,12 +402,54 @@ async function sendMessage() {
       })
     });
 
-    const data = await res.json();
-    hideTyping();
+    if (!res.ok || !res.body) {
+      const data = await res.json();
+      hideTyping();
+      addMessage("Bot", data.detail || "Error al generar la respuesta ❌");
+      return;
+    }
 
-    // Aquí pasamos también los documentos usados al chat
-    console.log(data.documentos_usados);
-    addMessage("Bot", data.respuesta, data.documentos_usados);
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let texto = "";
+    let msg = null;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Cada evento SSE termina con una línea en blanco
+      let corte;
+      while ((corte = buffer.indexOf("\n\n")) >= 0) {
+        const bloque = buffer.slice(0, corte);
+        buffer = buffer.slice(corte + 2);
+
+        const evento = (bloque.match(/^event: (.*)$/m) || [])[1];
+        const datos = JSON.parse((bloque.match(/^data: (.*)$/m) || [])[1] || "{}");
+
+        if (evento === "token") {
+          texto += datos.texto;
+          if (!msg) {
+            hideTyping();
+            msg = addMessage("Bot", texto);
+          } else {
+            renderMessage(msg, "Bot", texto);
+          }
+        } else if (evento === "fin") {
+          // Aquí pasamos también los documentos usados al chat
+          hideTyping();
+          if (!msg) msg = addMessage("Bot", texto);
+          renderMessage(msg, "Bot", texto, datos.documentos_usados || []);
+        } else if (evento === "error") {
+          // La generación no terminó: se sustituye lo recibido por el aviso de error
+          hideTyping();
+          if (!msg) msg = addMessage("Bot", datos.mensaje);
+          else renderMessage(msg, "Bot", datos.mensaje);
+        }
+      }
+    }
 
   } catch (err) {
     hideTyping();
@@ -0,0 +1,294 @@
+# scripts/bench_api.py
+"""
+Banco de pruebas de rendimiento de la API, reproducible y sin red.
+
+- micro: microbenchmarks al estilo pytest-benchmark (rondas calibradas;
+  mínimo, media, mediana, desviación y ops/s) de cuota_mensual,
+  resumen_amortizacion, ahorro_amortizacion_extra, trocear_paginas (el
+  chunker de la ingesta), chunk_text (el troceado anterior, como
+  referencia) y _build_docs_block.
+- carga: reproduce un fichero de tráfico JSONL (una petición por línea:
+  {"metodo", "ruta", "cuerpo" | "params"}) contra la app en proceso, con
+  Qdrant en memoria (QDRANT_BACKEND=memoria, sembrado con el índice local
+  construido con los PDFs de data/docs_bancarios) y Gemini sustituido por
+  el backend falso (LLM_BACKEND=falso); con EMBEDDING_BACKEND=falso no
+  hace falta ni el modelo de embeddings. Con --url se lanza contra un
+  servidor ya arrancado. Da p50/p95/p99 por ruta y el throughput total.
+
+--guardar escribe los resultados en JSON; --comparar los contrasta con una
+línea base y termina con código 1 si algo empeora más de --tolerancia.
+
+Uso:
+    python scripts/bench_api.py micro --comparar scripts/bench_baseline.json
+    python scripts/bench_api.py carga --vueltas 20 --concurrencia 16
+    python scripts/bench_api.py todo --guardar /tmp/bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND = os.path.join(RAIZ, "backend")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+DOCS = os.path.join(RAIZ, "data", "docs_bancarios")
+TRAFICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trafico_bench.jsonl")
+
+
+def preparar_entorno(carpeta: str, args) -> None:
+    # Antes de importar la app: sus módulos leen la configuración al importarse.
+    os.environ.setdefault("LLM_BACKEND", "falso")
+    os.environ.setdefault("LLM_FALSO_LATENCIA_MS", str(args.latencia_llm_ms))
+    os.environ.setdefault("LLM_FALSO_JITTER_MS", str(args.jitter_llm_ms))
+    os.environ.setdefault("LLM_FALSO_SEMILLA", "42")
+    os.environ.setdefault("QDRANT_BACKEND", "memoria")
+    os.environ.setdefault("QDRANT_MEMORIA_LATENCIA_MS", str(args.latencia_qdrant_ms))
+    os.environ.setdefault("QDRANT_MEMORIA_JITTER_MS", str(args.jitter_qdrant_ms))
+    os.environ.setdefault("INDICE_LOCAL_PATH", os.path.join(carpeta, "indice_local"))
+    os.environ.setdefault("OFERTAS_PATH", os.path.join(carpeta, "ofertas.json"))
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+
+# -------------------- Microbenchmarks --------------------
+def medir(funcion, rondas: int = 20, min_ronda_s: float = 0.01) -> dict:
+    # Calibra las iteraciones por ronda para que cada ronda dure al menos min_ronda_s.
+    funcion()  # calentamiento
+    iteraciones = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        if time.perf_counter() - inicio >= min_ronda_s:
+            break
+        iteraciones *= 2
+
+    tiempos = []
+    for _ in range(rondas):
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) / iteraciones * 1e6)
+    media = statistics.fmean(tiempos)
+    return {
+        "min_us": round(min(tiempos), 3),
+        "media_us": round(media, 3),
+        "mediana_us": round(statistics.median(tiempos), 3),
+        "desviacion_us": round(statistics.stdev(tiempos), 3) if len(tiempos) > 1 else 0.0,
+        "ops_s": round(1e6 / media, 1),
+        "rondas": rondas,
+        "iteraciones": iteraciones,
+    }
+
+
+def micro(rondas: int) -> dict:
+    from hipotecassist_api import ahorro_amortizacion_extra, cuota_mensual, resumen_amortizacion
+    from llm import _build_docs_block
+    from services.chunker import trocear_paginas
+    from services.extraccion_pdf import chunk_text, iterar_paginas_pdf
+
+    pdfs = sorted(f for f in os.listdir(DOCS) if f.lower().endswith(".pdf"))
+    # Mismo corpus para los dos troceados: páginas por PDF (como la ingesta) y todo el texto seguido
+    paginas_por_pdf = [list(iterar_paginas_pdf(os.path.join(DOCS, f))) for f in pdfs]
+    texto = "\n".join("\n".join(paginas) + "\n" for paginas in paginas_por_pdf)
+    documentos = [
+        {
+            "texto": f"Condiciones de la hipoteca {i}: " + "TIN fijo 2,55 %, comisión de apertura 0,3 %. " * 8,
+            "banco": "ING",
+            "ruta_pdf": f"/pdfs/{pdfs[i % len(pdfs)]}",
+            "page_start": 1 + i % 2,
+            "score": 0.8 - i * 0.05,
+        }
+        for i in range(5)
+    ]
+
+    casos = {
+        "cuota_mensual": lambda: cuota_mensual(150_000, 0.029, 300),
+        "resumen_amortizacion": lambda: resumen_amortizacion(150_000, 0.029, 300),
+        "ahorro_amortizacion_extra": lambda: ahorro_amortizacion_extra(150_000, 0.029, 300, 10_000, 12),
+        "trocear_paginas": lambda: [list(trocear_paginas(paginas)) for paginas in paginas_por_pdf],
+        "chunk_text": lambda: chunk_text(texto, max_chars=500),
+        "_build_docs_block": lambda: _build_docs_block(documentos),
+    }
+    return {nombre: medir(funcion, rondas) for nombre, funcion in casos.items()}
+
+
+# -------------------- Carga HTTP --------------------
+def preparar_datos_locales() -> None:
+    # Índice local (semilla del Qdrant en memoria) y tabla de ofertas a partir de los PDFs.
+    from ingest_docs import generar_tabla_ofertas
+    from services.extraccion_pdf import procesar_pdf
+    from services.indice_local import IndiceLocal
+    from services.modelo_embeddings import obtener_modelo
+
+    ruta_indice = os.environ["INDICE_LOCAL_PATH"]
+    if not os.path.exists(os.path.join(ruta_indice, "version")):
+        chunks = []
+        for nombre in sorted(os.listdir(DOCS)):
+            if nombre.lower().endswith(".pdf"):
+                chunks += procesar_pdf(os.path.join(DOCS, nombre))[1]
+        vectores = obtener_modelo().encode([c["texto"] for c in chunks])
+        IndiceLocal.desde_vectores(vectores, [c["id"] for c in chunks], [c["payload"] for c in chunks]).guardar(ruta_indice)
+    if not os.path.exists(os.environ["OFERTAS_PATH"]):
+        generar_tabla_ofertas(DOCS, ruta=os.environ["OFERTAS_PATH"])
+
+
+def leer_trafico(ruta: str) -> list:
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+async def _enviar(cliente, peticion: dict):
+    return await cliente.request(
+        peticion.get("metodo", "GET"), peticion["ruta"], json=peticion.get("cuerpo"), params=peticion.get("params")
+    )
+
+
+async def _reproducir(cliente, trafico: list, vueltas: int, concurrencia: int) -> dict:
+    # Primero los /analisis (sin medir): /preguntar necesita el análisis de su sesión
+    for peticion in trafico:
+        if peticion["ruta"] == "/analisis":
+            (await _enviar(cliente, peticion)).raise_for_status()
+
+    cola = asyncio.Queue()
+    for _ in range(vueltas):
+        for peticion in trafico:
+            cola.put_nowait(peticion)
+    latencias, errores = defaultdict(list), defaultdict(int)
+
+    async def trabajador():
+        while not cola.empty():
+            peticion = cola.get_nowait()
+            inicio = time.perf_counter()
+            respuesta = await _enviar(cliente, peticion)
+            clave = f"{peticion.get('metodo', 'GET')} {peticion['ruta']}"
+            latencias[clave].append((time.perf_counter() - inicio) * 1000.0)
+            if respuesta.status_code >= 400:
+                errores[clave] += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    total_s = time.perf_counter() - inicio
+
+    n = sum(len(v) for v in latencias.values())
+    rutas = {}
+    for clave, valores in sorted(latencias.items()):
+        p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+        rutas[clave] = {
+            "n": len(valores),
+            "errores": errores[clave],
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
+    todas = [x for v in latencias.values() for x in v]
+    p50, p95, p99 = np.percentile(todas, [50, 95, 99])
+    return {
+        "peticiones": n,
+        "concurrencia": concurrencia,
+        "peticiones_s": round(n / total_s, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "rutas": rutas,
+    }
+
+
+async def carga(trafico: list, vueltas: int, concurrencia: int, url: str = None) -> dict:
+    import httpx
+
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as cliente:
+            return await _reproducir(cliente, trafico, vueltas, concurrencia)
+
+    preparar_datos_locales()
+    from hipotecassist_api import app
+
+    async with app.router.lifespan_context(app):
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+            return await _reproducir(cliente, trafico, vueltas, concurrencia)
+
+
+# -------------------- Línea base --------------------
+def _metricas_comparables(resultados: dict) -> dict:
+    # {nombre: (valor, True si más alto es mejor)}
+    planas = {}
+    for nombre, fila in resultados.get("micro", {}).items():
+        planas[f"micro.{nombre}.media_us"] = (fila["media_us"], False)
+    if "carga" in resultados:
+        planas["carga.peticiones_s"] = (resultados["carga"]["peticiones_s"], True)
+        for ruta, fila in resultados["carga"]["rutas"].items():
+            planas[f"carga.{ruta}.p95_ms"] = (fila["p95_ms"], False)
+    return planas
+
+
+def comparar(resultados: dict, base: dict, tolerancia: float) -> list:
+    # Métricas que empeoran más de `tolerancia` (fracción) respecto a la línea base.
+    actuales, anteriores = _metricas_comparables(resultados), _metricas_comparables(base)
+    regresiones = []
+    for nombre, (valor, mas_es_mejor) in actuales.items():
+        if nombre not in anteriores or not anteriores[nombre][0]:
+            continue
+        cambio = (valor - anteriores[nombre][0]) / anteriores[nombre][0]
+        empeora = -cambio if mas_es_mejor else cambio
+        print(f"{nombre:55s} {anteriores[nombre][0]:>12} -> {valor:>12}  ({cambio:+.1%})", file=sys.stderr)
+        if empeora > tolerancia:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modo", choices=("micro", "carga", "todo"))
+    parser.add_argument("--rondas", type=int, default=20, help="rondas por microbenchmark")
+    parser.add_argument("--trafico", default=TRAFICO, help="fichero JSONL con las peticiones a reproducir")
+    parser.add_argument("--vueltas", type=int, default=10, help="veces que se reproduce el tráfico")
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--url", default=None, help="servidor ya arrancado (si no, la app en proceso con fakes)")
+    parser.add_argument("--latencia-llm-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-llm-ms", type=float, default=20.0)
+    parser.add_argument("--latencia-qdrant-ms", type=float, default=0.0, help="latencia simulada del Qdrant en memoria")
+    parser.add_argument("--jitter-qdrant-ms", type=float, default=0.0)
+    parser.add_argument("--guardar", default=None, help="escribe los resultados en este JSON")
+    parser.add_argument("--comparar", default=None, help="línea base JSON con la que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento admitido (0.2 = 20 %%)")
+    args = parser.parse_args()
+    # La app sirve data/docs_bancarios con una ruta relativa a backend/: las rutas
+    # de la línea de comandos se resuelven antes de cambiar de directorio
+    for opcion in ("trafico", "guardar", "comparar"):
+        if getattr(args, opcion):
+            setattr(args, opcion, os.path.abspath(getattr(args, opcion)))
+    os.chdir(BACKEND)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        preparar_entorno(carpeta, args)
+        resultados = {"python": sys.version.split()[0]}
+        if args.modo in ("micro", "todo"):
+            resultados["micro"] = micro(args.rondas)
+        if args.modo in ("carga", "todo"):
+            resultados["carga"] = asyncio.run(carga(leer_trafico(args.trafico), args.vueltas, args.concurrencia, args.url))
+
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"Regresiones (> {args.tolerancia:.0%}): {', '.join(regresiones)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
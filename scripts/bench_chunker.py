@@ -0,0 +1,135 @@
+# scripts/bench_chunker.py
+"""
+Compara el troceado anterior (chunk_text, 500 caracteres sin solape) con el
+troceado por estructura (services/chunker.py) sobre los PDFs de
+data/docs_bancarios:
+
+- número de chunks y tamaño en tokens (medio, máximo y cuántos pasan de 256,
+  el límite en el que MiniLM trunca);
+- tasa de acierto en recuperación con un juego de preguntas etiquetadas:
+  acierto si alguno de los top_k chunks es del PDF correcto y contiene la
+  frase que responde. Se mide con BM25 siempre y con embeddings densos si
+  el modelo está disponible.
+
+Uso:
+    python scripts/bench_chunker.py --top-k 3
+    python scripts/bench_chunker.py --max-tokens 120 --solape 24 --sin-denso
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.extraccion_pdf import chunk_text, extract_text_from_pdf, iterar_paginas_pdf  # noqa: E402
+from services.bm25 import IndiceBM25  # noqa: E402
+from services.chunker import contar_tokens_aprox, trocear_paginas  # noqa: E402
+
+# (pregunta, PDF que la responde, frase que tiene que aparecer en el chunk)
+PREGUNTAS = [
+    ("¿Qué comisión de apertura cobra ING?", "Hipoteca_ING.pdf", "Apertura: 0,3"),
+    ("¿Cuánto cuesta amortizar anticipadamente con ING?", "Hipoteca_ING.pdf", "0,25 % primeros 10 años"),
+    ("Tipo fijo de ING para menores de 30 años", "Hipoteca_ING.pdf", "Fijo 2,55"),
+    ("¿Cuál es el plazo máximo en ING si tengo más de 50 años?", "Hipoteca_ING.pdf", "Máximo 28 años"),
+    ("¿Cuánto financia ING en segunda vivienda?", "Hipoteca_ING.pdf", "Hasta 65 %"),
+    ("¿Qué rebaja da ING por domiciliar la nómina?", "Hipoteca_ING.pdf", "reducción 0,10 % TIN"),
+    ("Comisión de apertura de BBVA", "Hipoteca_BBVA.pdf", "Apertura: 0,5 % sobre capital"),
+    ("Hipoteca mixta BBVA entre 31 y 45 años", "Hipoteca_BBVA.pdf", "Mixto: 2,30"),
+    ("¿Cuánto cuesta la amortización anticipada total en BBVA?", "Hipoteca_BBVA.pdf", "total: 0,50 %"),
+    ("¿Qué bonificación da BBVA por subrogar la hipoteca?", "Hipoteca_BBVA.pdf", "Bonificación por subrogación"),
+    ("Productos vinculados BBVA nómina seguro hogar tarjeta", "Hipoteca_BBVA.pdf", "seguro hogar"),
+    ("Plazo máximo de Santander para mayores de 55", "Hipoteca_Santander.pdf", "Máximo 25 años si edad > 55"),
+    ("Tipo fijo Santander de 46 a 60 años", "Hipoteca_Santander.pdf", "Fijo 3,00"),
+    ("¿Qué reducción da Santander solo con la nómina?", "Hipoteca_Santander.pdf", "Solo nómina"),
+    ("Comisión de apertura Santander", "Hipoteca_Santander.pdf", "Apertura: 0,5 %"),
+    ("¿Cuál es la ventaja principal de la hipoteca Santander?", "Hipoteca_Santander.pdf", "Solidez y experiencia"),
+]
+
+
+def _normalizar(texto: str) -> str:
+    return " ".join(texto.split())
+
+
+def trocear(carpeta: str, max_tokens: int, solape: int):
+    # {"anterior": [(pdf, texto)], "estructura": [(pdf, texto)]}
+    resultado = {"anterior": [], "estructura": []}
+    for nombre in sorted(os.listdir(carpeta)):
+        if not nombre.lower().endswith(".pdf"):
+            continue
+        ruta = os.path.join(carpeta, nombre)
+        resultado["anterior"] += [(nombre, t) for t in chunk_text(extract_text_from_pdf(ruta), max_chars=500)]
+        resultado["estructura"] += [
+            (nombre, c.texto)
+            for c in trocear_paginas(iterar_paginas_pdf(ruta), max_tokens=max_tokens, solape_tokens=solape)
+        ]
+    return resultado
+
+
+def tamanos(chunks) -> dict:
+    tokens = [contar_tokens_aprox(t) for _, t in chunks]
+    return {
+        "chunks": len(chunks),
+        "tokens_medio": round(float(np.mean(tokens)), 1) if tokens else 0,
+        "tokens_max": max(tokens, default=0),
+        "mas_de_256": sum(t > 256 for t in tokens),
+    }
+
+
+def tasa_acierto(chunks, rankings) -> float:
+    # rankings[i] = posiciones de los top_k chunks para PREGUNTAS[i]
+    aciertos = 0
+    for (_, pdf, frase), ranking in zip(PREGUNTAS, rankings):
+        aciertos += any(chunks[j][0] == pdf and _normalizar(frase) in _normalizar(chunks[j][1]) for j in ranking)
+    return round(aciertos / len(PREGUNTAS), 3)
+
+
+def rankings_bm25(chunks, top_k: int):
+    bm25 = IndiceBM25([t for _, t in chunks])
+    return [[i for i, _ in bm25.buscar(p, top_k=top_k)] for p, _, _ in PREGUNTAS]
+
+
+def rankings_densos(chunks, top_k: int, modelo):
+    docs = np.asarray(modelo.encode([t for _, t in chunks], normalize_embeddings=True))
+    consultas = np.asarray(modelo.encode([p for p, _, _ in PREGUNTAS], normalize_embeddings=True))
+    return [list(np.argsort(-(docs @ q))[:top_k]) for q in consultas]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--carpeta", default="data/docs_bancarios")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--solape", type=int, default=None)
+    parser.add_argument("--sin-denso", action="store_true", help="solo BM25 (sin cargar el modelo)")
+    args = parser.parse_args()
+
+    from services.chunker import CHUNK_MAX_TOKENS, CHUNK_SOLAPE_TOKENS
+
+    troceados = trocear(args.carpeta, args.max_tokens or CHUNK_MAX_TOKENS, args.solape or CHUNK_SOLAPE_TOKENS)
+
+    modelo = None
+    if not args.sin_denso:
+        try:
+            from services.modelo_embeddings import obtener_modelo
+
+            modelo = obtener_modelo()
+        except Exception as e:
+            print(f"Sin modelo de embeddings ({e!r}); solo BM25", file=sys.stderr)
+
+    resultados = {}
+    for nombre, chunks in troceados.items():
+        fila = tamanos(chunks)
+        fila[f"acierto_bm25@{args.top_k}"] = tasa_acierto(chunks, rankings_bm25(chunks, args.top_k))
+        if modelo is not None:
+            fila[f"acierto_denso@{args.top_k}"] = tasa_acierto(chunks, rankings_densos(chunks, args.top_k, modelo))
+        resultados[nombre] = fila
+
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
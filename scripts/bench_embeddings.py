@@ -0,0 +1,105 @@
+# scripts/bench_embeddings.py
+"""
+Compara los backends de embeddings (torch vs onnx int8): consultas por
+segundo (una a una y en lotes) y memoria residente tras cargar el modelo.
+
+Cada backend se mide en su propio proceso para que el RSS sea comparable;
+el de onnx no importa torch (`torch_cargado` en el resultado lo confirma).
+
+Uso:
+    python scripts/bench_embeddings.py --backends torch onnx --consultas 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+CONSULTAS = [
+    "¿Qué TIN ofrece BBVA en la hipoteca fija?",
+    "Quiero cambiar mi hipoteca variable a tipo fijo",
+    "Comisión por amortización anticipada parcial",
+    "¿Cuánto pagaría de cuota con un Euríbor del 3%?",
+    "Hipoteca joven con financiación del 95%",
+    "¿Qué vinculaciones pide Santander?",
+    "Diferencial sobre Euríbor en ING",
+    "Plazo máximo de la hipoteca mixta",
+]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for linea in f:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1]) / 1024.0
+    return 0.0
+
+
+def _medir(backend_nombre: str, consultas: int, lote: int) -> dict:
+    from services.modelo_embeddings import crear_backend
+
+    rss_inicio = _rss_mb()
+    inicio = time.perf_counter()
+    backend = crear_backend(backend_nombre)
+    carga_s = time.perf_counter() - inicio
+    backend.encode(CONSULTAS[:2])  # calentamiento
+
+    textos = [CONSULTAS[i % len(CONSULTAS)] + f" {i}" for i in range(consultas)]
+    inicio = time.perf_counter()
+    for t in textos:
+        backend.encode([t])
+    qps_individual = consultas / (time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    for i in range(0, consultas, lote):
+        backend.encode(textos[i:i + lote])
+    qps_lote = consultas / (time.perf_counter() - inicio)
+
+    return {
+        "backend": backend_nombre,
+        "carga_s": round(carga_s, 2),
+        "qps_individual": round(qps_individual, 1),
+        f"qps_lote_{lote}": round(qps_lote, 1),
+        "rss_modelo_mb": round(_rss_mb() - rss_inicio, 1),
+        "rss_total_mb": round(_rss_mb(), 1),
+        # El backend onnx no debe arrastrar PyTorch: si aparece aquí, el RSS no es comparable
+        "torch_cargado": "torch" in sys.modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--lote", type=int, default=32)
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        print(json.dumps(_medir(args.backends[0], args.consultas, args.lote)))
+        return
+
+    resultados = []
+    for backend in args.backends:
+        salida = subprocess.run(
+            [sys.executable, __file__, "--hijo", "--backends", backend,
+             "--consultas", str(args.consultas), "--lote", str(args.lote)],
+            capture_output=True, text=True,
+        )
+        if salida.returncode != 0:
+            print(f"{backend}: error\n{salida.stderr.strip()[-500:]}")
+            continue
+        resultados.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    for r in resultados:
+        print(json.dumps(r, ensure_ascii=False))
+    if len(resultados) == 2:
+        a, b = resultados
+        print(f"RSS {b['backend']} - {a['backend']}: {b['rss_total_mb'] - a['rss_total_mb']:+.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
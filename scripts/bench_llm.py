@@ -0,0 +1,70 @@
+# scripts/bench_llm.py
+"""
+Mide latencia y throughput del cliente LLM con el backend falso (sin red).
+
+Uso:
+    python scripts/bench_llm.py --peticiones 500 --concurrencia 32 --hedge-ms 400
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from llm import BackendFalso, ClienteLLM  # noqa: E402
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def _medir(cliente: ClienteLLM, peticiones: int, concurrencia: int):
+    limite = asyncio.Semaphore(concurrencia)
+    latencias = []
+
+    async def una(i):
+        async with limite:
+            inicio = time.perf_counter()
+            await cliente.generar_async(f"pregunta {i}")
+            latencias.append((time.perf_counter() - inicio) * 1000.0)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(i) for i in range(peticiones)))
+    return latencias, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--latencia-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=300)
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--max-concurrencia-llm", type=int, default=32)
+    parser.add_argument("--hedge-ms", type=float, default=0)
+    parser.add_argument("--reintentos", type=int, default=2)
+    args = parser.parse_args()
+
+    backend = BackendFalso(args.latencia_ms, args.jitter_ms, args.tasa_error, semilla=42)
+    cliente = ClienteLLM(
+        backend,
+        max_concurrencia=args.max_concurrencia_llm,
+        reintentos=args.reintentos,
+        backoff_s=0.05,
+        hedge_ms=args.hedge_ms,
+    )
+    latencias, total_s = asyncio.run(_medir(cliente, args.peticiones, args.concurrencia))
+
+    print(f"peticiones: {len(latencias)}  tiempo: {total_s:.2f}s  throughput: {len(latencias) / total_s:.1f} req/s")
+    print(
+        f"latencia ms  p50={_percentil(latencias, 0.50):.0f}  "
+        f"p95={_percentil(latencias, 0.95):.0f}  p99={_percentil(latencias, 0.99):.0f}"
+    )
+    print(f"cliente: {cliente.estadisticas()}  llamadas al backend: {backend.llamadas}")
+
+
+if __name__ == "__main__":
+    main()
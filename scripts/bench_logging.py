@@ -0,0 +1,159 @@
+# scripts/bench_logging.py
+"""
+Efecto del logging en la latencia de las peticiones: handlers síncronos
+(como antes: RotatingFileHandler + consola en el hilo de la petición) frente
+a la cola con hilo de escritura de services/logs.py.
+
+Una app FastAPI mínima registra tres líneas por petición (como /preguntar:
+recibida, etapa y línea del middleware) y se le lanzan peticiones
+concurrentes en proceso (httpx + ASGITransport). Para imitar un disco lento o
+con fsync, --fsync hace os.fsync tras cada línea y --retardo-ms añade una
+espera fija por escritura.
+
+Uso:
+    python scripts/bench_logging.py --peticiones 2000 --concurrencia 32
+    python scripts/bench_logging.py --fsync --retardo-ms 2 --muestreo 0.1
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from services.logs import FormateadorJSON, configurar_logging, id_peticion  # noqa: E402
+
+logger = logging.getLogger("bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # una línea por petición que no es de la app
+
+
+class DiscoLento(RotatingFileHandler):
+    def __init__(self, ruta: str, fsync: bool, retardo_s: float):
+        super().__init__(ruta, maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        self.fsync, self.retardo_s = fsync, retardo_s
+
+    def emit(self, record):
+        super().emit(record)
+        if self.fsync and self.stream:
+            os.fsync(self.stream.fileno())
+        if self.retardo_s:
+            time.sleep(self.retardo_s)
+
+
+def crear_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def registrar(request: Request, call_next):
+        token = id_peticion.set(request.headers.get("x-request-id", "-"))
+        try:
+            inicio = time.perf_counter()
+            respuesta = await call_next(request)
+            logger.info(
+                f"{request.method} {request.url.path} → {respuesta.status_code}",
+                extra={"duracion_ms": round((time.perf_counter() - inicio) * 1000.0, 2), "muestreable": True},
+            )
+            return respuesta
+        finally:
+            id_peticion.reset(token)
+
+    @app.post("/preguntar")
+    async def preguntar(datos: dict):
+        logger.info(f"/preguntar recibida para session_id={datos['session_id']}", extra={"muestreable": True})
+        await asyncio.sleep(0.001)  # trabajo asíncrono simulado (búsqueda + LLM)
+        logger.info("Recuperación híbrida (5 docs)", extra={"muestreable": True})
+        return {"ok": True}
+
+    return app
+
+
+def configurar(modo: str, carpeta: str, fsync: bool, retardo_s: float, muestreo: float):
+    ruta = os.path.join(carpeta, f"{modo}.log")
+    consola = logging.StreamHandler(open(os.devnull, "w"))
+    if modo == "sincrono":
+        fichero = DiscoLento(ruta, fsync, retardo_s)
+        fichero.setFormatter(FormateadorJSON())
+        raiz = logging.getLogger()
+        for handler in raiz.handlers[:]:
+            raiz.removeHandler(handler)
+        raiz.addHandler(fichero)
+        raiz.addHandler(consola)
+        raiz.setLevel(logging.INFO)
+        return None
+    escritor = configurar_logging(ruta, nivel="INFO", muestreo=muestreo, consola=False)
+    # Mismo "disco" que en modo síncrono: se cambia el fichero del hilo de escritura
+    escritor.handlers[0].close()
+    fichero = DiscoLento(ruta, fsync, retardo_s)
+    fichero.setFormatter(FormateadorJSON())
+    escritor.handlers = (fichero, consola)
+    return escritor
+
+
+async def lanzar(app: FastAPI, peticiones: int, concurrencia: int) -> dict:
+    latencias = []
+    cola = asyncio.Queue()
+    for i in range(peticiones):
+        cola.put_nowait(i)
+
+    async def trabajador(cliente):
+        while not cola.empty():
+            i = cola.get_nowait()
+            inicio = time.perf_counter()
+            r = await cliente.post(
+                "/preguntar", json={"session_id": f"s{i % 50}"}, headers={"x-request-id": f"pet-{i}"}
+            )
+            r.raise_for_status()
+            latencias.append((time.perf_counter() - inicio) * 1000.0)
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador(cliente) for _ in range(concurrencia)))
+        total = time.perf_counter() - inicio
+
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    return {
+        "peticiones_s": round(peticiones / total, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--fsync", action="store_true", help="os.fsync tras cada línea")
+    parser.add_argument("--retardo-ms", type=float, default=0.0, help="espera extra por escritura (disco lento)")
+    parser.add_argument("--muestreo", type=float, default=1.0, help="LOG_MUESTREO para el modo cola")
+    args = parser.parse_args()
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        for modo in ("sincrono", "cola"):
+            escritor = configurar(modo, carpeta, args.fsync, args.retardo_ms / 1000.0, args.muestreo)
+            fila = asyncio.run(lanzar(crear_app(), args.peticiones, args.concurrencia))
+            inicio = time.perf_counter()
+            if escritor is not None:
+                escritor.stop()
+            # Lo que el hilo de escritura tenía pendiente al terminar las peticiones
+            fila["vaciado_cola_s"] = round(time.perf_counter() - inicio, 3)
+            with open(os.path.join(carpeta, f"{modo}.log"), encoding="utf-8") as f:
+                fila["lineas_escritas"] = sum(1 for _ in f)
+            resultados[modo] = fila
+
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,163 +1,309 @@
 # scripts/ingest_docs.py
+"""
+Ingesta de los PDFs bancarios en Qdrant.
+
+Por defecto es incremental: un manifiesto (INGESTA_MANIFEST) guarda el hash
+de cada PDF y de cada chunk. Los PDFs sin cambios se copian tal cual, de los
+modificados solo se re-embeben los chunks nuevos y los borrados desaparecen.
+Todo se escribe en una colección nueva ("sombra") que sustituye a la actual
+cambiando el alias `hipotecas` de forma atómica: la búsqueda nunca se queda
+vacía mientras se ingiere. Si no ha cambiado nada, no se toca Qdrant.
+
+Los PDFs se procesan con un pipeline en paralelo (services/pipeline_ingesta.py):
+extracción en un pool de procesos, embeddings por lotes y upserts en paralelo
+con reintentos, con memoria acotada y métricas de páginas/s, chunks/s y
+latencia de upsert.
+
+Uso:
+    python scripts/ingest_docs.py             # incremental
+    python scripts/ingest_docs.py --completo  # re-embebe todo (también sin downtime)
+    python scripts/ingest_docs.py --procesos 8 --lote-upsert 256 --hilos-upsert 8
+"""
 import os
-import hashlib
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
-from sentence_transformers import SentenceTransformer
-from pypdf import PdfReader
+import sys
+import time
+import logging
+import argparse
+import itertools
+from qdrant_client.models import (
+    VectorParams,
+    Distance,
+    PointStruct,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PayloadSchemaType,
+)
 from dotenv import load_dotenv
 
+# Reutiliza el cargador del backend (mismo modelo y misma configuración que la API)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from services.modelo_embeddings import obtener_modelo, DIM_EMBEDDINGS  # noqa: E402
+from services.backends_qdrant import crear_clientes_qdrant  # noqa: E402
+from services.indice_local import sincronizar_desde_qdrant, INDICE_LOCAL_PATH  # noqa: E402
+from services.manifiesto_ingesta import Manifiesto, hash_archivo  # noqa: E402
+from services.pipeline_ingesta import PipelineIngesta  # noqa: E402
+from services.extraccion_pdf import iterar_paginas_pdf, procesar_pdf  # noqa: E402
+from services.metadatos_documentos import detectar_banco, detectar_producto  # noqa: E402
+from ofertas import extraer_ofertas, guardar_ofertas, OFERTAS_PATH  # noqa: E402
+
 # Carga variables de entorno desde archivo .env
 load_dotenv()
 
-# Configuración de conexión a Qdrant desde variables de entorno
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Cliente de Qdrant según QDRANT_BACKEND: cloud (QDRANT_URL/QDRANT_API_KEY), local
+# (QDRANT_PATH) o memoria (sin red; al final solo queda el snapshot del índice local).
+# Se crea al usarlo, no al importar: los procesos del pipeline (spawn) reimportan este
+# script y un segundo cliente embebido falla por el bloqueo de QDRANT_PATH.
+_client = None
 
-# Inicializa cliente de Qdrant
-client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY
-)
+
+def cliente_qdrant():
+    global _client
+    if _client is None:
+        _client = crear_clientes_qdrant()[0]
+    return _client
 
 # Configuración de la colección y modelo de embeddings
-COLLECTION = "hipotecas" # Nombre de la colección en Qdrant
-VECTOR_SIZE = 384  # all-MiniLM-L6-v2
-model = SentenceTransformer("all-MiniLM-L6-v2") # Modelo para generar embeddings
+COLLECTION = "hipotecas" # Alias que consulta la API; apunta a la colección física activa
+VECTOR_SIZE = DIM_EMBEDDINGS  # all-MiniLM-L6-v2
+MANIFEST_PATH = os.getenv("INGESTA_MANIFEST", "data/ingesta_manifest.json")
+LOTE_COPIA = 256
+# Súbela al cambiar el troceado o el payload: fuerza a reprocesar todos los PDFs
+# (los chunks con el mismo texto reutilizan su vector)
+VERSION_PROCESADO = 2
+# Campos del payload con índice en Qdrant (filtros exactos)
+CAMPOS_INDEXADOS = ("banco", "producto")
+
+# Paralelismo y tamaños de lote del pipeline (también por línea de comandos)
+OPCIONES_POR_DEFECTO = {
+    "procesos": int(os.getenv("INGESTA_PROCESOS", str(os.cpu_count() or 2))),
+    "lote_embedding": int(os.getenv("INGESTA_LOTE_EMBEDDING", "64")),
+    "lote_upsert": int(os.getenv("INGESTA_LOTE_UPSERT", "128")),
+    "hilos_upsert": int(os.getenv("INGESTA_HILOS_UPSERT", "4")),
+    "max_cola": int(os.getenv("INGESTA_MAX_COLA", "1024")),
+}
+
+
+# -------------------- Colecciones y alias --------------------
+def coleccion_activa():
+    # Colección física a la que apunta el alias (o la colección antigua sin alias).
+    for alias in cliente_qdrant().get_aliases().aliases:
+        if alias.alias_name == COLLECTION:
+            return alias.collection_name
+    if cliente_qdrant().collection_exists(COLLECTION):
+        return COLLECTION
+    return None
+
+
+def crear_coleccion_sombra() -> str:
+    nombre = f"{COLLECTION}_{time.time_ns() // 1_000_000}"
+    cliente_qdrant().create_collection(
+        collection_name=nombre,
+        vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE)
+    )
+    for campo in CAMPOS_INDEXADOS:
+        cliente_qdrant().create_payload_index(collection_name=nombre, field_name=campo, field_schema=PayloadSchemaType.KEYWORD)
+    print(f"Colección sombra creada: {nombre}")
+    return nombre
+
+
+def activar_coleccion(nueva: str, anterior):
+    # Apunta el alias a la colección nueva en una sola operación y borra la anterior.
+    operaciones = []
+    if anterior == COLLECTION:
+        # Migración desde la colección sin alias: hay que liberar el nombre primero
+        cliente_qdrant().delete_collection(collection_name=COLLECTION)
+    elif anterior:
+        operaciones.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=COLLECTION)))
+    operaciones.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=nueva, alias_name=COLLECTION)))
+    cliente_qdrant().update_collection_aliases(change_aliases_operations=operaciones)
+    print(f"Alias '{COLLECTION}' -> {nueva}")
+
+    if anterior and anterior != COLLECTION:
+        cliente_qdrant().delete_collection(collection_name=anterior)
+
+
+def recuperar_puntos(coleccion, ids):
+    # Puntos existentes (con vector y payload) de la colección anterior, por id.
+    if not coleccion or not ids:
+        return {}
+    puntos = {}
+    ids = list(ids)
+    for i in range(0, len(ids), LOTE_COPIA):
+        for p in cliente_qdrant().retrieve(collection_name=coleccion, ids=ids[i:i + LOTE_COPIA], with_vectors=True, with_payload=True):
+            puntos[int(p.id)] = p
+    return puntos
+
+
+def copiar_puntos(origen: str, destino: str, ids) -> int:
+    # Copia puntos sin recalcular embeddings (PDFs sin cambios).
+    puntos = recuperar_puntos(origen, ids)
+    lista = [PointStruct(id=i, vector=p.vector, payload=p.payload) for i, p in puntos.items()]
+    for i in range(0, len(lista), LOTE_COPIA):
+        cliente_qdrant().upsert(collection_name=destino, points=lista[i:i + LOTE_COPIA])
+    return len(lista)
+
+
+# -------------------- PDFs --------------------
+def generar_tabla_ofertas(folder_path: str = "data/docs_bancarios", ruta: str = OFERTAS_PATH) -> int:
+    # Extrae las condiciones numéricas de cada PDF (TIN, diferencial, plazos, comisiones) a OFERTAS_PATH.
+    ofertas = []
+    for nombre in sorted(os.listdir(folder_path)):
+        if not nombre.lower().endswith(".pdf"):
+            continue
+        paginas = iterar_paginas_pdf(os.path.join(folder_path, nombre))
+        primera = next(paginas, "")
+        banco, producto = detectar_banco(nombre, primera), detectar_producto(nombre, primera)
+        encontradas = extraer_ofertas(itertools.chain([primera], paginas), banco, producto, origen=nombre)
+        print(f"{nombre}: {len(encontradas)} ofertas ({banco})")
+        ofertas.extend(encontradas)
+    guardar_ofertas(ofertas, ruta)
+    return len(ofertas)
+
+
+# -------------------- Ingesta --------------------
+def crear_pipeline(destino: str, anterior, opciones) -> PipelineIngesta:
+    def reutilizar(ids):
+        # Vectores que ya estaban en la colección activa (chunks sin cambios)
+        return {i: p.vector for i, p in recuperar_puntos(anterior, ids).items()}
+
+    def subir(puntos):
+        cliente_qdrant().upsert(
+            collection_name=destino,
+            points=[PointStruct(id=i, vector=v, payload=payload) for i, v, payload in puntos],
+        )
 
-def ensure_collection():
-    # Asegura que la colección de Qdrant existe y está limpia.
+    return PipelineIngesta(
+        extraer=procesar_pdf,
+        embeber=lambda textos: obtener_modelo().encode(textos),
+        subir=subir,
+        reutilizar=reutilizar if anterior else None,
+        procesos=opciones.procesos,
+        lote_embedding=opciones.lote_embedding,
+        lote_upsert=opciones.lote_upsert,
+        hilos_upsert=opciones.hilos_upsert,
+        max_cola=opciones.max_cola,
+    )
+
+
+def ingestar(folder_path: str = "data/docs_bancarios", completo: bool = False, opciones=None):
+    opciones = opciones or argparse.Namespace(**OPCIONES_POR_DEFECTO)
+    manifiesto = Manifiesto() if completo else Manifiesto.cargar(MANIFEST_PATH)
+    anterior = coleccion_activa()
+
+    # Itera por todos los archivos del directorio (solo PDFs)
+    rutas = {
+        file_name: os.path.join(folder_path, file_name)
+        for file_name in sorted(os.listdir(folder_path))
+        if file_name.lower().endswith(".pdf")
+    }
+    hashes = {nombre: hash_archivo(ruta) for nombre, ruta in rutas.items()}
+    plan = manifiesto.planificar(hashes, VERSION_PROCESADO)
+    print(
+        f"Sin cambios: {len(plan.sin_cambios)}, modificados: {len(plan.modificados)}, "
+        f"nuevos: {len(plan.nuevos)}, eliminados: {len(plan.eliminados)}"
+    )
+
+    # El manifiesto solo sirve si describe la colección activa (Qdrant nuevo o vaciado,
+    # o QDRANT_BACKEND=memoria: no hay de dónde copiar los puntos)
+    if manifiesto.archivos and (anterior is None or manifiesto.coleccion not in (None, anterior)):
+        print("El manifiesto no corresponde a la colección activa: ingesta completa")
+        manifiesto, plan = Manifiesto(), Manifiesto().planificar(hashes, VERSION_PROCESADO)
+    if anterior is not None and not plan.hay_cambios:
+        esperados = sum(len(manifiesto.ids(nombre)) for nombre in plan.sin_cambios)
+        if cliente_qdrant().count(collection_name=anterior, exact=True).count == esperados:
+            print("Nada que ingerir: la colección está al día.")
+            return False
+        print(f"A {anterior} le faltan puntos del manifiesto: se revisa PDF a PDF")
+
+    destino = crear_coleccion_sombra()
+    nuevo = Manifiesto(coleccion=destino, version=VERSION_PROCESADO)
     try:
-        # Verifica si la colección ya existe
-        exists = client.collection_exists(COLLECTION)
-        print(f"Colección '{COLLECTION}' existe: {exists}")
-        if exists:
-            # Borrar la colección completa para limpiar PDFs antiguos
-            print("Eliminando colección existente para limpiar PDFs antiguos...")
-            client.delete_collection(collection_name=COLLECTION)
-            # Recrear la colección vacía
-            client.recreate_collection(
-                collection_name=COLLECTION,
-                vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE)
-            )
-            print("Colección recreada correctamente.")
-        else:
-            # Crear colección si no existía
-            client.recreate_collection(
-                collection_name=COLLECTION,
-                vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE)
-            )
-            print("Colección creada correctamente.")
-    except Exception as e:
-        print(f"Error comprobando o creando la colección: {e}")
-
-def extract_text_from_pdf(path: str) -> str:
-    # Extrae todo el texto de un archivo PDF.
-    reader = PdfReader(path)
-    text = ""
-    # Itera por cada página del PDF
-    for page in reader.pages:
-        # Extrae texto de la página
-        text += (page.extract_text() or "") + "\n"
-    return text
-
-def chunk_text(text: str, max_chars: int = 500):
-    # Divide el texto en chunks.
-    chunks = []
-    current = ""
-
-    # Divide por párrafos
-    for paragraph in text.split("\n"):
-        paragraph = paragraph.strip()
-        if not paragraph:
-            continue # Ignora párrafos vacíos
-
-        # Si añadir este párrafo no excede el límite, lo añade al chunk actual
-        if len(current) + len(paragraph) + 1 <= max_chars:
-            current += paragraph + "\n"
-        else:
-            # Si excede, guarda el chunk actual y empieza uno nuevo
-            if current.strip():
-                chunks.append(current.strip())
-            current = paragraph + "\n"
-
-    # Añade el último chunk si tiene contenido
-    if current.strip():
-        chunks.append(current.strip())
-    return chunks
-
-def _stable_int_id(origen: str, chunk_index: int) -> int:
-    # Genera un ID entero estable y único para cada chunk.
-    # Utiliza SHA1 hash del nombre del archivo + índice del chunk.
-
-    # Crea clave única combinando origen e índice
-    key = f"{origen}::{chunk_index}".encode("utf-8")
-
-    # Genera hash SHA1
-    digest = hashlib.sha1(key).digest()  # 20 bytes
-    return int.from_bytes(digest[:8], byteorder="big", signed=False)
-
-def ingest_pdf(path: str, banco: str, producto: str):
-    # Procesa un PDF completo y lo ingesta en Qdrant.
-
-    print(f"Ingiere PDF: {path}")
-
-    # Extrae todo el texto del PDF
-    text = extract_text_from_pdf(path)
-
-    # Divide en chunks
-    chunks = chunk_text(text, max_chars=500)
-    print(f"Total chunks: {len(chunks)}")
-
-    # Genera embeddings para todos los chunks
-    embeddings = model.encode(chunks)
-    base_name = os.path.basename(path)
-
-    # Construye lista de puntos para Qdrant
-    points = []
-    for idx, (chunk, vector) in enumerate(zip(chunks, embeddings)):
-        point_id = _stable_int_id(base_name, idx)
-        points.append(
-            PointStruct(
-                id=point_id,
-
-                # Convierte numpy array a lista Python si es necesario
-                vector=vector.tolist() if hasattr(vector, "tolist") else vector,
-                payload={
-                    "texto": chunk,
-                    "banco": banco,
-                    "producto": producto,
-                    "origen": path,
-                    "chunk_index": idx,
-                },
-            )
-        )
+        incompletos = []
+        for nombre in plan.sin_cambios:
+            esperados = len(manifiesto.ids(nombre))
+            n = copiar_puntos(anterior, destino, manifiesto.ids(nombre))
+            if n != esperados:
+                # Faltan puntos en la colección activa: se vuelve a procesar el PDF
+                print(f"{nombre}: sin cambios, pero solo {n} de {esperados} puntos en {anterior}; se reprocesa")
+                incompletos.append(nombre)
+                continue
+            nuevo.archivos[nombre] = manifiesto.archivos[nombre]
+            print(f"{nombre}: sin cambios, {n} puntos copiados")
+
+        a_procesar = plan.modificados + plan.nuevos + incompletos
+        # En modo completo no se reutilizan vectores: se re-embebe todo
+        pipeline = crear_pipeline(destino, None if completo else anterior, opciones)
+        resultados = pipeline.ejecutar([rutas[nombre] for nombre in a_procesar])
+        procesados = 0
+        for nombre in a_procesar:
+            resultado = resultados.get(rutas[nombre], {"error": "sin procesar"})
+            if "chunks" in resultado:
+                nuevo.registrar(nombre, hashes[nombre], resultado["chunks"])
+                procesados += 1
+            else:
+                print(f"Error al ingerir {nombre}: {resultado['error']}")
+                # Se conserva la versión anterior del PDF, si la había
+                if nombre in manifiesto.archivos:
+                    copiar_puntos(anterior, destino, manifiesto.ids(nombre))
+                    nuevo.archivos[nombre] = manifiesto.archivos[nombre]
+        print(f"Métricas: {pipeline.metricas.resumen()}")
+    except BaseException:
+        # La colección activa no se ha tocado: se descarta la sombra
+        cliente_qdrant().delete_collection(collection_name=destino)
+        raise
+
+    if a_procesar and not procesados:
+        # Ningún PDF se pudo procesar: no se sustituye la colección activa por una vacía o a medias
+        print("Ningún PDF se ha podido procesar: se mantiene la colección actual")
+        cliente_qdrant().delete_collection(collection_name=destino)
+        return False
+
+    activar_coleccion(destino, anterior)
+    nuevo.guardar(MANIFEST_PATH)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de PDFs bancarios en Qdrant")
+    parser.add_argument("--completo", action="store_true", help="re-embebe todos los PDFs ignorando el manifiesto")
+    parser.add_argument("--carpeta", default="data/docs_bancarios")
+    parser.add_argument("--procesos", type=int, default=OPCIONES_POR_DEFECTO["procesos"], help="procesos que extraen PDFs")
+    parser.add_argument("--lote-embedding", type=int, default=OPCIONES_POR_DEFECTO["lote_embedding"])
+    parser.add_argument("--lote-upsert", type=int, default=OPCIONES_POR_DEFECTO["lote_upsert"])
+    parser.add_argument("--hilos-upsert", type=int, default=OPCIONES_POR_DEFECTO["hilos_upsert"])
+    parser.add_argument("--max-cola", type=int, default=OPCIONES_POR_DEFECTO["max_cola"], help="chunks en espera de embedding")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-    # Sube todos los puntos a Qdrant
     try:
-        client.upsert(collection_name=COLLECTION, points=points)
-        print("PDF ingerido correctamente")
-    except Exception as e:
-        print(f"Error al subir puntos: {e}")
+        print("Iniciando ingestión de PDFs...")
+        cambios = ingestar(args.carpeta, completo=args.completo, opciones=args)
 
-if __name__ == "__main__":
-    print("Iniciando ingestión de PDFs...")
-    ensure_collection()  # <-- borra los datos antiguos antes de ingestar
-
-    # Directorio donde están los PDFs bancarios
-    folder_path = "data/docs_bancarios"
-
-    # Itera por todos los archivos del directorio
-    for file_name in os.listdir(folder_path):
-        # Solo procesa archivos PDF
-        if file_name.lower().endswith(".pdf"):
-            path = os.path.join(folder_path, file_name)
-            banco = "Desconocido"
-            producto = "Hipoteca"
+        # Snapshot para el índice local (motor en memoria / respaldo de Qdrant)
+        if cambios or not os.path.exists(os.path.join(INDICE_LOCAL_PATH, "version")):
             try:
-                ingest_pdf(path, banco=banco, producto=producto)
+                indice = sincronizar_desde_qdrant(cliente_qdrant(), COLLECTION, INDICE_LOCAL_PATH)
+                print(f"Índice local guardado en {INDICE_LOCAL_PATH}: {len(indice)} puntos")
             except Exception as e:
-                print(f"Error al ingerir {file_name}: {e}")
+                print(f"Error generando el índice local: {e}")
+
+        # Tabla de ofertas para /ofertas/comparar
+        if cambios or not os.path.exists(OFERTAS_PATH):
+            try:
+                n = generar_tabla_ofertas(args.carpeta)
+                print(f"Tabla de ofertas guardada en {OFERTAS_PATH}: {n} ofertas")
+            except Exception as e:
+                print(f"Error generando la tabla de ofertas: {e}")
+    finally:
+        # Libera QDRANT_PATH (backend local) antes de que el intérprete empiece a cerrarse
+        if _client is not None:
+            _client.close()
+
+
+if __name__ == "__main__":
+    main()
 
 
 # # scripts/ingest_docs.py
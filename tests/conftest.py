@@ -0,0 +1,80 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# El backend se ejecuta desde su propia carpeta (imports tipo `import memoria`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+# Las pruebas no salen a la red: Qdrant en memoria, embeddings y LLM falsos. Se fija antes
+# de importar nada del backend (los módulos leen la configuración al importarse).
+_DATOS = tempfile.mkdtemp(prefix="hipotecassist-pruebas-")
+atexit.register(shutil.rmtree, _DATOS, ignore_errors=True)
+os.environ.update({
+    "QDRANT_BACKEND": "memoria",
+    "EMBEDDING_BACKEND": "falso",
+    "LLM_BACKEND": "falso",
+    "LLM_FALSO_LATENCIA_MS": "0",
+    "LLM_FALSO_JITTER_MS": "0",
+    "INDICE_LOCAL_PATH": os.path.join(_DATOS, "indice"),
+    "OFERTAS_PATH": os.path.join(_DATOS, "ofertas.json"),
+    "LOG_DIR": os.path.join(_DATOS, "logs"),
+})
+
+TEXTOS_INDICE = [
+    ("ING", "Comisión de apertura ING: 0,3 % sobre el capital."),
+    ("ING", "Amortización anticipada ING: 0,25 % los primeros 10 años."),
+    ("BBVA", "Tipo fijo BBVA para jóvenes: 2,45 % TIN con nómina domiciliada."),
+    ("BBVA", "Comisión de apertura BBVA: 0,5 % sobre capital."),
+    ("SANTANDER", "Hipoteca variable Santander: Euríbor + 0,69 % con vinculación."),
+]
+
+
+def _sembrar_indice_local():
+    # Snapshot pequeño: índice local y semilla del Qdrant en memoria. Tiene que existir antes
+    # de que alguna prueba importe services.qdrant_connection (que siembra al importarse).
+    from services.indice_local import IndiceLocal
+    from services.modelo_embeddings import BackendFalso
+
+    textos = [t for _, t in TEXTOS_INDICE]
+    payloads = [
+        {"texto": t, "banco": b, "ruta_pdf": f"Hipoteca_{b.title()}.pdf", "page_start": 1}
+        for b, t in TEXTOS_INDICE
+    ]
+    IndiceLocal.desde_vectores(BackendFalso().encode(textos), list(range(1, len(textos) + 1)), payloads).guardar(
+        os.environ["INDICE_LOCAL_PATH"]
+    )
+
+
+_sembrar_indice_local()
+
+
+@pytest.fixture(scope="session")
+def api():
+    # La app completa, importada una sola vez
+    import hipotecassist_api
+
+    return hipotecassist_api
+
+
+@pytest.fixture(scope="session")
+def cliente(api):
+    from fastapi.testclient import TestClient
+
+    with TestClient(api.app) as c:
+        yield c
+
+
+@pytest.fixture
+def sesion_con_analisis(cliente):
+    # session_id con un análisis guardado, requisito de /preguntar
+    session_id = f"prueba-{os.urandom(4).hex()}"
+    r = cliente.post("/analisis", json={
+        "capital_pendiente": 150000, "anos_restantes": 20, "tipo": "fijo", "tin": 2.5,
+        "ingresos_mensuales": 3000, "session_id": session_id,
+    })
+    assert r.status_code == 200
+    return session_id
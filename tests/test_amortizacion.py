@@ -0,0 +1,105 @@
+import pytest
+
+from amortizacion import CuadroAmortizacion, cuota, saldo, interes_acumulado, mes_liquidacion
+
+
+# -------------------- Oráculo: cálculo mes a mes original --------------------
+def _cuota_loop(P, rate_annual, n_months):
+    r = rate_annual / 12.0
+    if r <= 0:
+        return P / n_months
+    return P * (r * pow(1 + r, n_months)) / (pow(1 + r, n_months) - 1)
+
+
+def resumen_amortizacion_loop(P, rate_annual, n_months, hitos=(12, 60, 120)):
+    r = rate_annual / 12.0
+    c = _cuota_loop(P, rate_annual, n_months)
+    bal = P
+    interes_acum = 0.0
+    out = []
+    setpoints = set(hitos) | {n_months}
+    for m in range(1, n_months + 1):
+        i = bal * r
+        p = c - i
+        bal = max(0.0, bal - p)
+        interes_acum += i
+        if m in setpoints:
+            out.append({
+                "mes": m,
+                "cuota": round(c, 2),
+                "interes_mes": round(i, 2),
+                "amortizado_mes": round(p, 2),
+                "saldo": round(bal, 2),
+                "interes_acum": round(interes_acum, 2),
+            })
+        if bal <= 0:
+            break
+    return out
+
+
+def ahorro_amortizacion_extra_loop(P, rate_annual, n_months, extra, when_month=1):
+    r = rate_annual / 12.0
+    c = _cuota_loop(P, rate_annual, n_months)
+    b = P
+    total_i_no = 0.0
+    for _ in range(1, n_months + 1):
+        i = b * r
+        total_i_no += i
+        b = max(0.0, b - (c - i))
+        if b <= 0:
+            break
+    b = P
+    total_i_si = 0.0
+    for m in range(1, n_months + 1):
+        i = b * r
+        if m == when_month:
+            b = max(0.0, b - extra)
+        pay = c if b + i > c else (b + i)
+        total_i_si += min(i, pay)
+        b = max(0.0, b - (pay - i))
+        if b <= 0:
+            break
+    return round(max(0.0, total_i_no - total_i_si), 2)
+
+
+CASOS = [
+    (150000.0, 0.025, 300),
+    (100000.0, 0.045, 240),
+    (320000.0, 0.0375, 480),
+    (45000.0, 0.06, 36),
+    (80000.0, 0.0, 180),
+    (60000.0, -0.002, 120),
+    (250000.0, 0.12, 360),
+]
+
+
+@pytest.mark.parametrize("P,tipo,n", CASOS)
+def test_resumen_coincide_con_bucle(P, tipo, n):
+    esperado = resumen_amortizacion_loop(P, tipo, n, hitos=(1, 12, 60, 120, 200))
+    obtenido = CuadroAmortizacion.calcular(P, tipo, n).resumen(hitos=(1, 12, 60, 120, 200))
+    assert [f["mes"] for f in obtenido] == [f["mes"] for f in esperado]
+    for a, b in zip(obtenido, esperado):
+        for campo in ("cuota", "interes_mes", "amortizado_mes", "saldo", "interes_acum"):
+            assert a[campo] == pytest.approx(b[campo], abs=0.01 + 1e-9)
+
+
+@pytest.mark.parametrize("P,tipo,n", CASOS)
+@pytest.mark.parametrize("extra,mes", [(1000.0, 1), (5000.0, 1), (10000.0, 1), (20000.0, 37), (10**7, 1), (500.0, 10**4)])
+def test_ahorro_coincide_con_bucle(P, tipo, n, extra, mes):
+    esperado = ahorro_amortizacion_extra_loop(P, tipo, n, extra, mes)
+    obtenido = CuadroAmortizacion.calcular(P, tipo, n).ahorro_extra(extra, mes)
+    assert obtenido == pytest.approx(esperado, abs=0.01 + 1e-9)
+
+
+def test_funciones_vectorizadas_por_meses():
+    P, tipo, n = 200000.0, 0.03, 300
+    meses = [0, 12, 150, 300, 360]
+    saldos = saldo(P, tipo, n, meses)
+    intereses = interes_acumulado(P, tipo, n, meses)
+    assert saldos[0] == pytest.approx(P)
+    assert saldos[-2] == pytest.approx(0.0, abs=1e-6)
+    assert saldos[-1] == 0.0
+    assert intereses[0] == pytest.approx(0.0)
+    assert intereses[-1] == pytest.approx(intereses[-2])
+    assert int(mes_liquidacion(P, tipo, n)) == n
+    assert float(cuota(P, tipo, n)) == pytest.approx(_cuota_loop(P, tipo, n))
@@ -0,0 +1,70 @@
+import pytest
+
+from amortizacion import CuadroAmortizacion
+from analisis_lote import analizar_lote, columnas_desde_filas, a_filas, a_columnas
+
+FILAS = [
+    {"capital_pendiente": 150000, "anos_restantes": 25, "tipo": "fijo", "tin": 2.5,
+     "ingresos_mensuales": 2000, "valor_vivienda": 200000},
+    {"capital_pendiente": 100000, "anos_restantes": 20, "tipo": "variable", "euribor": 3.5,
+     "diferencial": 1.0, "cuota_actual": 650, "oferta_alternativa_tin": 2.9},
+    {"capital_pendiente": 90000, "anos_restantes": 5, "tipo": "FIJO", "tin": 4.0},
+    {"capital_pendiente": 100000, "anos_restantes": 20, "tipo": "variable", "euribor": 3.5},
+    {"capital_pendiente": -5, "anos_restantes": 20, "tin": 3.0},
+]
+
+
+def test_filas_y_columnas_equivalentes():
+    filas = a_filas(analizar_lote(columnas_desde_filas(FILAS)))
+    cols = {k: [f.get(k) for f in FILAS] for k in set().union(*FILAS)}
+    assert a_filas(analizar_lote(cols)) == filas
+
+
+def test_lote_coincide_con_calculo_individual():
+    filas = a_filas(analizar_lote(columnas_desde_filas(FILAS)))
+
+    fija = filas[0]
+    cuadro = CuadroAmortizacion.calcular(150000, 0.025, 300)
+    assert fija["ok"] is True
+    assert fija["entrada"]["tipo"] == "fijo (2.50%)"
+    assert fija["metricas"]["cuota_estimada"] == round(cuadro.cuota, 2)
+    assert fija["metricas"]["dti"] == round(cuadro.cuota / 2000 * 100, 2)
+    assert fija["metricas"]["ltv"] == 75.0
+    assert fija["resumen_amortizacion"] == cuadro.resumen((12, 60, 120))
+    assert (fija["stress_test"]["cuota_base"], fija["stress_test"]["escenarios"]) == cuadro.stress()
+    assert fija["amortizacion_extra"]["ahorro_5k"] == pytest.approx(cuadro.ahorro_extra(5000.0), abs=0.01)
+    assert fija["avisos"] == ["LTV 70–80%: margen razonable, pero cuidado con caídas de valor."]
+    assert fija["comparativa_subrogacion"] is None
+
+    variable = filas[1]
+    assert variable["entrada"]["tipo"] == "variable (Euríbor 3.50% + 1.00%)"
+    assert variable["metricas"]["cuota_efectiva"] == 650
+    assert variable["comparativa_subrogacion"]["tin_alternativo"] == 2.9
+
+    # Plazo corto: los hitos posteriores al último mes no aparecen
+    assert [h["mes"] for h in filas[2]["resumen_amortizacion"]] == [12, 60]
+
+
+def test_errores_por_fila():
+    res = analizar_lote(columnas_desde_filas(FILAS))
+    filas = a_filas(res)
+    assert filas[3] == {"ok": False, "error": "Para 'variable' necesitas euribor y diferencial."}
+    assert filas[4] == {"ok": False, "error": "capital_pendiente debe ser > 0."}
+    cols = a_columnas(res)
+    assert cols["ok"] == [True, True, True, False, False]
+    assert cols["dti"][1] is None
+
+
+def test_columnas_de_distinta_longitud():
+    with pytest.raises(ValueError):
+        analizar_lote({"capital_pendiente": [1, 2], "anos_restantes": [10]})
+
+
+def test_ultimo_mes_coincide_con_un_hito():
+    # 10 años: el último mes es el 120, que también es un hito; sale una sola vez
+    (fila,) = a_filas(analizar_lote(columnas_desde_filas([
+        {"capital_pendiente": 80000, "anos_restantes": 10, "tipo": "fijo", "tin": 3.0},
+    ])))
+    cuadro = CuadroAmortizacion.calcular(80000, 0.03, 120)
+    assert [h["mes"] for h in fila["resumen_amortizacion"]] == [12, 60, 120]
+    assert fila["resumen_amortizacion"] == cuadro.resumen((12, 60, 120))
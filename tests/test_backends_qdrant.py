@@ -0,0 +1,132 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchValue
+
+from services.backends_qdrant import crear_clientes_qdrant
+from services.indice_local import IndiceLocal
+from services.modelo_embeddings import BackendFalso
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sembrar_indice(ruta):
+    textos = ["comisión de apertura ING", "tipo fijo BBVA jóvenes", "amortización anticipada Santander"]
+    bancos = ["ING", "BBVA", "SANTANDER"]
+    vectores = BackendFalso(dim=16).encode(textos)
+    payloads = [{"texto": t, "banco": b} for t, b in zip(textos, bancos)]
+    IndiceLocal.desde_vectores(vectores, [1, 2, 3], payloads).guardar(str(ruta))
+    return vectores
+
+
+def test_memoria_sembrada_desde_indice_local(tmp_path, monkeypatch):
+    vectores = _sembrar_indice(tmp_path)
+    monkeypatch.setenv("QDRANT_MEMORIA_DATOS", str(tmp_path))
+    qdrant, qdrant_async = crear_clientes_qdrant("memoria")
+
+    filtro = Filter(must=[FieldCondition(key="banco", match=MatchValue(value="BBVA"))])
+    puntos = qdrant.query_points("hipotecas", query=vectores[0].tolist(), limit=3, query_filter=filtro).points
+    assert [p.payload["banco"] for p in puntos] == ["BBVA"]
+
+    # El cliente asíncrono ve el mismo almacén
+    respuesta = asyncio.run(qdrant_async.query_points("hipotecas", query=vectores[2].tolist(), limit=1))
+    assert respuesta.points[0].id == 3
+
+
+def test_memoria_con_latencia_simulada(tmp_path, monkeypatch):
+    vectores = _sembrar_indice(tmp_path)
+    monkeypatch.setenv("QDRANT_MEMORIA_DATOS", str(tmp_path))
+    monkeypatch.setenv("QDRANT_MEMORIA_LATENCIA_MS", "30")
+    qdrant, qdrant_async = crear_clientes_qdrant("memoria")
+
+    inicio = time.perf_counter()
+    qdrant.query_points("hipotecas", query=vectores[0].tolist(), limit=1)
+    assert time.perf_counter() - inicio >= 0.03
+
+    async def cuatro_a_la_vez():
+        await asyncio.gather(*(qdrant_async.query_points("hipotecas", query=vectores[0].tolist(), limit=1) for _ in range(4)))
+
+    # La espera asíncrona no bloquea el event loop: 4 consultas tardan como una
+    inicio = time.perf_counter()
+    asyncio.run(cuatro_a_la_vez())
+    assert time.perf_counter() - inicio < 0.03 * 3
+
+
+def test_cloud_sin_variables_no_rompe_al_importar(monkeypatch):
+    monkeypatch.delenv("QDRANT_URL", raising=False)
+    monkeypatch.delenv("QDRANT_API_KEY", raising=False)
+    qdrant, qdrant_async = crear_clientes_qdrant("cloud")
+    assert qdrant is not None and qdrant_async is not None
+    with pytest.raises(ValueError):
+        crear_clientes_qdrant("inexistente")
+
+
+def test_embeddings_falsos_deterministas_y_por_palabras():
+    a, b = BackendFalso(dim=32), BackendFalso(dim=32)
+    v = a.encode(["Comisión de apertura", "comisión de apertura ING", "plazo máximo"])
+    np.testing.assert_array_equal(v, b.encode(["Comisión de apertura", "comisión de apertura ING", "plazo máximo"]))
+    np.testing.assert_allclose(np.linalg.norm(v, axis=1), 1.0, rtol=1e-5)
+    assert v[0] @ v[1] > v[0] @ v[2]
+
+
+def test_indice_local_vacio_tiene_la_dimension_del_modelo(tmp_path):
+    indice = IndiceLocal.desde_vectores([], [], [], dim=16)
+    assert indice.vectores.shape == (0, 16) and indice.buscar(np.ones(16)) == []
+    indice.guardar(str(tmp_path))
+    assert IndiceLocal.cargar(str(tmp_path)).vectores.shape == (0, 16)
+
+
+def _ingerir(tmp_path, qdrant="qdrant"):
+    # scripts/ingest_docs.py en otro proceso: el pool de extracción (spawn) reimporta el script
+    entorno = {k: v for k, v in os.environ.items() if k not in ("QDRANT_URL", "QDRANT_API_KEY")}
+    entorno.update({
+        "QDRANT_BACKEND": "local",
+        "QDRANT_PATH": str(tmp_path / qdrant),
+        "EMBEDDING_BACKEND": "falso",
+        "INGESTA_MANIFEST": str(tmp_path / "manifest.json"),
+        "INDICE_LOCAL_PATH": str(tmp_path / "indice"),
+        "OFERTAS_PATH": str(tmp_path / "ofertas.json"),
+    })
+    proceso = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, "scripts", "ingest_docs.py"), "--carpeta", str(tmp_path / "docs"), "--procesos", "2"],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, timeout=300,
+    )
+    assert proceso.returncode == 0, proceso.stderr
+    cliente = QdrantClient(path=str(tmp_path / qdrant))
+    try:
+        alias = {a.alias_name: a.collection_name for a in cliente.get_aliases().aliases}["hipotecas"]
+        return alias, cliente.count(alias).count
+    finally:
+        cliente.close()
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_ingesta_con_qdrant_local(tmp_path):
+    (tmp_path / "docs").mkdir()
+    shutil.copy(os.path.join(RAIZ, "data", "docs_bancarios", "Hipoteca_ING.pdf"), tmp_path / "docs")
+
+    coleccion, puntos = _ingerir(tmp_path)
+    assert puntos > 0
+    assert len(IndiceLocal.cargar(str(tmp_path / "indice"))) == puntos
+
+    # PDF ilegible: la colección activa se mantiene en vez de pasar a una vacía
+    (tmp_path / "docs" / "Hipoteca_ING.pdf").write_bytes(b"no es un pdf")
+    assert _ingerir(tmp_path) == (coleccion, puntos)
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_ingesta_con_manifiesto_y_qdrant_vacio(tmp_path):
+    (tmp_path / "docs").mkdir()
+    shutil.copy(os.path.join(RAIZ, "data", "docs_bancarios", "Hipoteca_ING.pdf"), tmp_path / "docs")
+    _, puntos = _ingerir(tmp_path)
+
+    # Mismo manifiesto contra un Qdrant sin colección: no se da el PDF por ingerido
+    assert _ingerir(tmp_path, qdrant="qdrant_nuevo")[1] == puntos
+    assert len(IndiceLocal.cargar(str(tmp_path / "indice"))) == puntos
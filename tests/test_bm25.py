@@ -0,0 +1,47 @@
+import numpy as np
+
+from services.bm25 import IndiceBM25, tokenizar
+from services.hibrida import fusion_rrf
+from services.indice_local import IndiceLocal
+
+TEXTOS = [
+    "ING: hipoteca naranja a tipo fijo, TIN 2,65% y TAE 2,80%.",
+    "BBVA ofrece hipoteca variable con diferencial sobre Euríbor.",
+    "Santander cobra una comisión por amortización anticipada del 0,5%.",
+    "Condiciones generales de la hipoteca y productos vinculados.",
+]
+BANCOS = ["ING", "BBVA", "SANTANDER", "ING"]
+
+
+def test_tokenizar_quita_tildes_y_palabras_vacias():
+    assert tokenizar("¿Cuál es la Comisión de amortización?") == ["comision", "amortizacion"]
+
+
+def test_bm25_prioriza_palabras_clave():
+    bm25 = IndiceBM25(TEXTOS)
+    assert bm25.buscar("TIN de ING")[0][0] == 0
+    assert bm25.buscar("comisión de amortización Santander")[0][0] == 2
+    assert bm25.buscar("palabra inexistente") == []
+
+    # Serialización sin pérdidas
+    copia = IndiceBM25.desde_dict(bm25.a_dict())
+    np.testing.assert_allclose(copia.puntuar("hipoteca tipo fijo"), bm25.puntuar("hipoteca tipo fijo"))
+
+
+def test_buscar_texto_en_snapshot(tmp_path):
+    payloads = [{"texto": t, "banco": b} for t, b in zip(TEXTOS, BANCOS)]
+    indice = IndiceLocal.desde_vectores(np.eye(4, 8), [10, 11, 12, 13], payloads)
+    indice.guardar(str(tmp_path))
+    assert (tmp_path / (tmp_path / "version").read_text() / "bm25.json").exists()
+
+    cargado = IndiceLocal.cargar(str(tmp_path))
+    assert sorted(p.id for p in cargado.buscar_texto("hipoteca", top_k=5, bancos=["ING"])) == [10, 13]
+
+
+def test_fusion_rrf():
+    denso = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    lexico = [{"id": "c"}, {"id": "d"}, {"id": "a"}]
+    fusion = fusion_rrf([denso, lexico], top_k=3)
+    # "a" y "c" aparecen en ambos rankings y quedan arriba
+    assert [d["id"] for d in fusion] == ["a", "c", "b"]
+    assert fusion[0]["score_rrf"] > fusion[2]["score_rrf"]
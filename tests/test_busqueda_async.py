@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from routers import search
+
+
+class QdrantLento:
+    # Envuelve el cliente asíncrono real: espera `espera_s`, cuenta las consultas simultáneas o falla
+    def __init__(self, cliente, espera_s=0.0, error=None):
+        self.cliente, self.espera_s, self.error = cliente, espera_s, error
+        self.en_vuelo = self.max_en_vuelo = 0
+
+    async def query_points(self, **kwargs):
+        self.en_vuelo += 1
+        self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+        try:
+            await asyncio.sleep(self.espera_s)
+            if self.error is not None:
+                raise self.error
+            return await self.cliente.query_points(**kwargs)
+        finally:
+            self.en_vuelo -= 1
+
+
+@pytest.fixture
+def qdrant_lento(cliente, monkeypatch):
+    # `cliente` arranca la app: modelo falso cargado y snapshot local disponible
+    def instalar(**kwargs):
+        lento = QdrantLento(search.qdrant_async, **kwargs)
+        monkeypatch.setattr(search, "qdrant_async", lento)
+        return lento
+
+    return instalar
+
+
+def _buscar(n=1, **kwargs):
+    async def todas():
+        return await asyncio.gather(*(
+            search.buscar_hipotecas_en_qdrant_async("comisión de apertura ING", top_k=3, min_score=0.0, **kwargs)
+            for _ in range(n)
+        ))
+
+    return asyncio.run(todas())
+
+
+def test_semaforo_limita_las_consultas_simultaneas(qdrant_lento, monkeypatch):
+    lento = qdrant_lento(espera_s=0.02)
+    monkeypatch.setattr(search, "qdrant_semaforo", asyncio.Semaphore(2))
+
+    resultados = _buscar(n=8)
+    assert lento.max_en_vuelo == 2
+    assert all(docs and docs[0]["banco"] == "ING" for docs in resultados)
+
+
+def test_error_de_qdrant_usa_el_indice_local(qdrant_lento):
+    qdrant_lento(error=ConnectionError("Qdrant caído"))
+    antes = search.fallbacks_locales
+
+    (docs,) = _buscar(banco="ing")
+    assert docs and {d["banco"] for d in docs} == {"ING"}
+    assert search.fallbacks_locales == antes + 1
+
+
+def test_timeout_de_qdrant_usa_el_indice_local(qdrant_lento, monkeypatch):
+    qdrant_lento(espera_s=2.0)
+    monkeypatch.setattr(search, "QDRANT_TIMEOUT_S", 0.05)
+
+    inicio = time.perf_counter()
+    (docs,) = _buscar()
+    assert time.perf_counter() - inicio < 1.0
+    assert docs[0]["texto"].startswith("Comisión de apertura ING")
+
+
+def test_sin_respaldo_local_el_error_se_propaga(qdrant_lento, monkeypatch):
+    qdrant_lento(error=ConnectionError("Qdrant caído"))
+    monkeypatch.setattr(search, "FALLBACK_LOCAL", False)
+    with pytest.raises(ConnectionError):
+        _buscar()
+
+
+def test_preguntar_de_extremo_a_extremo(api, cliente, sesion_con_analisis, monkeypatch):
+    # Registra lo que recupera la búsqueda real para comprobar que llega al LLM
+    recuperados = []
+    buscar = api.buscar_documentos_async
+
+    async def buscar_y_anotar(**kwargs):
+        docs = await buscar(**kwargs)
+        recuperados.append(docs)
+        return docs
+
+    monkeypatch.setattr(api, "buscar_documentos_async", buscar_y_anotar)
+    r = cliente.post("/preguntar", json={"session_id": sesion_con_analisis, "pregunta": "¿Qué comisión de apertura cobra ING?"})
+    assert r.status_code == 200
+    datos = r.json()
+    assert datos["ok"] and datos["respuesta"]
+    (docs,) = recuperados
+    assert docs[0]["banco"] == "ING"
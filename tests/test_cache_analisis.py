@@ -0,0 +1,76 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from services.cache_analisis import CacheAnalisis, huella, serializar
+
+
+def test_huella_estable_e_independiente_del_orden():
+    a = {"capital_pendiente": 150000.0, "tipo": "fijo", "tin": 2.5}
+    b = {"tin": 2.5, "tipo": "fijo", "capital_pendiente": 150000.0}
+    assert huella(a, "1") == huella(b, "1")
+    assert huella(a, "1") != huella({**a, "tin": 2.6}, "1")
+    # Cambiar la versión del cálculo invalida las huellas anteriores
+    assert huella(a, "1") != huella(a, "2")
+
+
+def test_lru_desaloja_la_menos_usada_y_cuenta_aciertos():
+    cache = CacheAnalisis(max_items=2)
+    for clave in ("a", "b"):
+        cache.guardar_resultado(clave, serializar({"ok": True, "clave": clave}), {"ok": True, "clave": clave})
+
+    assert cache.obtener("a")[1]["clave"] == "a"  # "a" pasa a ser la más reciente
+    cache.guardar_resultado("c", serializar({"ok": True}), {"ok": True})
+
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") is not None and cache.obtener("c") is not None
+    assert cache.estadisticas() == {"entradas": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_persistencia_ida_y_vuelta(tmp_path):
+    ruta = str(tmp_path / "cache" / "analisis.json")
+    resultado = {"ok": True, "metricas": {"cuota_efectiva": 812.35, "dti": None}, "avisos": ["Euríbor"]}
+    cache = CacheAnalisis(ruta=ruta, guardar_cada=1000)
+    cache.guardar_resultado("x", serializar(resultado), resultado)
+    cache.guardar()
+
+    recargada = CacheAnalisis(ruta=ruta)
+    cuerpo, decodificado = recargada.obtener("x")
+    assert cuerpo == serializar(resultado)
+    assert decodificado == json.loads(cuerpo) == resultado
+
+
+def test_fichero_corrupto_empieza_vacia(tmp_path):
+    ruta = tmp_path / "analisis.json"
+    ruta.write_text("{no es json", encoding="utf-8")
+    assert CacheAnalisis(ruta=str(ruta)).estadisticas()["entradas"] == 0
+
+
+def test_guardados_simultaneos_de_varios_workers(tmp_path):
+    # Cada worker tiene su caché y todas vuelcan al mismo fichero a la vez
+    ruta = str(tmp_path / "analisis.json")
+    caches = [CacheAnalisis(ruta=ruta) for _ in range(8)]
+    for i, cache in enumerate(caches):
+        cache.guardar_resultado(f"w{i}", serializar({"ok": True, "worker": i}), {"ok": True, "worker": i})
+
+    def guardar(cache):
+        for _ in range(25):
+            cache.guardar()
+
+    with ThreadPoolExecutor(len(caches)) as pool:
+        list(pool.map(guardar, caches))
+
+    # El fichero es uno de los volcados completos y no quedan temporales
+    assert len(json.loads((tmp_path / "analisis.json").read_text(encoding="utf-8"))["entradas"]) == 1
+    assert [p.name for p in tmp_path.iterdir()] == ["analisis.json"]
+
+
+def test_etag_e_if_none_match(cliente):
+    formulario = {"capital_pendiente": 98000, "anos_restantes": 15, "tipo": "Fijo", "tin": 3.1}
+    r = cliente.post("/analisis", json=formulario)
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and r.json()["ok"]
+
+    assert cliente.post("/analisis", json={**formulario, "tipo": "fijo"}, headers={"If-None-Match": etag}).status_code == 304
+    assert cliente.post("/analisis", json=formulario, headers={"If-None-Match": f'"otro", W/{etag}'}).status_code == 304
+    # "*" no demuestra que el cliente tenga este resultado
+    assert cliente.post("/analisis", json=formulario, headers={"If-None-Match": "*"}).status_code == 200
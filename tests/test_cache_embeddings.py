@@ -0,0 +1,156 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.cache_embeddings import CacheEmbeddings, normalizar_consulta
+
+
+def _fake_encode(llamadas):
+    def encode(texto):
+        llamadas.append(texto)
+        return np.full(4, float(len(llamadas)))
+    return encode
+
+
+def test_normalizacion_y_hits():
+    llamadas = []
+    cache = CacheEmbeddings(max_items=8, dim=4)
+    a = cache.obtener_o_calcular("¿Qué ofrece BBVA?", _fake_encode(llamadas))
+    b = cache.obtener_o_calcular("  ¿qué ofrece   bbva? ", _fake_encode(llamadas))
+    assert normalizar_consulta("  ¿Qué  ofrece BBVA? ") == "¿qué ofrece bbva?"
+    assert len(llamadas) == 1
+    np.testing.assert_array_equal(a, b)
+    assert cache.estadisticas()["hits"] == 1
+    assert cache.estadisticas()["misses"] == 1
+
+
+def test_contadores_desde_varios_hilos():
+    cache = CacheEmbeddings(max_items=8, dim=4)
+    cache.guardar_vector("hola", np.ones(4))
+
+    def consultar(_):
+        for _ in range(2000):
+            cache.obtener_o_calcular("hola", _fake_encode([]))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(consultar, range(8)))
+    assert cache.estadisticas()["hits"] == 16000
+
+
+def test_lru_y_bypass():
+    llamadas = []
+    cache = CacheEmbeddings(max_items=2, dim=4)
+    for t in ("a", "b", "a", "c", "b"):
+        cache.obtener_o_calcular(t, _fake_encode(llamadas))
+    # "b" fue expulsada al entrar "c" y se recalcula
+    assert llamadas == ["a", "b", "c", "b"]
+
+    cache.bypass = True
+    cache.obtener_o_calcular("a", _fake_encode(llamadas))
+    assert llamadas[-1] == "a"
+
+
+def test_persistencia_en_disco(tmp_path):
+    llamadas = []
+    cache = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    vector = cache.obtener_o_calcular("tin de ing", _fake_encode(llamadas))
+    cache.guardar()
+
+    recargada = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    np.testing.assert_array_equal(recargada.obtener_o_calcular("TIN de ING", _fake_encode(llamadas)), vector)
+    assert llamadas == ["tin de ing"]
+
+
+def test_async_escribe_fuera_del_event_loop(tmp_path):
+    cache = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    persistir, hilos = cache._persistir, []
+
+    def persistir_anotando(*args):
+        hilos.append(threading.get_ident())
+        persistir(*args)
+
+    cache._persistir = persistir_anotando
+
+    async def calcular(_):
+        return np.full(4, 3.0)
+
+    async def consultar():
+        vector = await cache.obtener_o_calcular_async("hola", calcular)
+        return vector, threading.get_ident()
+
+    vector, hilo_loop = asyncio.run(consultar())
+    np.testing.assert_array_equal(vector, np.full(4, 3.0))
+    assert hilos and hilos[0] != hilo_loop
+    recargada = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    np.testing.assert_array_equal(recargada.obtener("hola"), np.full(4, 3.0))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requiere os.fork")
+def test_workers_tras_fork_no_se_pisan(tmp_path):
+    # Como gunicorn con preload_app: la caché se crea en el maestro y escriben los workers
+    cache = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    hijos = []
+    for texto, valor in (("hola", 1.0), ("adios", 2.0)):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                cache.obtener_o_calcular(texto, lambda _: np.full(4, valor))
+            finally:
+                os._exit(0)
+        hijos.append(pid)
+    for pid in hijos:
+        os.waitpid(pid, 0)
+
+    recargada = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    np.testing.assert_array_equal(recargada.obtener("hola"), np.full(4, 1.0))
+    np.testing.assert_array_equal(recargada.obtener("adios"), np.full(4, 2.0))
+
+
+def test_registro_cortado_y_compactacion(tmp_path):
+    cache = CacheEmbeddings(max_items=2, dim=4, ruta=str(tmp_path))
+    for i, texto in enumerate(("a", "b", "c", "d", "e", "f")):
+        cache.guardar_vector(texto, np.full(4, float(i)))
+    # Una caída a mitad de escritura deja un registro incompleto al final
+    registro = tmp_path / "entradas.bin"
+    registro.write_bytes(registro.read_bytes()[:-5])
+
+    recargada = CacheEmbeddings(max_items=2, dim=4, ruta=str(tmp_path))
+    assert recargada.obtener("f") is None
+    np.testing.assert_array_equal(recargada.obtener("e"), np.full(4, 4.0))
+    assert recargada.estadisticas()["entradas"] == 2
+    # Había más del doble de max_items: se ha reescrito solo con las vigentes
+    assert CacheEmbeddings(max_items=8, dim=4, ruta=str(tmp_path)).estadisticas()["entradas"] == 2
+
+
+def test_escribir_tras_un_registro_cortado(tmp_path):
+    cache = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    cache.guardar_vector("a", np.full(4, 1.0))
+    cache.guardar_vector("b", np.full(4, 2.0))
+    registro = tmp_path / "entradas.bin"
+    registro.write_bytes(registro.read_bytes()[:-5])
+
+    # El worker que arranca recorta lo incompleto antes de añadir detrás
+    worker = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    worker.guardar_vector("c", np.full(4, 3.0))
+    worker.guardar_vector("d", np.full(4, 4.0))
+
+    recargada = CacheEmbeddings(max_items=4, dim=4, ruta=str(tmp_path))
+    assert recargada.obtener("b") is None
+    for texto, valor in (("a", 1.0), ("c", 3.0), ("d", 4.0)):
+        np.testing.assert_array_equal(recargada.obtener(texto), np.full(4, valor))
+
+
+def test_el_registro_no_crece_sin_limite(tmp_path):
+    # Proceso de larga duración: se compacta al escribir, no solo al arrancar
+    cache = CacheEmbeddings(max_items=8, dim=4, ruta=str(tmp_path))
+    for i in range(500):
+        cache.guardar_vector(f"consulta {i}", np.full(4, float(i)))
+    assert (tmp_path / "entradas.bin").stat().st_size <= cache._limite_bytes
+
+    recargada = CacheEmbeddings(max_items=8, dim=4, ruta=str(tmp_path))
+    assert recargada.estadisticas()["entradas"] == 8
+    np.testing.assert_array_equal(recargada.obtener("consulta 499"), np.full(4, 499.0))
@@ -0,0 +1,70 @@
+import asyncio
+
+import llm
+from llm import CacheRespuestas
+
+
+DOCS = [{"id": 2, "texto": "b"}, {"id": 1, "texto": "a"}]
+
+
+def _claves(pregunta, historial="", resumen="ctx", docs=DOCS, temperature=0.2, max_tokens=250):
+    return CacheRespuestas.claves(pregunta, historial, resumen, docs, temperature, max_tokens)
+
+
+def test_clave_exacta_normaliza_y_ordena_documentos():
+    assert _claves("¿Qué ofrece BBVA?") == _claves("  ¿qué ofrece  bbva? ", docs=list(reversed(DOCS)))
+    assert _claves("hola")[0] != _claves("hola", temperature=0.7)[0]
+    assert _claves("hola")[0] != _claves("hola", historial="Tú: x\nBot: y")[0]
+    assert _claves("hola")[0] != _claves("hola", resumen="otro análisis")[0]
+    # Mismo contexto, distinta pregunta: comparten clave de contexto
+    assert _claves("hola")[1] == _claves("adiós")[1]
+
+
+def test_lru_y_ttl():
+    cache = CacheRespuestas(max_items=2, ttl_segundos=3600)
+    for p in ("a", "b", "c"):
+        cache.guardar(_claves(p), f"resp {p}")
+    assert cache.buscar(_claves("a")) is None
+    assert cache.buscar(_claves("c")) == "resp c"
+
+    cache.ttl_segundos = -1
+    assert cache.buscar(_claves("c")) is None
+
+
+def test_nivel_semantico():
+    cache = CacheRespuestas(semantica=True, umbral=0.9)
+    cache.guardar(_claves("tipo fijo bbva"), "resp", vector=[1.0, 0.0, 0.0])
+    # Pregunta distinta pero embedding casi igual y mismo contexto
+    assert cache.buscar(_claves("tipo fijo de bbva"), vector=[0.99, 0.05, 0.0]) == "resp"
+    # Embedding lejano o contexto distinto: no reutiliza
+    assert cache.buscar(_claves("euríbor hoy"), vector=[0.0, 1.0, 0.0]) is None
+    assert cache.buscar(_claves("tipo fijo de bbva", max_tokens=500), vector=[0.99, 0.05, 0.0]) is None
+    stats = cache.estadisticas()
+    assert stats["hits_semanticos"] == 1 and stats["misses"] == 2
+
+
+def test_respuestas_se_cachean_y_errores_no(monkeypatch):
+    llamadas = []
+
+    class Backend(llm.BackendFalso):
+        async def generar_async(self, prompt, temperature, max_tokens):
+            llamadas.append(prompt)
+            return "Respuesta: ok\nFuentes: X"
+
+    monkeypatch.setattr(llm, "cache_respuestas", CacheRespuestas())
+    monkeypatch.setattr(llm, "cliente_llm", llm.ClienteLLM(Backend()))
+    contexto = {"ok": True, "entrada": {"capital_pendiente": 100000}}
+
+    async def preguntar():
+        return await llm.responder_pregunta_gemini_async("¿Me conviene?", contexto, DOCS, historial="Tú: hola\nBot: hola")
+
+    assert asyncio.run(preguntar()) == "Respuesta: ok\nFuentes: X"
+    assert asyncio.run(preguntar()) == "Respuesta: ok\nFuentes: X"
+    assert len(llamadas) == 1
+    assert "HISTORIAL_CONVERSACION:\nTú: hola" in llamadas[0]
+
+    # Sin API key no se guarda nada
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setattr(llm, "cliente_llm", llm.ClienteLLM(llm.BackendGemini()))
+    assert asyncio.run(llm.responder_pregunta_gemini_async("otra", contexto, DOCS)) == llm.RESPUESTA_SIN_API_KEY
+    assert llm.cache_respuestas.estadisticas()["entradas"] == 1
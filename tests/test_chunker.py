@@ -0,0 +1,54 @@
+from services.chunker import contar_tokens_aprox, es_encabezado, trocear_paginas
+
+PAGINAS = [
+    "Hipoteca ING – Documento Informativo\n"
+    "1. Descripción general\n"
+    "Hipoteca orientada a clientes que buscan claridad.\n"
+    "5. Comisiones\n"
+    "\uf0b7 Apertura: 0,3 %\n",
+    "\uf0b7 Amortización anticipada: 0,25 % primeros 10 años\n"
+    "6. Productos vinculados\n"
+    "\uf0b7 Domiciliación nómina opcional\n",
+]
+
+
+def test_es_encabezado():
+    assert es_encabezado("5. Comisiones")
+    assert es_encabezado("TIPOS DE INTERÉS")
+    assert es_encabezado("Condiciones:")
+    assert not es_encabezado("• Apertura: 0,3 %")
+    assert not es_encabezado("Hipoteca orientada a clientes que buscan claridad.")
+    assert not es_encabezado("1. El cliente podrá amortizar la totalidad del préstamo en cualquier momento sin coste")
+
+
+def test_chunks_por_seccion_con_paginas_y_titulo():
+    chunks = list(trocear_paginas(iter(PAGINAS)))
+    assert [c.seccion for c in chunks] == ["1. Descripción general", "5. Comisiones", "6. Productos vinculados"]
+
+    comisiones = chunks[1]
+    # La sección cruza el salto de página
+    assert (comisiones.page_start, comisiones.page_end) == (1, 2)
+    assert comisiones.texto.splitlines()[:2] == ["Hipoteca ING – Documento Informativo", "5. Comisiones"]
+    assert "• Apertura: 0,3 %" in comisiones.texto
+    assert (chunks[2].page_start, chunks[2].page_end) == (2, 2)
+
+
+def test_respeta_max_tokens_y_solapa():
+    texto = "\n".join(f"Condición número {i} de la oferta vinculada." for i in range(40))
+    chunks = list(trocear_paginas(["CONDICIONES\n" + texto], max_tokens=40, solape_tokens=10))
+
+    assert len(chunks) > 1
+    assert all(c.n_tokens <= 40 for c in chunks)
+    assert all(c.n_tokens == contar_tokens_aprox(c.texto) for c in chunks)
+    for anterior, siguiente in zip(chunks, chunks[1:]):
+        # La última línea de un chunk se repite al principio del siguiente
+        assert anterior.texto.splitlines()[-1] == siguiente.texto.splitlines()[1]
+    # No se pierde ninguna línea
+    juntas = {l for c in chunks for l in c.texto.splitlines()}
+    assert all(l in juntas for l in texto.splitlines())
+
+
+def test_linea_mas_larga_que_un_chunk():
+    chunks = list(trocear_paginas([" ".join(f"palabra{i}" for i in range(100))], max_tokens=30, solape_tokens=0))
+    assert len(chunks) == 4
+    assert all(c.n_tokens <= 30 for c in chunks)
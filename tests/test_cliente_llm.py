@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import llm
+from llm import BackendFalso, BackendGemini, ClienteLLM
+
+
+def test_system_instruction_no_va_en_el_prompt():
+    prompt = llm._construir_prompt("hola", "", "ctx", [])
+    assert llm.SYSTEM_INSTRUCTION not in prompt
+    assert prompt.startswith("ANALISIS_USUARIO:")
+
+
+def test_modelo_gemini_se_reutiliza(monkeypatch):
+    configuraciones = []
+    monkeypatch.setenv("GOOGLE_API_KEY", "clave-1")
+    monkeypatch.setattr(llm.genai, "configure", lambda api_key: configuraciones.append(api_key))
+    backend = BackendGemini()
+    assert backend._modelo() is backend._modelo()
+    assert configuraciones == ["clave-1"]
+
+    monkeypatch.setenv("GOOGLE_API_KEY", "clave-2")
+    backend._modelo()
+    assert configuraciones == ["clave-1", "clave-2"]
+
+
+def test_reintentos_con_backoff():
+    class Intermitente(BackendFalso):
+        async def generar_async(self, prompt, temperature, max_tokens):
+            self.llamadas += 1
+            if self.llamadas < 3:
+                raise ConnectionError("caído")
+            return "ok"
+
+    backend = Intermitente()
+    cliente = ClienteLLM(backend, reintentos=2, backoff_s=0.001)
+    assert asyncio.run(cliente.generar_async("p")) == "ok"
+    assert cliente.estadisticas()["reintentos"] == 2
+
+    backend.llamadas = 0
+    cliente = ClienteLLM(backend, reintentos=1, backoff_s=0.001)
+    with pytest.raises(ConnectionError):
+        asyncio.run(cliente.generar_async("p"))
+
+
+def test_hedge_usa_la_respuesta_mas_rapida():
+    class Lento(BackendFalso):
+        async def generar_async(self, prompt, temperature, max_tokens):
+            self.llamadas += 1
+            # La primera llamada se queda colgada; la copia responde enseguida
+            await asyncio.sleep(5 if self.llamadas == 1 else 0.01)
+            return f"llamada {self.llamadas}"
+
+    cliente = ClienteLLM(Lento(), hedge_ms=20)
+    assert asyncio.run(asyncio.wait_for(cliente.generar_async("p"), timeout=2)) == "llamada 2"
+    assert cliente.hedges == 1 and cliente.hedges_ganados == 1
+
+
+def test_stream_falso_y_timeout():
+    backend = BackendFalso(latencia_ms=10, jitter_ms=0, respuesta="uno dos tres")
+
+    async def leer(cliente):
+        return [t async for t in cliente.generar_stream("p")]
+
+    assert "".join(asyncio.run(leer(ClienteLLM(backend)))) == "uno dos tres"
+
+    lento = BackendFalso(latencia_ms=500, jitter_ms=0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(leer(ClienteLLM(lento, timeout_s=0.05, reintentos=0)))
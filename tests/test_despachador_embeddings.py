@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.despachador_embeddings import DespachadorEmbeddings
+
+
+def test_agrupa_consultas_concurrentes():
+    lotes = []
+    barrera = threading.Barrier(16)
+
+    def encode(textos):
+        lotes.append(list(textos))
+        return np.array([[float(len(t))] for t in textos])
+
+    despachador = DespachadorEmbeddings(encode, ventana_ms=50, max_lote=8)
+
+    def consulta(i):
+        barrera.wait()
+        return despachador.encode("x" * i)
+
+    with ThreadPoolExecutor(16) as pool:
+        resultados = list(pool.map(consulta, range(1, 17)))
+    despachador.cerrar()
+
+    # Cada llamante recibe su propio vector
+    assert [float(r[0]) for r in resultados] == [float(i) for i in range(1, 17)]
+    assert max(len(l) for l in lotes) <= 8
+    assert len(lotes) < 16
+    assert despachador.estadisticas()["consultas"] == 16
+
+
+def test_propaga_errores_a_los_llamantes():
+    def encode(textos):
+        raise RuntimeError("modelo caído")
+
+    despachador = DespachadorEmbeddings(encode, ventana_ms=1, max_lote=4)
+    with pytest.raises(RuntimeError):
+        despachador.encode("hola")
+    despachador.cerrar()
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+# Necesita los dos backends instalados y acceso a los pesos del modelo
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+from services.modelo_embeddings import BackendOnnx, BackendTorch  # noqa: E402
+
+FRASES = [
+    "¿Qué TIN ofrece BBVA en la hipoteca fija?",
+    "Quiero cambiar mi hipoteca variable a tipo fijo",
+    "Comisión por amortización anticipada parcial",
+    "¿Cuánto pagaría de cuota con un Euríbor del 3%?",
+    "Hipoteca joven con financiación del 95%",
+    "hola",
+]
+
+
+@pytest.fixture(scope="module")
+def backends():
+    try:
+        return BackendTorch(), BackendOnnx()
+    except OSError as e:
+        pytest.skip(f"modelo no disponible: {e}")
+
+
+def test_onnx_int8_coincide_con_torch(backends):
+    torch_backend, onnx_backend = backends
+    a = torch_backend.encode(FRASES)
+    b = onnx_backend.encode(FRASES)
+    assert a.shape == b.shape == (len(FRASES), 384)
+
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cosenos = (a * b).sum(axis=1)
+    assert cosenos.min() > 0.97
+    assert cosenos.mean() > 0.99
+
+
+def test_mismo_ranking(backends):
+    # Lo que importa para el RAG: el vecino más cercano de cada frase es el mismo
+    torch_backend, onnx_backend = backends
+    consultas = ["tipo fijo BBVA", "cambiar de banco", "amortizar antes de tiempo"]
+    sa = torch_backend.encode(consultas) @ torch_backend.encode(FRASES).T
+    sb = onnx_backend.encode(consultas) @ onnx_backend.encode(FRASES).T
+    assert (sa.argmax(axis=1) == sb.argmax(axis=1)).all()
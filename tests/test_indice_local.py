@@ -0,0 +1,115 @@
+import logging
+
+import numpy as np
+import pytest
+
+from services import indice_local
+from services.indice_local import IndiceLocal
+
+
+def _indice(n=200, dim=16, semilla=0):
+    rng = np.random.default_rng(semilla)
+    vectores = rng.standard_normal((n, dim)).astype(np.float32)
+    bancos = ["BBVA", "Santander", "ING", "bbva"]
+    payloads = [{"texto": f"chunk {i}", "banco": bancos[i % 4]} for i in range(n)]
+    return IndiceLocal.desde_vectores(vectores, list(range(1000, 1000 + n)), payloads), vectores, payloads
+
+
+def _fuerza_bruta(vectores, payloads, q, top_k, bancos=None, umbral=None):
+    v = vectores / np.linalg.norm(vectores, axis=1, keepdims=True)
+    scores = v @ (q / np.linalg.norm(q))
+    orden = [i for i in np.argsort(-scores)
+             if (not bancos or payloads[i]["banco"] in bancos) and (umbral is None or scores[i] >= umbral)]
+    return [(1000 + i, scores[i]) for i in orden[:top_k]]
+
+
+def test_top_k_coincide_con_fuerza_bruta():
+    indice, vectores, payloads = _indice()
+    q = np.random.default_rng(1).standard_normal(16)
+    for top_k, bancos, umbral in [(5, None, None), (3, ["BBVA", "bbva"], None), (50, ["ING"], 0.2), (10, None, 0.99)]:
+        esperado = _fuerza_bruta(vectores, payloads, q, top_k, bancos, umbral)
+        puntos = indice.buscar(q, top_k=top_k, bancos=bancos, score_threshold=umbral)
+        assert [p.id for p in puntos] == [i for i, _ in esperado]
+        np.testing.assert_allclose([p.score for p in puntos], [s for _, s in esperado], rtol=1e-5)
+
+
+def test_snapshot_en_disco(tmp_path):
+    indice, _, _ = _indice(n=20)
+    indice.guardar(str(tmp_path))
+    indice.guardar(str(tmp_path))
+    indice.guardar(str(tmp_path))  # se conservan el snapshot vigente y el anterior
+    versiones = sorted(p.name for p in tmp_path.iterdir() if p.is_dir())
+    assert len(versiones) == 2
+    assert (tmp_path / "version").read_text() == versiones[-1]
+
+    cargado = IndiceLocal.cargar(str(tmp_path))
+    assert isinstance(cargado.vectores, np.memmap)
+    q = np.ones(16)
+    assert [p.id for p in cargado.buscar(q, top_k=4)] == [p.id for p in indice.buscar(q, top_k=4)]
+    assert cargado.payloads[3] == indice.payloads[3]
+
+
+def test_lector_durante_un_guardado(tmp_path, monkeypatch):
+    # Un worker lee `version` justo antes de que una ingestión guarde dos snapshots seguidos
+    indice, _, _ = _indice(n=20)
+    indice.guardar(str(tmp_path))
+    original = indice_local._version_actual
+    llamadas = []
+
+    def version_desfasada(ruta):
+        if not llamadas:
+            llamadas.append(original(ruta))
+            indice.guardar(ruta)
+            indice.guardar(ruta)
+            return llamadas[0]
+        return original(ruta)
+
+    monkeypatch.setattr(indice_local, "_version_actual", version_desfasada)
+    assert len(IndiceLocal.cargar(str(tmp_path))) == 20
+
+
+@pytest.fixture
+def instancia_limpia(monkeypatch):
+    for nombre, valor in [("_indice", None), ("_ruta", None), ("_version", None), ("_fallo", None)]:
+        monkeypatch.setattr(indice_local, nombre, valor)
+    monkeypatch.setattr(indice_local, "_comprobado", float("-inf"))
+    monkeypatch.setattr(indice_local, "INDICE_LOCAL_RECARGA_S", 0.0)
+
+
+def test_indice_actual_sin_snapshot_avisa_una_vez(tmp_path, instancia_limpia, caplog):
+    with caplog.at_level(logging.INFO, logger="services.indice_local"):
+        assert indice_local.indice_actual(str(tmp_path)) is None
+        assert indice_local.indice_actual(str(tmp_path)) is None
+    assert len([r for r in caplog.records if "Sin índice local" in r.getMessage()]) == 1
+
+    # Aparece el snapshot: se recoge en la siguiente comprobación
+    _indice(n=20)[0].guardar(str(tmp_path))
+    assert len(indice_local.indice_actual(str(tmp_path))) == 20
+
+
+def test_indice_actual_recarga_al_cambiar_de_version(tmp_path, instancia_limpia, monkeypatch):
+    _indice(n=20)[0].guardar(str(tmp_path))
+    primero = indice_local.indice_actual(str(tmp_path))
+    assert indice_local.indice_actual(str(tmp_path)) is primero  # misma versión: sin recargar
+
+    _indice(n=30)[0].guardar(str(tmp_path))
+    monkeypatch.setattr(indice_local, "INDICE_LOCAL_RECARGA_S", 3600.0)
+    assert indice_local.indice_actual(str(tmp_path)) is primero  # dentro del intervalo no mira el disco
+    monkeypatch.setattr(indice_local, "_comprobado", float("-inf"))
+    assert len(indice_local.indice_actual(str(tmp_path))) == 30
+
+
+def test_desde_qdrant_pagina_el_scroll():
+    class Punto:
+        def __init__(self, i):
+            self.id, self.vector, self.payload = i, [float(i), 1.0], {"banco": "ING"}
+
+    class Cliente:
+        def scroll(self, collection_name, limit, offset, with_payload, with_vectors):
+            inicio = offset or 0
+            puntos = [Punto(i) for i in range(inicio, min(inicio + limit, 5))]
+            return puntos, (inicio + limit if inicio + limit < 5 else None)
+
+    indice = IndiceLocal.desde_qdrant(Cliente(), lote=2)
+    assert indice.ids == [0, 1, 2, 3, 4]
+    np.testing.assert_allclose(np.linalg.norm(indice.vectores, axis=1), 1.0, rtol=1e-6)
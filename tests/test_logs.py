@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import queue
+
+import pytest
+
+from services.logs import FiltroMuestreo, ManejadorCola, configurar_logging, id_peticion
+from services.metricas import etapas_peticion
+
+
+@pytest.fixture
+def raiz_limpia():
+    raiz = logging.getLogger()
+    handlers, nivel = raiz.handlers[:], raiz.level
+    yield
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    for handler in handlers:
+        raiz.addHandler(handler)
+    raiz.setLevel(nivel)
+
+
+def test_lineas_json_con_id_y_etapas(tmp_path, raiz_limpia):
+    ruta = tmp_path / "app.log"
+    escritor = configurar_logging(str(ruta), consola=False)
+    token_id, token_etapas = id_peticion.set("pet-1"), etapas_peticion.set({"gemini": 0.25})
+    try:
+        logging.getLogger("prueba").info("respuesta lista", extra={"session_id": "s1"})
+    finally:
+        id_peticion.reset(token_id)
+        etapas_peticion.reset(token_etapas)
+    logging.getLogger("prueba").warning("sin petición")
+    escritor.stop()
+    escritor.stop()  # idempotente (shutdown + atexit)
+
+    lineas = [json.loads(l) for l in ruta.read_text(encoding="utf-8").splitlines()]
+    assert lineas[0]["mensaje"] == "respuesta lista"
+    assert lineas[0]["id_peticion"] == "pet-1"
+    assert lineas[0]["etapas_ms"] == {"gemini": 250.0}
+    assert lineas[0]["session_id"] == "s1"
+    assert lineas[1]["nivel"] == "WARNING" and "id_peticion" not in lineas[1]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requiere os.fork")
+def test_hijo_tras_fork_escribe_sus_registros(tmp_path, raiz_limpia):
+    # Como gunicorn con preload_app: se configura en el maestro y el worker loguea
+    ruta = tmp_path / "app.log"
+    escritor = configurar_logging(str(ruta), consola=False)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            logging.getLogger("worker").info("desde el worker")
+            escritor.stop()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    logging.getLogger("maestro").info("desde el maestro")
+    escritor.stop()
+
+    mensajes = [json.loads(l)["mensaje"] for l in ruta.read_text(encoding="utf-8").splitlines()]
+    assert sorted(mensajes) == ["desde el maestro", "desde el worker"]
+
+
+def test_reconfigurar_para_el_escritor_anterior(tmp_path, raiz_limpia):
+    primero = configurar_logging(str(tmp_path / "a.log"), consola=False)
+    segundo = configurar_logging(str(tmp_path / "b.log"), consola=False)
+    assert primero._thread is None and segundo._thread is not None
+    logging.getLogger("prueba").info("solo en b")
+    segundo.stop()
+    assert "solo en b" in (tmp_path / "b.log").read_text(encoding="utf-8")
+    assert (tmp_path / "a.log").read_text(encoding="utf-8") == ""
+
+
+def test_muestreo_por_peticion_y_sin_tocar_avisos():
+    filtro = FiltroMuestreo(0.5)
+
+    def registro(nivel, ident, muestreable=True):
+        r = logging.LogRecord("x", nivel, "", 0, "m", (), None)
+        r.id_peticion, r.muestreable = ident, muestreable
+        return r
+
+    idents = [f"pet-{i}" for i in range(400)]
+    guardadas = [i for i in idents if filtro.filter(registro(logging.INFO, i))]
+    assert 120 < len(guardadas) < 280
+    # Misma decisión para todas las líneas de una petición
+    assert all(filtro.filter(registro(logging.INFO, i)) for i in guardadas)
+    assert all(filtro.filter(registro(logging.WARNING, i)) for i in idents)
+    assert all(filtro.filter(registro(logging.INFO, i, muestreable=False)) for i in idents)
+
+
+def test_cola_llena_descarta_sin_bloquear():
+    manejador = ManejadorCola(queue.Queue(maxsize=2))
+    for i in range(5):
+        manejador.handle(logging.LogRecord("x", logging.INFO, "", 0, f"linea {i}", (), None))
+    assert manejador.queue.qsize() == 2
+    assert manejador.descartados == 3
@@ -0,0 +1,48 @@
+from services.manifiesto_ingesta import Manifiesto, hash_archivo, ids_para_chunks
+
+
+def test_ids_estables_al_insertar_chunks():
+    antes = ids_para_chunks("BBVA.pdf", ["a", "b", "c"])
+    despues = ids_para_chunks("BBVA.pdf", ["nuevo", "a", "b", "c"])
+    assert despues[1:] == antes
+    # Chunks repetidos en el mismo PDF tienen ids distintos
+    repetidos = ids_para_chunks("BBVA.pdf", ["x", "x"])
+    assert repetidos[0][0] != repetidos[1][0]
+    # El mismo texto en otro PDF es otro punto
+    assert ids_para_chunks("ING.pdf", ["a"])[0][0] != antes[0][0]
+
+
+def test_planificar_y_persistencia(tmp_path):
+    pdf = tmp_path / "BBVA.pdf"
+    pdf.write_bytes(b"%PDF contenido")
+    manifiesto = Manifiesto(coleccion="hipotecas_1")
+    manifiesto.registrar("BBVA.pdf", hash_archivo(str(pdf)), ids_para_chunks("BBVA.pdf", ["a"]))
+    manifiesto.registrar("ING.pdf", "viejo", ids_para_chunks("ING.pdf", ["b"]))
+    manifiesto.registrar("Sabadell.pdf", "x", [])
+
+    ruta = str(tmp_path / "manifest.json")
+    manifiesto.guardar(ruta)
+    cargado = Manifiesto.cargar(ruta)
+    assert cargado.coleccion == "hipotecas_1"
+    assert cargado.ids("ING.pdf") == manifiesto.ids("ING.pdf")
+
+    plan = cargado.planificar({"BBVA.pdf": hash_archivo(str(pdf)), "ING.pdf": "nuevo", "Kutxa.pdf": "k"})
+    assert plan.sin_cambios == ["BBVA.pdf"]
+    assert plan.modificados == ["ING.pdf"]
+    assert plan.nuevos == ["Kutxa.pdf"]
+    assert plan.eliminados == ["Sabadell.pdf"]
+    assert plan.hay_cambios
+    assert not cargado.planificar({"BBVA.pdf": hash_archivo(str(pdf)), "ING.pdf": "viejo", "Sabadell.pdf": "x"}).hay_cambios
+
+    assert Manifiesto.cargar(str(tmp_path / "no_existe.json")).archivos == {}
+
+
+def test_cambio_de_version_reprocesa_todo(tmp_path):
+    manifiesto = Manifiesto(coleccion="hipotecas_1", version=1)
+    manifiesto.registrar("BBVA.pdf", "h", ids_para_chunks("BBVA.pdf", ["a"]))
+    ruta = str(tmp_path / "manifest.json")
+    manifiesto.guardar(ruta)
+
+    cargado = Manifiesto.cargar(ruta)
+    assert cargado.planificar({"BBVA.pdf": "h"}, version=1).sin_cambios == ["BBVA.pdf"]
+    assert cargado.planificar({"BBVA.pdf": "h"}, version=2).modificados == ["BBVA.pdf"]
@@ -0,0 +1,65 @@
+import time
+
+from memoria import MemoriaConversacion
+
+
+def test_ventana_de_turnos_y_resumen_rodante():
+    mem = MemoriaConversacion(max_turnos=2, max_tokens=10_000, max_tokens_resumen=10_000)
+    for i in range(4):
+        mem.agregar("s", f"pregunta {i}", f"respuesta {i}")
+
+    texto = mem.historial("s")
+    assert texto.startswith("RESUMEN_ANTERIOR:\n- Preguntó: pregunta 0 → respuesta 0\n- Preguntó: pregunta 1")
+    assert texto.endswith("Tú: pregunta 2\nBot: respuesta 2\nTú: pregunta 3\nBot: respuesta 3")
+    assert mem.estadisticas()["turnos_resumidos"] == 2
+
+
+def test_presupuesto_de_tokens():
+    mem = MemoriaConversacion(max_turnos=100, max_tokens=60, max_tokens_resumen=30)
+    for i in range(20):
+        mem.agregar("s", "¿" + "x" * 80 + f"? {i}", "y" * 80)
+    texto = mem.historial("s")
+    # Solo el último turno cabe literal y el resumen se queda en su presupuesto
+    assert texto.count("Tú:") == 1
+    assert texto.count("- Preguntó:") <= 2
+
+
+def test_turno_mayor_que_el_presupuesto_se_trunca():
+    mem = MemoriaConversacion(max_turnos=100, max_tokens=60)
+    mem.agregar("s", "p" * 10_000, "Respuesta:\n" + "r" * 10_000)
+    texto = mem.historial("s")
+    assert texto.count("Tú:") == 1 and "…" in texto
+    assert len(texto) <= 60 * 4 + len("Tú: \nBot: ")
+    assert "Respuesta:\n" in texto  # los saltos de línea se conservan
+
+
+def test_historial_cacheado_hasta_nuevo_turno():
+    mem = MemoriaConversacion()
+    mem.agregar("s", "hola", "¡hola!")
+    primero = mem.historial("s")
+    assert mem.historial("s") is primero
+    mem.agregar("s", "¿y el TIN?", "2,5 %")
+    assert mem.historial("s") is not primero
+
+
+def test_expulsion_lru_y_contadores():
+    mem = MemoriaConversacion(max_sesiones=2)
+    mem.agregar("a", "p", "r")
+    mem.agregar("b", "p", "r")
+    mem.historial("a")
+    mem.agregar("c", "p", "r")
+    assert mem.historial("b") == ""
+    stats = mem.estadisticas()
+    assert stats["sesiones"] == 2
+    assert stats["expulsiones"] == 1
+    assert stats["bytes"] == 4
+    mem.reiniciar("a")
+    assert mem.estadisticas()["bytes"] == 2
+
+
+def test_expulsion_por_inactividad():
+    mem = MemoriaConversacion(ttl_segundos=0.05)
+    mem.agregar("a", "p", "r")
+    time.sleep(0.06)
+    assert mem.historial("a") == ""
+    assert mem.estadisticas() == {"sesiones": 0, "bytes": 0, "expulsiones": 1, "turnos_resumidos": 0}
@@ -0,0 +1,30 @@
+from services.metadatos_documentos import (
+    BANCO_DESCONOCIDO,
+    bancos_en_texto,
+    detectar_banco,
+    detectar_producto,
+    normalizar_banco,
+)
+
+
+def test_normalizar_banco():
+    assert normalizar_banco("santander") == "SANTANDER"
+    assert normalizar_banco("  Banco  Santander ") == "SANTANDER"
+    assert normalizar_banco("ing direct") == "ING"
+    assert normalizar_banco("Caja Rural") is None
+    assert normalizar_banco(None) is None
+
+
+def test_bancos_en_texto_solo_palabras_completas():
+    assert bancos_en_texto("Con tus INGRESOS te conviene la de BBVA") == ["BBVA"]
+    assert bancos_en_texto("ING y Santander cobran 0,5 %") == ["ING", "SANTANDER"]
+
+
+def test_detectar_banco_y_producto():
+    assert detectar_banco("Hipoteca_ING.pdf", "texto de BBVA") == "ING"
+    # Sin banco en el nombre, el más citado en el texto
+    assert detectar_banco("oferta.pdf", "Hipoteca BBVA ... comparada con ING ... BBVA") == "BBVA"
+    assert detectar_banco("oferta.pdf", "sin banco") == BANCO_DESCONOCIDO
+
+    assert detectar_producto("Hipoteca_ING.pdf") == "HIPOTECA"
+    assert detectar_producto("oferta.pdf", "Nuestra hipoteca joven para menores de 35") == "HIPOTECA JOVEN"
@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from services.despachador_embeddings import DespachadorEmbeddings
+from services.modelo_embeddings import CargadorModelo
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+class ModeloFalso:
+    def encode(self, textos):
+        return np.ones((len(textos), 4), dtype=np.float32)
+
+
+class CargadorFalso(CargadorModelo):
+    def __init__(self, espera=0.05, fallar=False):
+        super().__init__("falso")
+        self.cargas = 0
+        self.espera = espera
+        self.fallar = fallar
+
+    def _cargar(self):
+        self.cargas += 1
+        time.sleep(self.espera)
+        if self.fallar:
+            raise RuntimeError("sin pesos")
+        return ModeloFalso()
+
+
+def test_carga_unica_con_llamadas_concurrentes():
+    cargador = CargadorFalso()
+    assert cargador.estado()["estado"] == "pendiente"
+    cargador.cargar_en_segundo_plano()
+    modelos = []
+    hilos = [threading.Thread(target=lambda: modelos.append(cargador.obtener())) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert cargador.cargas == 1
+    assert len({id(m) for m in modelos}) == 1
+    assert cargador.listo and cargador.estado()["estado"] == "listo"
+    assert cargador.encode(["a", "b"]).shape == (2, 4)
+
+
+def test_error_de_carga_queda_en_estado():
+    cargador = CargadorFalso(espera=0, fallar=True)
+    with pytest.raises(RuntimeError):
+        cargador.obtener()
+    assert cargador.estado()["estado"] == "error"
+
+
+def test_despachador_recrea_el_hilo_tras_fork():
+    despachador = DespachadorEmbeddings(ModeloFalso().encode, ventana_ms=1)
+    assert despachador.encode("a").shape == (4,)
+    hilo_padre = despachador._hilo
+    # Simula que estamos en un proceso hijo
+    despachador._pid = -1
+    assert despachador.encode("b").shape == (4,)
+    assert despachador._hilo is not hilo_padre
+    despachador.cerrar()
+
+
+def _modelo_onnx_minimo(carpeta, vocabulario, dim=4):
+    # tokenizer.json + un .onnx cuya salida por token es una fila de una tabla fija
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    tokenizers = pytest.importorskip("tokenizers")
+    from onnx import TensorProto, helper, numpy_helper
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{p: i + 2 for i, p in enumerate(vocabulario)}}
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(carpeta / "tokenizer.json"))
+
+    tabla = np.random.default_rng(0).standard_normal((len(vocab), dim)).astype(np.float32)
+    grafo = helper.make_graph(
+        [helper.make_node("Gather", ["tabla", "input_ids"], ["last_hidden_state"])],
+        "minimo",
+        [helper.make_tensor_value_info(n, TensorProto.INT64, ["n", "t"]) for n in ("input_ids", "attention_mask")],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["n", "t", dim])],
+        [numpy_helper.from_array(tabla, "tabla")],
+    )
+    (carpeta / "onnx").mkdir()
+    modelo = helper.make_model(grafo, opset_imports=[helper.make_opsetid("", 13)])
+    modelo.ir_version = 8
+    onnx.save(modelo, str(carpeta / "onnx" / "model.onnx"))
+    return vocab, tabla
+
+
+def test_backend_onnx_pooling_sin_torch(tmp_path):
+    from services.modelo_embeddings import BackendOnnx
+
+    vocab, tabla = _modelo_onnx_minimo(tmp_path, ["tipo", "fijo", "bbva"])
+    backend = BackendOnnx(str(tmp_path), archivo="onnx/model.onnx")
+    assert backend.dim == 4
+
+    # En un proceso limpio: otras pruebas pueden haber importado torch en este
+    codigo = (
+        "import sys; from services.modelo_embeddings import BackendOnnx; "
+        f"BackendOnnx({str(tmp_path)!r}, archivo='onnx/model.onnx').encode(['tipo']); "
+        "print('torch' in sys.modules)"
+    )
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert salida.stdout.strip() == "False"
+
+    # Lote con longitudes distintas: el relleno no cuenta en la media
+    vectores = backend.encode(["tipo fijo bbva", "tipo"])
+    esperado = tabla[[vocab["tipo"], vocab["fijo"], vocab["bbva"]]].mean(axis=0)
+    np.testing.assert_allclose(vectores[0], esperado / np.linalg.norm(esperado), rtol=1e-5)
+    np.testing.assert_allclose(vectores[1], tabla[vocab["tipo"]] / np.linalg.norm(tabla[vocab["tipo"]]), rtol=1e-5)
+    assert backend.encode([]).shape == (0, 4)
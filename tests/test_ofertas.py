@@ -0,0 +1,63 @@
+import ofertas as modulo_ofertas
+from ofertas import cargar_ofertas, extraer_ofertas, guardar_ofertas
+
+PAGINAS = [
+    "Hipoteca BBVA – Documento Informativo\n"
+    "2. Tipos de interés según edad y modalidad\n"
+    "\uf0b7 18–30 años:\n"
+    "o Fijo: 2,70 % TIN\n"
+    "o Mixto: 2,20 % los primeros 5 años, luego Euríbor +0,70 %\n"
+    "\uf0b7 31–45 años: Fijo 2,80 %, Variable Euríbor +0,75 %, TAE 3,10 %\n"
+    "3. Plazos de amortización\n"
+    "\uf0b7 15–30 años según edad y capacidad de pago\n"
+    "\uf0b7 Máximo 25 años si edad > 50\n",
+    "4. Importe financiable\n"
+    "\uf0b7 Hasta 80 % del valor de tasación para primera vivienda\n"
+    "5. Comisiones\n"
+    "\uf0b7 Apertura: 0,5 % sobre capital\n"
+    "\uf0b7 Amortización anticipada parcial: 0,25 % primeros 10 años\n"
+    "\uf0b7 Amortización anticipada total: 0,50 % primeros 10 años\n"
+    "6. Productos vinculados\n"
+    "\uf0b7 Domiciliación nómina + seguro hogar → reducción 0,15 % TIN\n"
+    "\uf0b7 Solo nómina → reducción 0,05 % TIN\n",
+]
+
+
+def test_extraer_ofertas_por_tramo_y_modalidad():
+    ofertas = extraer_ofertas(PAGINAS, "BBVA", "HIPOTECA", "Hipoteca_BBVA.pdf")
+    resumen = [(o.modalidad, o.edad_min, o.tin, o.diferencial, o.anos_fijos, o.tae) for o in ofertas]
+    assert resumen == [
+        ("fijo", 18, 2.70, None, None, None),
+        ("mixto", 18, 2.20, 0.70, 5, None),
+        ("fijo", 31, 2.80, None, None, 3.10),
+        ("variable", 31, None, 0.75, None, 3.10),
+    ]
+
+    # Condiciones del documento, aunque estén en otra página
+    o = ofertas[0]
+    assert (o.plazo_max_anos, o.edad_limite_plazo, o.plazo_max_anos_limite) == (30, 50, 25)
+    assert o.financiacion_max == 80.0
+    assert (o.comision_apertura, o.comision_amortizacion_parcial, o.comision_amortizacion_total) == (0.5, 0.25, 0.5)
+    assert o.bonificacion_max == 0.15
+    assert o.plazo_maximo(edad=55) == 25 and o.plazo_maximo(edad=40) == 30
+    assert o.admite_edad(25) and not o.admite_edad(40) and o.admite_edad(None)
+
+
+def test_tabla_compacta_ida_y_vuelta(tmp_path):
+    ofertas = extraer_ofertas(PAGINAS, "BBVA", "HIPOTECA", "Hipoteca_BBVA.pdf")
+    ruta = str(tmp_path / "ofertas.json")
+    guardar_ofertas(ofertas, ruta)
+    assert cargar_ofertas(ruta) == ofertas
+
+
+def test_ofertas_actuales_recoge_la_tabla_generada_despues(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo_ofertas, "_ruta", None)
+    monkeypatch.setattr(modulo_ofertas, "OFERTAS_RECARGA_S", 0.0)
+    ruta = str(tmp_path / "ofertas.json")
+    assert modulo_ofertas.ofertas_actuales(ruta) == []
+
+    ofertas = extraer_ofertas(PAGINAS, "BBVA", "HIPOTECA", "Hipoteca_BBVA.pdf")
+    guardar_ofertas(ofertas, ruta)
+    assert modulo_ofertas.ofertas_actuales(ruta) == ofertas
+    guardar_ofertas(ofertas[:1], ruta)
+    assert modulo_ofertas.ofertas_actuales(ruta) == ofertas[:1]
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.pipeline_ingesta import PipelineIngesta
+
+
+def _extraer(ruta):
+    if ruta == "roto.pdf":
+        raise ValueError("PDF corrupto")
+    n = int(ruta.split(".")[0][-1])
+    chunks = [
+        {"id": f"{ruta}-{i}", "hash": str(i), "texto": f"{ruta} {i}", "payload": {"origen": ruta}}
+        for i in range(n * 10)
+    ]
+    return n, chunks
+
+
+def _pipeline(subir, **kw):
+    return PipelineIngesta(
+        extraer=_extraer,
+        embeber=lambda textos: np.ones((len(textos), 3)),
+        subir=subir,
+        ejecutor_procesos=lambda n: ThreadPoolExecutor(n),
+        backoff_s=0.0,
+        **kw,
+    )
+
+
+def test_procesa_todo_en_lotes_y_con_reintentos():
+    subidos, lotes, fallos = [], [], {"n": 0}
+
+    def subir(puntos):
+        # El segundo lote falla una vez
+        if len(lotes) == 1 and fallos["n"] == 0:
+            fallos["n"] += 1
+            raise ConnectionError("timeout")
+        lotes.append(len(puntos))
+        subidos.extend(p[0] for p in puntos)
+
+    pipeline = _pipeline(
+        subir,
+        reutilizar=lambda ids: {i: np.zeros(3) for i in ids if i.endswith("-0")},
+        lote_embedding=7,
+        lote_upsert=5,
+        max_cola=4,
+        procesos=2,
+    )
+    resultados = pipeline.ejecutar(["a1.pdf", "b2.pdf", "roto.pdf", "c3.pdf"])
+
+    assert sorted(subidos) == sorted(f"{r}-{i}" for r, n in [("a1.pdf", 1), ("b2.pdf", 2), ("c3.pdf", 3)] for i in range(n * 10))
+    assert max(lotes) <= 5
+    assert resultados["roto.pdf"] == {"error": "PDF corrupto"}
+    assert len(resultados["b2.pdf"]["chunks"]) == 20
+
+    m = pipeline.metricas.resumen()
+    assert (m["archivos"], m["paginas"], m["chunks"]) == (3, 6, 60)
+    assert m["reutilizados"] == 3 and m["embebidos"] == 57
+    assert m["reintentos_upsert"] == 1 and m["puntos_subidos"] == 60
+
+
+def test_error_persistente_de_subida_se_propaga():
+    def subir(puntos):
+        raise ConnectionError("Qdrant caído")
+
+    with pytest.raises(ConnectionError):
+        _pipeline(subir, reintentos=1, max_cola=2).ejecutar(["a1.pdf", "b2.pdf", "c3.pdf"])
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+import llm
+import memoria
+
+
+class BackendGuion:
+    # Backend de LLM que emite los fragmentos indicados y, opcionalmente, falla o se cuelga después
+    def __init__(self, trozos, error=None, espera_s=0.0):
+        self.trozos, self.error, self.espera_s = trozos, error, espera_s
+
+    async def generar_stream(self, prompt, temperature, max_tokens):
+        for trozo in self.trozos:
+            yield trozo
+        if self.espera_s:
+            await asyncio.sleep(self.espera_s)
+        if self.error is not None:
+            raise self.error
+
+
+def _eventos(respuesta):
+    eventos = []
+    for bloque in respuesta.text.strip().split("\n\n"):
+        lineas = dict(linea.split(": ", 1) for linea in bloque.splitlines())
+        eventos.append((lineas["event"], json.loads(lineas["data"])))
+    return eventos
+
+
+@pytest.fixture
+def preguntar(cliente, sesion_con_analisis, monkeypatch):
+    monkeypatch.setattr(llm.cliente_llm, "reintentos", 0)
+    # Caché de respuestas vacía: otra prueba puede haber respondido ya a la misma pregunta
+    monkeypatch.setattr(llm, "cache_respuestas", llm.CacheRespuestas(max_items=16, ttl_segundos=60))
+
+    def lanzar(backend, pregunta):
+        monkeypatch.setattr(llm.cliente_llm, "backend", backend)
+        r = cliente.post("/preguntar/stream", json={"session_id": sesion_con_analisis, "pregunta": pregunta})
+        assert r.status_code == 200
+        return _eventos(r), memoria.obtener_historial(sesion_con_analisis)
+
+    return lanzar
+
+
+def test_stream_completo_va_a_memoria(preguntar):
+    eventos, historial = preguntar(
+        BackendGuion(["Respuesta: La apertura", " cuesta 0,3 %.", "\nFuentes: Hipoteca_ING.pdf"]),
+        "¿Qué comisión de apertura cobra ING?",
+    )
+    assert [e for e, _ in eventos] == ["token", "token", "token", "fin"]
+    assert eventos[-1][1]["ok"] is True
+    assert "cuesta 0,3 %" in historial
+
+
+def test_error_a_mitad_no_guarda_la_respuesta_parcial(preguntar):
+    eventos, historial = preguntar(
+        BackendGuion(["Respuesta: La amortización"], error=ConnectionError("se cortó")),
+        "¿Cuánto cuesta amortizar con ING?",
+    )
+    assert [e for e, _ in eventos] == ["token", "error"]
+    assert eventos[-1][1]["motivo"] == "interno" and eventos[-1][1]["ok"] is False
+    assert "La amortización" not in historial
+
+
+def test_respuesta_vacia_es_un_error(preguntar):
+    eventos, historial = preguntar(BackendGuion([]), "¿Qué ofrece Santander?")
+    assert eventos == [("error", {"ok": False, "motivo": "vacia", "mensaje": llm.RESPUESTA_VACIA})]
+    assert "Santander" not in historial
+
+
+def test_timeout_emite_error(preguntar, monkeypatch):
+    monkeypatch.setattr(llm.cliente_llm, "timeout_s", 0.05)
+    eventos, historial = preguntar(BackendGuion(["Respuesta:"], espera_s=1.0), "¿Tipo fijo de BBVA?")
+    assert [e for e, _ in eventos] == ["token", "error"]
+    assert eventos[-1][1]["mensaje"] == llm.RESPUESTA_TIMEOUT
+    assert "BBVA" not in historial
+
+
+def test_pregunta_demasiado_larga_se_rechaza(cliente, sesion_con_analisis):
+    import hipotecassist_api
+
+    pregunta = "x" * (hipotecassist_api.PREGUNTA_MAX_CHARS + 1)
+    r = cliente.post("/preguntar/stream", json={"session_id": sesion_con_analisis, "pregunta": pregunta})
+    assert r.status_code == 422
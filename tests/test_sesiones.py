@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from sesiones import AlmacenAnalisis, AlmacenMemoria, AlmacenCompartido, ClienteKVLocal, comprobar_workers
+
+
+def test_sesiones_aisladas_y_lru():
+    almacen = AlmacenMemoria(max_sesiones=2, ttl_segundos=60)
+    almacen.guardar("a", {"capital": 1})
+    almacen.guardar("b", {"capital": 2})
+    assert almacen.obtener("a") == {"capital": 1}
+    # "b" es ahora la menos usada y se expulsa al entrar "c"
+    almacen.guardar("c", {"capital": 3})
+    assert almacen.obtener("b") is None
+    assert almacen.obtener("a") == {"capital": 1}
+    assert len(almacen) == 2
+    almacen.borrar("a")
+    assert almacen.obtener("a") is None
+
+
+def test_caducidad_por_ttl():
+    almacen = AlmacenMemoria(ttl_segundos=0.05)
+    almacen.guardar("a", {"capital": 1})
+    time.sleep(0.06)
+    assert almacen.obtener("a") is None
+    assert len(almacen) == 0
+
+
+def test_almacen_compartido_con_cliente_local():
+    cliente = ClienteKVLocal()
+    worker_1 = AlmacenCompartido(cliente, ttl_segundos=60)
+    worker_2 = AlmacenCompartido(cliente, ttl_segundos=60)
+    worker_1.guardar("s1", {"metricas": {"cuota_efectiva": 650.0}, "avisos": []})
+    assert worker_2.obtener("s1") == {"metricas": {"cuota_efectiva": 650.0}, "avisos": []}
+    assert worker_2.obtener("s2") is None
+    # Sin SCAN del keyspace en cada /health
+    assert worker_2.sesiones_activas() is None
+    worker_2.borrar("s1")
+    assert worker_1.obtener("s1") is None
+
+
+def test_almacen_a_medias_no_se_puede_crear():
+    class SinBorrar(AlmacenAnalisis):
+        def guardar(self, session_id, resultado): ...
+        def obtener(self, session_id): ...
+        def sesiones_activas(self): ...
+
+    with pytest.raises(TypeError):
+        SinBorrar()
+
+
+def test_varios_workers_exigen_almacen_compartido(monkeypatch):
+    monkeypatch.delenv("ANALISIS_STORE", raising=False)
+    comprobar_workers(1)
+    with pytest.raises(RuntimeError, match="ANALISIS_STORE=redis"):
+        comprobar_workers(2)
+    monkeypatch.setenv("ANALISIS_STORE", "redis")
+    comprobar_workers(4)
@@ -0,0 +1,32 @@
+import pytest
+
+from amortizacion import CuadroAmortizacion
+from simulacion_euribor import simular_hipoteca_variable, trayectorias_euribor
+
+
+def test_semilla_reproducible():
+    a = simular_hipoteca_variable(150000, 3.0, 1.0, 300, n_trayectorias=500, semilla=42, ingresos_mensuales=2500)
+    b = simular_hipoteca_variable(150000, 3.0, 1.0, 300, n_trayectorias=500, semilla=42, ingresos_mensuales=2500)
+    c = simular_hipoteca_variable(150000, 3.0, 1.0, 300, n_trayectorias=500, semilla=7, ingresos_mensuales=2500)
+    assert a == b
+    assert a["intereses_totales"] != c["intereses_totales"]
+    assert a["dti_maximo"]["p5"] <= a["dti_maximo"]["p50"] <= a["dti_maximo"]["p95"]
+
+
+def test_sin_volatilidad_equivale_a_tipo_fijo():
+    # Euríbor estable en su media: todas las trayectorias son la hipoteca a tipo constante
+    res = simular_hipoteca_variable(
+        200000, 2.5, 1.0, 360, n_trayectorias=100, volatilidad=0.0, euribor_largo_plazo=2.5, semilla=1
+    )
+    cuadro = CuadroAmortizacion.calcular(200000, 0.035, 360)
+    assert res["cuota_maxima"]["p50"] == pytest.approx(cuadro.cuota, abs=0.01)
+    assert res["intereses_totales"]["p95"] == pytest.approx(cuadro.intereses_totales, abs=0.01)
+    assert len(res["cuota_por_revision"]) == 30
+    assert res["dti_maximo"] is None
+
+
+def test_trayectorias_revierten_a_la_media():
+    euribor = trayectorias_euribor(6.0, 40, 2000, reversion=0.5, euribor_largo_plazo=2.0, volatilidad=0.1, semilla=3)
+    assert euribor.shape == (40, 2000)
+    assert (euribor[0] == 6.0).all()
+    assert euribor[-1].mean() == pytest.approx(2.0, abs=0.05)